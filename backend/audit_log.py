@@ -0,0 +1,251 @@
+"""
+Audit Log - Write-behind log of every validation outcome to the
+merchant_validations table
+"""
+
+import os
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Hashable
+
+import orjson
+
+from models import MerchantValidationRequest, ValidationResult
+from write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+_current_batch: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("audit_batch_id", default=None)
+
+@contextmanager
+def audit_batch(batch_id: str):
+    """Tag validations recorded inside the block with the batch they belong to"""
+    token = _current_batch.set(batch_id)
+    try:
+        yield
+    finally:
+        _current_batch.reset(token)
+
+DATETIME_COLUMNS = ("created_at", "updated_at")
+
+class ValidationAuditLog(WriteBehindBuffer):
+    """
+    Validation results are queued in memory and inserted in bulk, so the
+    request path never waits for the database.
+
+    Audit rows are never dropped: rows that overflow the buffer, fail to
+    write or are still pending at shutdown are appended to a local spill
+    file. The spill file is replayed once the database accepts writes again;
+    audit_id makes the replay idempotent.
+    """
+
+    def __init__(self, spill_dir: str, **kwargs):
+        super().__init__("merchant_validations", **kwargs)
+        self.spill_path = os.path.join(spill_dir, "validations.jsonl")
+        self.replay_path = os.path.join(spill_dir, "validations.replay.jsonl")
+        self.enabled = False
+        self._spill_lock = threading.Lock()
+        self._spilled = 0
+        self._engine = None
+        self._insert = None
+        self._daily_upsert = None
+        self._batch_upsert = None
+        self._tables_ready = False
+
+    async def start(self) -> None:
+        if not os.getenv("DATABASE_URL"):
+            logger.info("DATABASE_URL not set, validations will not be audited")
+            return
+
+        from sqlalchemy.dialects.postgresql import insert
+        from database import engine, MerchantValidation, ValidationDailySummary, ValidationBatchSummary
+
+        table = MerchantValidation.__table__
+        # RETURNING yields only rows actually inserted, so replayed rows are not counted twice
+        self._insert = insert(table).on_conflict_do_nothing(index_elements=["audit_id"]).returning(
+            *(table.c[column] for column in SUMMARY_SOURCE_COLUMNS)
+        )
+        self._daily_upsert = summary_upsert(ValidationDailySummary.__table__)
+        self._batch_upsert = summary_upsert(ValidationBatchSummary.__table__)
+        self._engine = engine
+        self.enabled = True
+        # Unlike the merchant cache, start even if the database is down:
+        # rows spill to disk until it is back
+        await super().start()
+
+    def add_result(self, request: MerchantValidationRequest, result: ValidationResult) -> None:
+        if not self.enabled:
+            return
+        row = audit_row(request, result, _current_batch.get())
+        if self.running:
+            self.add(row)
+        else:
+            # Recorded after shutdown started (e.g. a batch finishing its row)
+            self.spill([row])
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not self._tables_ready:
+            from database import create_tables
+            await create_tables()
+            self._tables_ready = True
+        async with self._engine.begin() as conn:
+            inserted = (await conn.execute(self._insert, rows)).all()
+            # Summary tables move in the same transaction as the rows they count
+            daily, batches = summarize(inserted)
+            if daily:
+                await conn.execute(self._daily_upsert, daily)
+            if batches:
+                await conn.execute(self._batch_upsert, batches)
+
+    def overflow(self, rows: List[Dict[str, Any]]) -> None:
+        self.spill(rows)
+
+    def retry_failed(self, items: List[Tuple[Hashable, Dict[str, Any]]]) -> None:
+        # Get failed rows onto disk now rather than holding them in memory
+        self.spill([row for _, row in items])
+
+    def spill(self, rows: List[Dict[str, Any]]) -> None:
+        data = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                with open(self.spill_path, "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._spilled += len(rows)
+        except OSError as e:
+            self._dropped += len(rows)
+            logger.error(f"Lost {len(rows)} audit rows, spill file not writable: {str(e)}")
+
+    async def flush(self) -> int:
+        failed_writes = self._failed_writes
+        written = await super().flush()
+        if self._failed_writes == failed_writes and self.running:
+            written += await self._replay_spill()
+        return written
+
+    async def _replay_spill(self) -> int:
+        """Insert spilled rows; the replay file is removed once all are written"""
+        with self._spill_lock:
+            if not os.path.exists(self.replay_path):
+                if not os.path.exists(self.spill_path) or os.path.getsize(self.spill_path) == 0:
+                    return 0
+                # New spills go to a fresh file while this one is replayed
+                os.replace(self.spill_path, self.replay_path)
+
+        written = 0
+        try:
+            chunk = []
+            with open(self.replay_path, "rb") as f:
+                for line in f:
+                    try:
+                        row = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # Torn line from a crash mid-spill
+                        continue
+                    for column in DATETIME_COLUMNS:
+                        row[column] = datetime.fromisoformat(row[column])
+                    chunk.append(row)
+                    if len(chunk) >= self.batch_size:
+                        await self.write(chunk)
+                        written += len(chunk)
+                        chunk = []
+            if chunk:
+                await self.write(chunk)
+                written += len(chunk)
+        except Exception as e:
+            self._failed_writes += 1
+            self._written += written
+            logger.error(f"Error replaying audit spill file: {str(e)}")
+            return written
+
+        os.remove(self.replay_path)
+        self._written += written
+        logger.info(f"Replayed {written} spilled audit rows")
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["spilled"] = self._spilled
+        with self._spill_lock:
+            stats["spill_bytes"] = sum(
+                os.path.getsize(path) for path in (self.spill_path, self.replay_path) if os.path.exists(path)
+            )
+        return stats
+
+SUMMARY_SOURCE_COLUMNS = ("created_at", "batch_id", "risk_level", "validation_status", "risk_score")
+
+def summary_upsert(table):
+    """Add counts to a summary table row, creating it on first use"""
+    from sqlalchemy.dialects.postgresql import insert
+
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={
+            "validations": table.c.validations + stmt.excluded.validations,
+            "risk_score_sum": table.c.risk_score_sum + stmt.excluded.risk_score_sum
+        }
+    )
+
+def summarize(inserted: List[Tuple]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Per-day and per-batch count increments for freshly inserted audit rows"""
+    daily: Dict[Tuple, List[float]] = {}
+    batches: Dict[Tuple, List[float]] = {}
+    for created_at, batch_id, risk_level, validation_status, risk_score in inserted:
+        keys = [(daily, (created_at.date(), risk_level, validation_status))]
+        if batch_id:
+            keys.append((batches, (batch_id, risk_level, validation_status)))
+        for totals, key in keys:
+            counts = totals.setdefault(key, [0, 0.0])
+            counts[0] += 1
+            counts[1] += risk_score or 0.0
+
+    # Sorted so concurrent API processes lock summary rows in the same order
+    return (
+        [
+            {"day": day, "risk_level": level, "validation_status": status, "validations": n, "risk_score_sum": total}
+            for (day, level, status), (n, total) in sorted(daily.items())
+        ],
+        [
+            {"batch_id": batch_id, "risk_level": level, "validation_status": status, "validations": n, "risk_score_sum": total}
+            for (batch_id, level, status), (n, total) in sorted(batches.items())
+        ]
+    )
+
+def audit_row(request: MerchantValidationRequest, result: ValidationResult, batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """Column values of the merchant_validations table for one outcome"""
+    merchant_info = result.merchant_info
+    risk = result.risk_assessment
+    return {
+        "audit_id": uuid.uuid4().hex,
+        "batch_id": batch_id,
+        "merchant_name": request.merchant_name,
+        "address": request.address,
+        "place_id": merchant_info.place_id if merchant_info else request.place_id,
+        "phone": request.phone,
+        "transaction_amount": request.transaction_amount,
+        "transaction_type": request.transaction_type,
+        "google_places_data": merchant_info.dict() if merchant_info else None,
+        "risk_score": risk.risk_score,
+        "risk_level": risk.risk_level,
+        "risk_factors": risk.risk_factors,
+        "recommendations": risk.recommendations,
+        "validation_status": result.validation_status,
+        "search_query": result.search_query,
+        "created_at": result.timestamp,
+        "updated_at": result.timestamp
+    }
+
+# Global instance
+validation_audit = ValidationAuditLog(
+    spill_dir=os.getenv("AUDIT_SPILL_DIR", "audit_spill"),
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", "2.0")),
+    max_pending=int(os.getenv("AUDIT_MAX_PENDING", "10000"))
+)
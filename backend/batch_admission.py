@@ -0,0 +1,289 @@
+"""
+Batch Admission - Bounded batch queue with per-tenant limits, so a burst of
+uploads waits its turn (or is turned away) instead of all running at once
+"""
+
+import os
+import math
+import time
+import heapq
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+class AdmissionRejected(Exception):
+    """A batch cannot be accepted now (or, with status 413, at all)"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: Optional[int] = None, estimated_start_at: Optional[datetime] = None):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.estimated_start_at = estimated_start_at
+
+class BatchAdmission:
+    """
+    At most max_running batches run at a time, on a dedicated thread pool.
+    Further batches wait in a FIFO queue of at most max_queued batches; a
+    queued batch is skipped while its tenant already runs
+    tenant_max_running batches.
+
+    Per tenant, running plus queued work is limited to tenant_max_batches
+    batches and tenant_max_rows rows. Rejections carry a Retry-After and
+    estimated start times are derived from the rows per second completed
+    over the last throughput_window seconds.
+    """
+
+    def __init__(
+        self,
+        max_running: int = 4,
+        max_queued: int = 50,
+        max_batch_rows: int = 50000,
+        tenant_max_running: int = 2,
+        tenant_max_batches: int = 10,
+        tenant_max_rows: int = 100000,
+        throughput_window: float = 300.0,
+        default_rows_per_second: float = 2.0
+    ):
+        self.max_running = max(max_running, 1)
+        self.max_queued = max(max_queued, 0)
+        self.max_batch_rows = max_batch_rows
+        self.tenant_max_running = max(tenant_max_running, 1)
+        self.tenant_max_batches = max(tenant_max_batches, 1)
+        self.tenant_max_rows = tenant_max_rows
+        self.throughput_window = throughput_window
+        self.default_rows_per_second = default_rows_per_second
+
+        self._lock = threading.Lock()
+        # Notified whenever a running batch ends
+        self._batch_ended = threading.Condition(self._lock)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        # batch_id -> {tenant_id, rows, processed, run}
+        self._queued: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._running: Dict[str, Dict[str, Any]] = {}
+        # (second, rows completed in that second)
+        self._completions: deque = deque()
+        self._admitted = 0
+        self._rejected = {413: 0, 429: 0, 503: 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix="batch")
+        return self._executor
+
+    def start(self) -> None:
+        self._closed = False
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """
+        Stop starting batches (queued batches stay checkpointed as PENDING)
+        and wait up to timeout seconds for the running ones, which the
+        caller has told to stop. False if some were still running.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+            self._queued.clear()
+            while self._running and time.monotonic() < deadline:
+                self._batch_ended.wait(deadline - time.monotonic())
+            still_running = list(self._running)
+        if still_running:
+            logger.warning(f"Batches still running at shutdown: {', '.join(still_running)}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        return not still_running
+
+    def record_progress(self, batch_id: str, processed: int) -> None:
+        """Called with a batch's processed row count as rows complete"""
+        now = int(time.monotonic())
+        with self._lock:
+            batch = self._running.get(batch_id)
+            if batch is None:
+                return
+            completed = processed - batch["processed"]
+            batch["processed"] = processed
+            if completed <= 0:
+                return
+            if self._completions and self._completions[-1][0] == now:
+                self._completions[-1][1] += completed
+            else:
+                self._completions.append([now, completed])
+
+    def _rows_per_second(self) -> float:
+        """Rows completed per second across all batches; the caller holds the lock"""
+        now = time.monotonic()
+        while self._completions and self._completions[0][0] < now - self.throughput_window:
+            self._completions.popleft()
+        if not self._completions:
+            return self.default_rows_per_second
+        # Measure from the first completion, so a fresh window is not diluted
+        elapsed = max(now - self._completions[0][0], 1.0)
+        return max(sum(rows for _, rows in self._completions) / elapsed, 0.01)
+
+    def _remaining(self, batch: Dict[str, Any]) -> int:
+        return max(batch["rows"] - batch["processed"], 0)
+
+    def _seconds_until_start(self, queued_ahead: List[Dict[str, Any]]) -> float:
+        """
+        Simulate the slots: running batches share the measured throughput
+        equally, and each queued batch takes the earliest free slot.
+        The caller holds the lock.
+        """
+        per_batch = self._rows_per_second() / max(len(self._running), 1)
+        slots = [self._remaining(batch) / per_batch for batch in self._running.values()]
+        slots += [0.0] * (self.max_running - len(slots))
+        heapq.heapify(slots)
+        for batch in queued_ahead:
+            heapq.heappush(slots, heapq.heappop(slots) + batch["rows"] / per_batch)
+        return slots[0]
+
+    def _seconds_until_tenant_frees(self, tenant_id: str) -> float:
+        """Until the tenant's first running batch should finish; the caller holds the lock"""
+        per_batch = self._rows_per_second() / max(len(self._running), 1)
+        finishes = [
+            self._remaining(batch) / per_batch
+            for batch in self._running.values() if batch["tenant_id"] == tenant_id
+        ]
+        return min(finishes) if finishes else self._seconds_until_start(list(self._queued.values()))
+
+    def _reject(self, status_code: int, reason: str, seconds: Optional[float] = None) -> AdmissionRejected:
+        self._rejected[status_code] += 1
+        if seconds is None:
+            return AdmissionRejected(status_code, reason)
+        retry_after = min(max(int(math.ceil(seconds)), 1), 3600)
+        return AdmissionRejected(status_code, reason, retry_after, datetime.now() + timedelta(seconds=seconds))
+
+    def check(self, tenant_id: str, rows: int) -> None:
+        """Raise AdmissionRejected if a batch of rows cannot be accepted for tenant_id"""
+        with self._lock:
+            if rows > self.max_batch_rows:
+                raise self._reject(413, f"Batches are limited to {self.max_batch_rows} merchants; split the file")
+
+            tenant_batches = [
+                batch for batch in (*self._running.values(), *self._queued.values())
+                if batch["tenant_id"] == tenant_id
+            ]
+            if len(tenant_batches) >= self.tenant_max_batches:
+                raise self._reject(
+                    429, f"Tenant has {len(tenant_batches)} batches running or queued (limit {self.tenant_max_batches})",
+                    self._seconds_until_tenant_frees(tenant_id)
+                )
+            tenant_rows = sum(self._remaining(batch) for batch in tenant_batches)
+            if tenant_rows + rows > self.tenant_max_rows:
+                raise self._reject(
+                    429, f"Tenant has {tenant_rows} merchants pending (limit {self.tenant_max_rows})",
+                    self._seconds_until_tenant_frees(tenant_id)
+                )
+
+            tenant_running = sum(1 for batch in self._running.values() if batch["tenant_id"] == tenant_id)
+            starts_now = len(self._running) < self.max_running and tenant_running < self.tenant_max_running
+            if not starts_now and len(self._queued) >= self.max_queued:
+                raise self._reject(
+                    503, f"Batch queue is full ({len(self._queued)} batches waiting)",
+                    self._seconds_until_start([])
+                )
+
+    def submit(self, batch_id: str, tenant_id: str, rows: int, run: Callable[[], None], processed: int = 0) -> None:
+        """
+        Queue a batch and start whatever can run. Not checked against the
+        limits: call check() first for new batches; restored ones always fit.
+        """
+        with self._lock:
+            self._queued[batch_id] = {
+                "tenant_id": tenant_id,
+                "rows": rows,
+                "processed": processed,
+                "run": run,
+                "queued_at": datetime.now()
+            }
+            self._admitted += 1
+        self._dispatch()
+
+    def withdraw(self, batch_id: str) -> bool:
+        """Remove a batch that has not started yet; False if it is not queued"""
+        with self._lock:
+            return self._queued.pop(batch_id, None) is not None
+
+    def _dispatch(self) -> None:
+        started = []
+        with self._lock:
+            while not self._closed and len(self._running) < self.max_running:
+                running_per_tenant: Dict[str, int] = {}
+                for batch in self._running.values():
+                    running_per_tenant[batch["tenant_id"]] = running_per_tenant.get(batch["tenant_id"], 0) + 1
+
+                batch_id = next((
+                    batch_id for batch_id, batch in self._queued.items()
+                    if running_per_tenant.get(batch["tenant_id"], 0) < self.tenant_max_running
+                ), None)
+                if batch_id is None:
+                    break
+                batch = self._queued.pop(batch_id)
+                self._running[batch_id] = batch
+                started.append((batch_id, batch["run"]))
+
+        for batch_id, run in started:
+            self._pool().submit(self._run, batch_id, run)
+
+    def _run(self, batch_id: str, run: Callable[[], None]) -> None:
+        try:
+            run()
+        except Exception as e:
+            logger.error(f"Batch {batch_id} stopped unexpectedly: {str(e)}")
+        finally:
+            with self._lock:
+                self._running.pop(batch_id, None)
+                self._batch_ended.notify_all()
+            self._dispatch()
+
+    def queue_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Queue position and estimated start of a waiting batch, None if it is not queued"""
+        with self._lock:
+            if batch_id not in self._queued:
+                return None
+            queued = list(self._queued.items())
+            position = next(i for i, (queued_id, _) in enumerate(queued) if queued_id == batch_id)
+            seconds = self._seconds_until_start([batch for _, batch in queued[:position]])
+        return {
+            "queue_position": position + 1,
+            "estimated_start_at": datetime.now() + timedelta(seconds=seconds)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tenants: Dict[str, Dict[str, int]] = {}
+            for state, batches in (("running", self._running), ("queued", self._queued)):
+                for batch in batches.values():
+                    tenant = tenants.setdefault(batch["tenant_id"], {"running": 0, "queued": 0, "pending_rows": 0})
+                    tenant[state] += 1
+                    tenant["pending_rows"] += self._remaining(batch)
+            return {
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "max_running": self.max_running,
+                "max_queued": self.max_queued,
+                "rows_per_second": round(self._rows_per_second(), 2),
+                "admitted": self._admitted,
+                "rejected": dict(self._rejected),
+                "tenants": tenants
+            }
+
+# Global instance
+batch_admission = BatchAdmission(
+    max_running=int(os.getenv("BATCH_MAX_RUNNING", "4")),
+    max_queued=int(os.getenv("BATCH_MAX_QUEUED", "50")),
+    max_batch_rows=int(os.getenv("BATCH_MAX_ROWS", "50000")),
+    tenant_max_running=int(os.getenv("TENANT_MAX_RUNNING_BATCHES", "2")),
+    tenant_max_batches=int(os.getenv("TENANT_MAX_BATCHES", "10")),
+    tenant_max_rows=int(os.getenv("TENANT_MAX_PENDING_ROWS", "100000")),
+    default_rows_per_second=float(os.getenv("BATCH_ROWS_PER_SECOND_ESTIMATE", "2"))
+)
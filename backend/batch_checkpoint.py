@@ -0,0 +1,169 @@
+"""
+Batch Checkpoints - Durable local storage of batch progress so that batches
+survive restarts and can be paused and resumed
+"""
+
+import os
+import shutil
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+class BatchCheckpointStore:
+    """
+    One directory per batch:
+      merchants.jsonl  - the submitted rows, written once
+      results.jsonl    - completed rows, appended in chunks
+      state.json       - batch status, rewritten atomically
+    """
+
+    def __init__(self, directory: str, interval: int = 100):
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._written: Dict[str, int] = {}
+
+    def _path(self, batch_id: str, name: str = "") -> str:
+        return os.path.join(self.directory, batch_id, name)
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def start(self, batch_id: str, batch_status: Dict[str, Any], merchants: List[Dict[str, Any]]) -> None:
+        """Persist a new batch before any row is processed"""
+        os.makedirs(self._path(batch_id), exist_ok=True)
+        self._write_atomic(
+            self._path(batch_id, "merchants.jsonl"),
+            b"".join(orjson.dumps(merchant) + b"\n" for merchant in merchants)
+        )
+        open(self._path(batch_id, "results.jsonl"), "wb").close()
+        with self._lock:
+            self._written[batch_id] = 0
+        self.save_state(batch_id, batch_status)
+
+    def save_state(self, batch_id: str, batch_status: Dict[str, Any]) -> None:
+        state = {key: value for key, value in batch_status.items() if key != "results"}
+        self._write_atomic(self._path(batch_id, "state.json"), orjson.dumps(state))
+
+    def due(self, batch_id: str, completed: int) -> bool:
+        """Whether enough rows completed since the last checkpoint"""
+        return completed - self._written.get(batch_id, 0) >= self.interval
+
+    def append_results(self, batch_id: str, results: List[Dict[str, Any]]) -> None:
+        """Append the rows of results not yet checkpointed"""
+        with self._lock:
+            written = self._written.get(batch_id, 0)
+            new_rows = results[written:]
+            if not new_rows:
+                return
+            with open(self._path(batch_id, "results.jsonl"), "ab") as f:
+                f.write(b"".join(orjson.dumps(row) + b"\n" for row in new_rows))
+                f.flush()
+                os.fsync(f.fileno())
+            self._written[batch_id] = written + len(new_rows)
+
+    def checkpoint(self, batch_id: str, batch_status: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+        """Flush completed rows, then the state that refers to them"""
+        try:
+            self.append_results(batch_id, results)
+            self.save_state(batch_id, batch_status)
+        except OSError as e:
+            logger.error(f"Error checkpointing batch {batch_id}: {str(e)}")
+
+    def _iter_jsonl(self, path: str, repair: bool = False) -> Iterator[Dict[str, Any]]:
+        """Rows of a JSON lines file, one at a time, up to the first torn row"""
+        if not os.path.exists(path):
+            return
+
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    row = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    break
+                valid_bytes += len(line)
+                yield row
+
+        if repair and valid_bytes != os.path.getsize(path):
+            # Drop a row torn by a crash mid-write
+            with open(path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def load_merchants(self, batch_id: str) -> List[Dict[str, Any]]:
+        return list(self._iter_jsonl(self._path(batch_id, "merchants.jsonl")))
+
+    def iter_results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Completed rows of a batch, streamed so a large batch is never held
+        as dicts; once fully read, later appends continue after them
+        """
+        count = 0
+        for row in self._iter_jsonl(self._path(batch_id, "results.jsonl"), repair=True):
+            count += 1
+            yield row
+        with self._lock:
+            self._written[batch_id] = count
+
+    def load_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Completed rows of a batch as a list; see iter_results()"""
+        return list(self.iter_results(batch_id))
+
+    def count_results(self, batch_id: str) -> int:
+        """Number of completed rows on disk, without parsing them"""
+        path = self._path(batch_id, "results.jsonl")
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, "rb") as f:
+            for line in f:
+                count += line.endswith(b"\n")
+        return count
+
+    def load_batches(self, lazy_statuses: Tuple[str, ...] = ()) -> List[Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]]:
+        """
+        All checkpointed batches as (state, completed results). Results of
+        batches in lazy_statuses are not read (None); use load_results().
+        """
+        batches = []
+        if not os.path.isdir(self.directory):
+            return batches
+
+        for batch_id in sorted(os.listdir(self.directory)):
+            state_path = self._path(batch_id, "state.json")
+            if not os.path.exists(state_path):
+                continue
+            try:
+                with open(state_path, "rb") as f:
+                    state = orjson.loads(f.read())
+                results = None
+                if state.get("status") not in lazy_statuses:
+                    results = self.load_results(batch_id)
+            except (OSError, orjson.JSONDecodeError) as e:
+                logger.error(f"Skipping unreadable checkpoint for batch {batch_id}: {str(e)}")
+                continue
+
+            batches.append((state, results))
+        return batches
+
+    def delete(self, batch_id: str) -> None:
+        with self._lock:
+            self._written.pop(batch_id, None)
+        shutil.rmtree(self._path(batch_id), ignore_errors=True)
+
+# Global instance
+checkpoint_store = BatchCheckpointStore(
+    directory=os.getenv("BATCH_CHECKPOINT_DIR", "batch_checkpoints"),
+    interval=int(os.getenv("BATCH_CHECKPOINT_INTERVAL", "100"))
+)
@@ -0,0 +1,101 @@
+"""
+Batch Dedup - Finds an earlier submission of the same batch, by the content
+hash of its rows or by the client's Idempotency-Key
+"""
+
+import re
+import hashlib
+import threading
+from typing import Optional, Dict, Any, Iterable, Tuple, Callable
+
+import orjson
+
+_SPACES = re.compile(r"\s+")
+
+# Per-call fields that do not change what a row validates
+_IGNORED_FIELDS = {"session_token"}
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return _SPACES.sub(" ", value).strip().casefold() or None
+    if isinstance(value, float) and value != value:
+        # NaN, as pandas reads empty CSV cells
+        return None
+    return value
+
+def batch_content_hash(rows: Iterable[Dict[str, Any]], callback_url: Optional[str] = None) -> str:
+    """
+    SHA-256 of the rows, in order, with strings trimmed, whitespace collapsed
+    and case folded, so a re-uploaded file hashes the same. The callback_url
+    is part of it: a batch replayed for a different URL would never send
+    its webhooks there.
+    """
+    digest = hashlib.sha256()
+    for row in rows:
+        normalized = {field: _normalize(value) for field, value in row.items() if field not in _IGNORED_FIELDS}
+        digest.update(orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS))
+        digest.update(b"\n")
+    if callback_url:
+        digest.update(b"callback_url:" + callback_url.strip().encode("utf-8"))
+    return digest.hexdigest()
+
+class BatchDeduplicator:
+    """
+    Index of submitted batches by (tenant, content hash) and by (tenant,
+    Idempotency-Key). Whether an indexed batch may be returned again
+    (still running, or finished recently enough) is decided by the caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_hash: Dict[Tuple[str, str], str] = {}
+        self._by_key: Dict[Tuple[str, str], str] = {}
+        # batch_id -> (tenant_id, content_hash, idempotency_key)
+        self._batches: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._replayed = 0
+
+    def register(self, batch_id: str, tenant_id: str, content_hash: str, idempotency_key: Optional[str] = None) -> None:
+        with self._lock:
+            self._by_hash[(tenant_id, content_hash)] = batch_id
+            if idempotency_key:
+                self._by_key[(tenant_id, idempotency_key)] = batch_id
+            self._batches[batch_id] = (tenant_id, content_hash, idempotency_key)
+
+    def find(self, tenant_id: str, content_hash: str, idempotency_key: Optional[str], reusable: Callable[[str], bool]) -> Optional[str]:
+        """
+        The batch submitted earlier with this Idempotency-Key (whatever its
+        rows), else the one with the same rows, if reusable(batch_id)
+        """
+        with self._lock:
+            candidates = []
+            if idempotency_key:
+                candidates.append(self._by_key.get((tenant_id, idempotency_key)))
+            candidates.append(self._by_hash.get((tenant_id, content_hash)))
+            for batch_id in candidates:
+                if batch_id is not None and reusable(batch_id):
+                    if self._batches[batch_id][1] == content_hash:
+                        self._replayed += 1
+                    return batch_id
+        return None
+
+    def forget(self, batch_id: str) -> None:
+        with self._lock:
+            entry = self._batches.pop(batch_id, None)
+            if entry is None:
+                return
+            tenant_id, content_hash, idempotency_key = entry
+            # A later batch may have taken over the hash or key
+            if self._by_hash.get((tenant_id, content_hash)) == batch_id:
+                del self._by_hash[(tenant_id, content_hash)]
+            if idempotency_key and self._by_key.get((tenant_id, idempotency_key)) == batch_id:
+                del self._by_key[(tenant_id, idempotency_key)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "indexed_batches": len(self._batches),
+                "replayed_submissions": self._replayed
+            }
+
+# Global instance
+batch_dedup = BatchDeduplicator()
@@ -0,0 +1,356 @@
+"""
+Batch Events - Signed webhooks and live event streams for batch progress,
+so clients don't have to poll /batch-status
+"""
+
+import os
+import hmac
+import time
+import uuid
+import random
+import socket
+import asyncio
+import hashlib
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Set
+from urllib.parse import urlparse
+
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROGRESS = "batch.progress"
+BATCH_COMPLETED = "batch.completed"
+BATCH_FAILED = "batch.failed"
+BATCH_PAUSED = "batch.paused"
+
+# Events after which a batch stops producing events until it is resumed
+FINAL_EVENTS = (BATCH_COMPLETED, BATCH_FAILED, BATCH_PAUSED)
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    """HMAC-SHA256 over "<timestamp>.<body>", hex encoded"""
+    message = timestamp.encode() + b"." + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+def is_public_address(address: str) -> bool:
+    """False for loopback, private, link-local, shared, reserved and multicast addresses"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def _allowed_hosts_from_env() -> Set[str]:
+    hosts = os.getenv("WEBHOOK_ALLOWED_HOSTS", "")
+    return {host.strip().lower() for host in hosts.split(",") if host.strip()}
+
+class BatchEventDispatcher:
+    """
+    Batch events are published from the batch threads. Each event goes to:
+      - the batch's callback_url, as a signed POST retried with exponential
+        backoff; deliveries of one batch are sent in order
+      - live subscribers (the /batch/{id}/events stream)
+
+    Callback hosts must resolve to public addresses only, unless they are
+    listed in allowed_hosts (which, when set, also limits callbacks to its
+    hosts). The host is resolved again before every attempt and the request
+    goes to the checked address, so a DNS change cannot redirect it.
+
+    Webhooks receive progress only at milestones (every progress_step
+    percent); live subscribers get progress at most every stream_interval
+    seconds.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str],
+        progress_step: int = 25,
+        max_attempts: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 10.0,
+        stream_interval: float = 1.0,
+        allowed_hosts: Optional[Set[str]] = None,
+        log_size: int = 200,
+        max_logged_batches: int = 1000
+    ):
+        self.secret = secret
+        self.progress_step = max(1, min(progress_step, 100))
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.stream_interval = stream_interval
+        self.allowed_hosts = allowed_hosts or set()
+        self.log_size = log_size
+        self.max_logged_batches = max_logged_batches
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sequences: Dict[str, int] = {}
+        self._milestones: Dict[str, int] = {}
+        self._last_streamed: Dict[str, float] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._delivery_locks: Dict[str, asyncio.Lock] = {}
+        self._deliveries: Set[asyncio.Future] = set()
+        self._log: "OrderedDict[str, deque]" = OrderedDict()
+        self._delivered = 0
+        self._failed = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Give in-flight deliveries a moment to finish, then drop the rest"""
+        pending = [asyncio.wrap_future(future) for future in list(self._deliveries)]
+        if pending:
+            done, not_done = await asyncio.wait(pending, timeout=timeout)
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                logger.warning(f"Dropped {len(not_done)} webhook deliveries at shutdown")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def validate_callback_url(self, url: str) -> str:
+        """Raises ValueError if webhooks cannot be sent to url"""
+        if not self.secret:
+            raise ValueError("Webhooks need WEBHOOK_SECRET to be set")
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError("callback_url must be an http(s) URL")
+        if self.allowed_hosts and parsed.hostname.lower() not in self.allowed_hosts:
+            raise ValueError(f"callback_url host {parsed.hostname} is not allowed")
+        await self._resolve(url)
+        return url
+
+    async def _resolve(self, url: str) -> Optional[str]:
+        """
+        The address to send a webhook for url to, or None for allowed hosts,
+        which are connected to by name. Raises ValueError if the host does
+        not resolve or any of its addresses is not public.
+        """
+        parsed = urlparse(url)
+        hostname = parsed.hostname.lower()
+        if hostname in self.allowed_hosts:
+            return None
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        except OSError:
+            raise ValueError(f"callback_url host {parsed.hostname} does not resolve")
+        addresses = [info[4][0] for info in infos]
+        # Every address is checked, as the connection could use any of them
+        if not addresses or not all(map(is_public_address, addresses)):
+            raise ValueError(f"callback_url host {parsed.hostname} is not a public address")
+        return addresses[0]
+
+    async def _post(self, url: str, body: bytes, headers: Dict[str, str]) -> httpx.Response:
+        """POST to the resolved address of url's host, with its name kept for Host and TLS"""
+        address = await self._resolve(url)
+        if address is None:
+            return await self._client.post(url, content=body, headers=headers)
+        target = httpx.URL(url)
+        return await self._client.post(
+            target.copy_with(host=address),
+            content=body,
+            headers={**headers, "Host": target.netloc.decode("ascii")},
+            extensions={"sni_hostname": target.host}
+        )
+
+    def _event(self, event: str, batch: Dict[str, Any], extra: Optional[Dict[str, Any]] = None, advance: bool = True) -> Dict[str, Any]:
+        """Event payload; sequence counts published events, so webhook receivers can spot gaps"""
+        batch_id = batch["batch_id"]
+        with self._lock:
+            sequence = self._sequences.get(batch_id, 0) + (1 if advance else 0)
+            self._sequences[batch_id] = sequence
+
+        total = batch["total_merchants"]
+        payload = {
+            "event": event,
+            "sequence": sequence,
+            "batch_id": batch_id,
+            "status": batch["status"],
+            "total_merchants": total,
+            "processed_merchants": batch["processed_merchants"],
+            "progress": round(batch["processed_merchants"] * 100 / total, 1) if total else 100.0,
+            "created_at": batch["created_at"],
+            "completed_at": batch.get("completed_at"),
+            "timestamp": datetime.now()
+        }
+        if extra:
+            payload.update(extra)
+        return payload
+
+    def publish(self, event: str, batch: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> None:
+        """Send an event to subscribers and the batch's callback_url (thread-safe)"""
+        if self._loop is None:
+            return
+        payload = self._event(event, batch, extra)
+        self._stream(batch["batch_id"], payload)
+
+        callback_url = batch.get("callback_url")
+        if callback_url:
+            future = asyncio.run_coroutine_threadsafe(
+                self._deliver(batch["batch_id"], callback_url, payload), self._loop
+            )
+            self._deliveries.add(future)
+            future.add_done_callback(self._deliveries.discard)
+
+        if event in FINAL_EVENTS:
+            # Milestones are kept, so a resumed batch doesn't announce them again
+            with self._lock:
+                self._last_streamed.pop(batch["batch_id"], None)
+
+    def progress(self, batch: Dict[str, Any]) -> None:
+        """Called after each completed row; emits milestones and throttled stream updates"""
+        total = batch["total_merchants"]
+        if not total or self._loop is None:
+            return
+
+        batch_id = batch["batch_id"]
+        percent = batch["processed_merchants"] * 100 // total
+        milestone = percent // self.progress_step * self.progress_step
+        now = time.monotonic()
+
+        with self._lock:
+            # Completion is announced by batch.completed, not a 100% milestone
+            reached = 0 < milestone < 100 and milestone > self._milestones.get(batch_id, 0)
+            if reached:
+                self._milestones[batch_id] = milestone
+            stream = (
+                not reached
+                and batch_id in self._subscribers
+                and now - self._last_streamed.get(batch_id, 0.0) >= self.stream_interval
+            )
+            if reached or stream:
+                self._last_streamed[batch_id] = now
+
+        if reached:
+            self.publish(BATCH_PROGRESS, batch, {"milestone": milestone})
+        elif stream:
+            self._stream(batch_id, self._event(BATCH_PROGRESS, batch, advance=False))
+
+    def _stream(self, batch_id: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            queues = list(self._subscribers.get(batch_id, ()))
+        for queue in queues:
+            self._loop.call_soon_threadsafe(queue.put_nowait, payload)
+
+    def forget(self, batch_id: str) -> None:
+        """Drop sequence numbers, milestones and the delivery log of a batch"""
+        with self._lock:
+            self._sequences.pop(batch_id, None)
+            self._milestones.pop(batch_id, None)
+            self._last_streamed.pop(batch_id, None)
+            self._log.pop(batch_id, None)
+        self._delivery_locks.pop(batch_id, None)
+
+    def subscribe(self, batch_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(batch_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, batch_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            queues = self._subscribers.get(batch_id, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(batch_id, None)
+
+    async def _deliver(self, batch_id: str, url: str, payload: Dict[str, Any]) -> None:
+        lock = self._delivery_locks.setdefault(batch_id, asyncio.Lock())
+        body = orjson.dumps(payload)
+        delivery_id = uuid.uuid4().hex
+
+        async with lock:
+            for attempt in range(1, self.max_attempts + 1):
+                timestamp = str(int(time.time()))
+                headers = {
+                    "Content-Type": "application/json",
+                    "X-Webhook-Event": payload["event"],
+                    "X-Webhook-Delivery": delivery_id,
+                    "X-Webhook-Timestamp": timestamp,
+                    "X-Webhook-Signature": f"sha256={sign_payload(self.secret, timestamp, body)}"
+                }
+
+                started = time.perf_counter()
+                status_code = None
+                error = None
+                rejected = False
+                try:
+                    response = await self._post(url, body, headers)
+                    status_code = response.status_code
+                except ValueError as e:
+                    # The host now resolves to an address webhooks may not reach
+                    error = str(e)
+                    rejected = True
+                except httpx.HTTPError as e:
+                    error = f"{type(e).__name__}: {str(e)}"
+
+                delivered = status_code is not None and 200 <= status_code < 300
+                # Other 4xx answers mean the receiver rejected the event; retrying won't help
+                retryable = not delivered and not rejected and (status_code is None or status_code >= 500 or status_code in (408, 429))
+                self._record(batch_id, {
+                    "delivery_id": delivery_id,
+                    "event": payload["event"],
+                    "sequence": payload["sequence"],
+                    "attempt": attempt,
+                    "status_code": status_code,
+                    "error": error,
+                    "delivered": delivered,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "attempted_at": datetime.now()
+                })
+
+                if delivered:
+                    self._delivered += 1
+                    break
+                if not retryable or attempt == self.max_attempts:
+                    self._failed += 1
+                    logger.warning(f"Webhook {payload['event']} for batch {batch_id} failed after {attempt} attempts")
+                    break
+
+                delay = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _record(self, batch_id: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            log = self._log.get(batch_id)
+            if log is None:
+                log = self._log[batch_id] = deque(maxlen=self.log_size)
+                while len(self._log) > self.max_logged_batches:
+                    self._log.popitem(last=False)
+            log.append(entry)
+
+    def delivery_log(self, batch_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._log.get(batch_id, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._deliveries),
+            "delivered": self._delivered,
+            "failed": self._failed,
+            "subscribers": sum(len(queues) for queues in self._subscribers.values())
+        }
+
+# Global instance
+batch_events = BatchEventDispatcher(
+    secret=os.getenv("WEBHOOK_SECRET"),
+    progress_step=int(os.getenv("WEBHOOK_PROGRESS_STEP", "25")),
+    max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "6")),
+    backoff_base=float(os.getenv("WEBHOOK_BACKOFF_BASE", "1.0")),
+    backoff_max=float(os.getenv("WEBHOOK_BACKOFF_MAX", "60")),
+    timeout=float(os.getenv("WEBHOOK_TIMEOUT", "10")),
+    allowed_hosts=_allowed_hosts_from_env()
+)
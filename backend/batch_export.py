@@ -0,0 +1,166 @@
+"""
+Batch Export - Streams batch results as CSV or Parquet with flattened columns
+"""
+
+import csv
+import io
+from typing import Optional, Dict, Any, List, Iterator, Sequence
+
+# (column, parquet type) in output order
+EXPORT_COLUMNS = [
+    ("validation_status", "string"),
+    ("search_query", "string"),
+    ("timestamp", "string"),
+    ("merchant_place_id", "string"),
+    ("merchant_name", "string"),
+    ("merchant_address", "string"),
+    ("merchant_phone", "string"),
+    ("merchant_website", "string"),
+    ("merchant_rating", "float64"),
+    ("merchant_user_ratings_total", "int64"),
+    ("merchant_business_status", "string"),
+    ("merchant_types", "string"),
+    ("merchant_lat", "float64"),
+    ("merchant_lng", "float64"),
+    ("merchant_price_level", "int64"),
+    ("risk_score", "float64"),
+    ("risk_level", "string"),
+    ("risk_factors", "string"),
+    ("recommendations", "string"),
+    ("colocated_merchants", "int64"),
+    ("address_provided", "string"),
+    ("address_google", "string"),
+    ("address_similarity_score", "float64"),
+    ("address_is_match", "bool"),
+    ("address_differences", "string"),
+    ("cnpj_found", "bool"),
+    ("cnpj", "string"),
+    ("cnpj_company_name", "string"),
+    ("cnpj_registration_status", "string"),
+]
+
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+def _join(values: Optional[Sequence[Any]]) -> Optional[str]:
+    return "; ".join(str(value) for value in values) if values else None
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def flatten_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """One flat row per ValidationResult dict"""
+    merchant = result.get("merchant_info") or {}
+    location = merchant.get("location") or {}
+    risk = result.get("risk_assessment") or {}
+    address = result.get("address_comparison") or {}
+    cnpj = result.get("cnpj_comparison") or {}
+    cnpj_data = cnpj.get("cnpj_data") or {}
+
+    return {
+        "validation_status": result.get("validation_status"),
+        "search_query": result.get("search_query"),
+        "timestamp": _text(result.get("timestamp")),
+        "merchant_place_id": merchant.get("place_id"),
+        "merchant_name": merchant.get("name"),
+        "merchant_address": merchant.get("address"),
+        "merchant_phone": merchant.get("phone"),
+        "merchant_website": merchant.get("website"),
+        "merchant_rating": merchant.get("rating"),
+        "merchant_user_ratings_total": merchant.get("user_ratings_total"),
+        "merchant_business_status": merchant.get("business_status"),
+        "merchant_types": _join(merchant.get("types")),
+        "merchant_lat": location.get("lat"),
+        "merchant_lng": location.get("lng"),
+        "merchant_price_level": merchant.get("price_level"),
+        "risk_score": risk.get("risk_score"),
+        "risk_level": risk.get("risk_level"),
+        "risk_factors": _join(risk.get("risk_factors")),
+        "recommendations": _join(risk.get("recommendations")),
+        "colocated_merchants": risk.get("colocated_merchants"),
+        "address_provided": address.get("provided_address"),
+        "address_google": address.get("google_address"),
+        "address_similarity_score": address.get("similarity_score"),
+        "address_is_match": address.get("is_match"),
+        "address_differences": _join(address.get("differences")),
+        "cnpj_found": cnpj.get("cnpj_found"),
+        "cnpj": cnpj_data.get("cnpj"),
+        "cnpj_company_name": cnpj_data.get("company_name"),
+        "cnpj_registration_status": cnpj_data.get("registration_status"),
+    }
+
+def stream_csv(results: Iterator[Dict[str, Any]], chunk_rows: int = 1000) -> Iterator[bytes]:
+    """Yield CSV bytes, one chunk of chunk_rows rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMN_NAMES)
+    writer.writeheader()
+
+    rows = 0
+    for result in results:
+        writer.writerow(flatten_result(result))
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_parquet(results: Iterator[Dict[str, Any]], row_group_rows: int = 10000) -> Iterator[bytes]:
+    """Yield a Parquet file one row group at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def write_row_group(rows: List[Dict[str, Any]]):
+        columns = {name: [row[name] for row in rows] for name in COLUMN_NAMES}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    rows: List[Dict[str, Any]] = []
+    for result in results:
+        rows.append(flatten_result(result))
+        if len(rows) >= row_group_rows:
+            write_row_group(rows)
+            rows = []
+            yield sink.drain()
+
+    if rows:
+        write_row_group(rows)
+    writer.close()
+    yield sink.drain()
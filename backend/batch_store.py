@@ -0,0 +1,402 @@
+"""
+Batch Store - Compact in-memory batch results, with finished batches
+evicted to their checkpoint files and reloaded on demand
+"""
+
+import os
+import sys
+import time
+import zlib
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator, Sequence, Tuple
+
+import orjson
+
+from batch_checkpoint import BatchCheckpointStore, checkpoint_store
+from batch_summary import BatchSummary
+
+logger = logging.getLogger(__name__)
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+# Preset compression dictionary: a ValidationResult skeleton, so even a
+# single small row compresses well. Compressed rows never leave memory
+# (checkpoints are plain JSON lines), so it can change between releases.
+_ZDICT = orjson.dumps({
+    "merchant_info": {
+        "place_id": "ChIJ", "name": "", "address": " - SP, Brazil", "phone": "+55 11 ",
+        "website": "https://www.", "rating": 4.5, "user_ratings_total": 100,
+        "business_status": "OPERATIONAL",
+        "types": ["restaurant", "food", "store", "point_of_interest", "establishment"],
+        "location": {"lat": -23.5, "lng": -46.6}, "price_level": 2,
+        "opening_hours": {
+            "open_now": True,
+            "periods": [{"close": {"day": 1, "time": "1800"}, "open": {"day": 1, "time": "0800"}}],
+            "weekday_text": [
+                "Monday: 8:00 AM – 6:00 PM", "Tuesday: ", "Wednesday: ", "Thursday: ",
+                "Friday: ", "Saturday: ", "Sunday: Closed"
+            ]
+        },
+        "photos": ["/images/place-photo/?maxwidth=400"]
+    },
+    "risk_assessment": {
+        "risk_score": 25.0, "risk_level": "LOW", "risk_factors": [],
+        "recommendations": ["Manual review required"], "colocated_merchants": 0
+    },
+    "address_comparison": {
+        "provided_address": "", "google_address": "", "similarity_score": 80.0,
+        "is_match": True, "differences": []
+    },
+    "cnpj_comparison": {
+        "cnpj_found": True,
+        "cnpj_data": {
+            "cnpj": "", "company_name": " LTDA", "trade_name": None, "legal_nature": "",
+            "main_activity": "", "secondary_activities": [], "registration_status": "ATIVA",
+            "registration_date": "", "address": {}, "phone": None, "email": None,
+            "share_capital": "", "company_size": "", "last_update": "", "partners": []
+        },
+        "name_comparison": None, "address_comparison": None, "risk_assessment": None,
+        "match_source": None, "candidates": []
+    },
+    "validation_status": "VALID",
+    "timestamp": "2024-01-01T00:00:00.000000",
+    "search_query": "name: , address: "
+})
+
+def _compress(data: bytes) -> bytes:
+    compressor = zlib.compressobj(1, zdict=_ZDICT)
+    return compressor.compress(data) + compressor.flush()
+
+def _decompress(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj(zdict=_ZDICT)
+    return decompressor.decompress(data) + decompressor.flush()
+
+class CompactResult:
+    """
+    One batch row. The fields used for filtering and aggregation are kept
+    as interned strings (thousands of rows share a handful of statuses and
+    risk factors); everything else, from merchant_info to the CNPJ data,
+    is held as one compressed JSON document, about a tenth of the size of
+    the equivalent dict tree.
+    """
+
+    __slots__ = ("validation_status", "risk_level", "risk_score", "risk_factors", "payload")
+
+    def __init__(self, result: Dict[str, Any]):
+        risk = result.get("risk_assessment") or {}
+        self.validation_status = _intern(result.get("validation_status"))
+        self.risk_level = _intern(risk.get("risk_level"))
+        self.risk_score = risk.get("risk_score")
+        self.risk_factors = tuple(_intern(factor) for factor in risk.get("risk_factors") or ())
+        # Factors are stored once, above; the empty list keeps the key order
+        self.payload = _compress(orjson.dumps({**result, "risk_assessment": {**risk, "risk_factors": []}}))
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = orjson.loads(_decompress(self.payload))
+        result["risk_assessment"]["risk_factors"] = list(self.risk_factors)
+        return result
+
+class BatchResults(Sequence):
+    """
+    Completed rows of one batch. Rows are appended as ValidationResult dicts
+    and read back as dicts (timestamps as ISO strings), so checkpointing and
+    exports work on it like on a list. summary is updated on every append.
+    """
+
+    def __init__(self, rows: Optional[Iterable[Dict[str, Any]]] = None):
+        self.records: List[CompactResult] = []
+        self.summary = BatchSummary()
+        if rows is not None:
+            self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [record.to_dict() for record in self.records[index]]
+        return self.records[index].to_dict()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.records)):
+            yield self.records[i].to_dict()
+
+    def append(self, result: Dict[str, Any]) -> None:
+        record = CompactResult(result)
+        self.records.append(record)
+        self.summary.add(record.validation_status, record.risk_level, record.risk_score, record.risk_factors)
+
+    def extend(self, results: Iterable[Dict[str, Any]]) -> None:
+        for result in results:
+            self.append(result)
+
+class BatchResultStore:
+    """
+    Results of running batches are pinned in memory. Once a batch finishes
+    (completed, paused or failed) its results are cached least recently
+    used, up to max_cached_rows rows in total and for at most idle_ttl
+    seconds after the last access. Evicted batches are only dropped from
+    memory: their rows are already in the checkpoint's results.jsonl, which
+    get() streams back, row by row, when the batch is requested again.
+
+    Summaries of evicted batches stay in memory (they are small), so
+    summary() never has to read rows back.
+
+    Finished batches older than retention seconds are forgotten entirely.
+    """
+
+    def __init__(
+        self,
+        checkpoints: BatchCheckpointStore,
+        max_cached_rows: int = 100000,
+        idle_ttl: float = 900.0,
+        retention: Optional[float] = None,
+        sweep_interval: float = 60.0
+    ):
+        self.checkpoints = checkpoints
+        self.max_cached_rows = max_cached_rows
+        self.idle_ttl = idle_ttl
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._active: Dict[str, BatchResults] = {}
+        # batch_id -> [results, last access (monotonic)]
+        self._cached: "OrderedDict[str, list]" = OrderedDict()
+        self._cached_rows = 0
+        # batch_id -> finish time (epoch seconds), for every finished batch
+        self._finished_at: Dict[str, float] = {}
+        # Summaries of finished batches whose results are not in memory
+        self._summaries: Dict[str, BatchSummary] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._evicted = 0
+        self._loaded = 0
+
+    def create(self, batch_id: str) -> BatchResults:
+        """Empty results for a new batch, pinned until release()"""
+        results = BatchResults()
+        with self._lock:
+            self._active[batch_id] = results
+        return results
+
+    def open(self, batch_id: str, rows: Optional[Iterable[Dict[str, Any]]] = None) -> BatchResults:
+        """Pin a batch's results for (re)processing, loading them if needed"""
+        with self._lock:
+            results = self._active.get(batch_id)
+            if results is not None:
+                return results
+            cached = self._cached.pop(batch_id, None)
+            self._finished_at.pop(batch_id, None)
+            self._summaries.pop(batch_id, None)
+            if cached is not None:
+                self._cached_rows -= len(cached[0])
+                results = cached[0]
+        if results is None:
+            results = BatchResults(rows if rows is not None else self._load(batch_id))
+        with self._lock:
+            self._active[batch_id] = results
+        return results
+
+    def release(self, batch_id: str, finished_at: Optional[float] = None) -> None:
+        """Unpin a batch that stopped running; its results become evictable"""
+        with self._lock:
+            results = self._active.pop(batch_id, None)
+            self._finished_at[batch_id] = finished_at or time.time()
+            if results is not None:
+                self._cache(batch_id, results)
+        self._trim()
+
+    def register(self, batch_id: str, finished_at: float, summary: Optional[BatchSummary] = None) -> None:
+        """Track a finished batch restored from its checkpoint, results left on disk"""
+        with self._lock:
+            self._finished_at[batch_id] = finished_at
+            if summary is not None:
+                self._summaries[batch_id] = summary
+
+    def get(self, batch_id: str) -> BatchResults:
+        """Results of a batch, running or finished, reloaded from disk if evicted"""
+        with self._lock:
+            results = self._active.get(batch_id)
+            if results is not None:
+                return results
+            cached = self._cached.get(batch_id)
+            if cached is not None:
+                cached[1] = time.monotonic()
+                self._cached.move_to_end(batch_id)
+                return cached[0]
+
+        results = BatchResults(self._load(batch_id))
+        with self._lock:
+            if batch_id not in self._cached and batch_id not in self._active:
+                self._cache(batch_id, results)
+        self._trim()
+        return results
+
+    def rows(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Rows of a batch for a single pass (exports, status). A batch in
+        memory is iterated in place; an evicted batch is streamed straight
+        from its checkpoint without being reloaded into the cache.
+        """
+        with self._lock:
+            results = self._active.get(batch_id)
+            if results is None:
+                cached = self._cached.get(batch_id)
+                if cached is not None:
+                    cached[1] = time.monotonic()
+                    self._cached.move_to_end(batch_id)
+                    results = cached[0]
+        if results is not None:
+            return iter(results)
+        return self.checkpoints.iter_results(batch_id)
+
+    def count(self, batch_id: str) -> int:
+        """Number of completed rows of a batch, without loading evicted rows"""
+        with self._lock:
+            results = self._active.get(batch_id)
+            if results is None and batch_id in self._cached:
+                results = self._cached[batch_id][0]
+            if results is not None:
+                return len(results)
+        return self.checkpoints.count_results(batch_id)
+
+    def summary(self, batch_id: str) -> BatchSummary:
+        """Running aggregates of a batch; reads rows only for old checkpoints without one"""
+        with self._lock:
+            results = self._active.get(batch_id)
+            if results is None and batch_id in self._cached:
+                results = self._cached[batch_id][0]
+            if results is not None:
+                return results.summary
+            summary = self._summaries.get(batch_id)
+        if summary is not None:
+            return summary
+        return self.get(batch_id).summary
+
+    def active_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._active)
+
+    def forget(self, batch_id: str) -> None:
+        with self._lock:
+            cached = self._cached.pop(batch_id, None)
+            if cached is not None:
+                self._cached_rows -= len(cached[0])
+            self._finished_at.pop(batch_id, None)
+            self._summaries.pop(batch_id, None)
+
+    def _load(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        self._loaded += 1
+        return self.checkpoints.iter_results(batch_id)
+
+    def _cache(self, batch_id: str, results: BatchResults) -> None:
+        """The caller holds the lock"""
+        self._cached[batch_id] = [results, time.monotonic()]
+        self._cached_rows += len(results)
+        self._summaries.pop(batch_id, None)
+
+    def _evict(self, batch_id: str, results: BatchResults) -> bool:
+        """
+        Drop a cached batch once all of its rows are on disk. Called without
+        the lock, as the rows are written first; the batch stays cached if
+        they cannot be written, and is left alone if it was reopened or
+        forgotten meanwhile.
+        """
+        try:
+            self.checkpoints.append_results(batch_id, results)
+        except OSError as e:
+            logger.error(f"Keeping batch {batch_id} in memory, results could not be written: {str(e)}")
+            with self._lock:
+                if batch_id in self._cached:
+                    self._cached.move_to_end(batch_id)
+            return False
+
+        with self._lock:
+            cached = self._cached.get(batch_id)
+            if cached is None or cached[0] is not results:
+                return False
+            del self._cached[batch_id]
+            self._cached_rows -= len(results)
+            self._summaries[batch_id] = results.summary
+            self._evicted += 1
+        return True
+
+    def _trim(self) -> None:
+        with self._lock:
+            excess = self._cached_rows - self.max_cached_rows
+            victims: List[Tuple[str, BatchResults]] = []
+            for batch_id, (results, _) in self._cached.items():
+                if excess <= 0:
+                    break
+                victims.append((batch_id, results))
+                excess -= len(results)
+        for batch_id, results in victims:
+            self._evict(batch_id, results)
+
+    def sweep(self) -> List[str]:
+        """Evict idle batches; returns (and forgets) the batches past retention"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                (batch_id, results) for batch_id, (results, last_access) in self._cached.items()
+                if now - last_access > self.idle_ttl
+            ]
+        for batch_id, results in idle:
+            self._evict(batch_id, results)
+
+        with self._lock:
+            expired = []
+            if self.retention:
+                cutoff = time.time() - self.retention
+                expired = [batch_id for batch_id, finished_at in self._finished_at.items() if finished_at < cutoff]
+        for batch_id in expired:
+            self.forget(batch_id)
+        return expired
+
+    async def start(self, on_expired: Callable[[str], None]) -> None:
+        """Sweep periodically; on_expired removes what else is kept for a batch"""
+        async def run():
+            loop = asyncio.get_running_loop()
+            while True:
+                await asyncio.sleep(self.sweep_interval)
+                try:
+                    for batch_id in await loop.run_in_executor(None, self.sweep):
+                        on_expired(batch_id)
+                except Exception as e:
+                    logger.error(f"Error sweeping batch results: {str(e)}")
+
+        self._task = asyncio.create_task(run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running_batches": len(self._active),
+                "running_rows": sum(len(results) for results in self._active.values()),
+                "cached_batches": len(self._cached),
+                "cached_rows": self._cached_rows,
+                "max_cached_rows": self.max_cached_rows,
+                "finished_batches": len(self._finished_at),
+                "evicted": self._evicted,
+                "loaded_from_disk": self._loaded
+            }
+
+def _retention_from_env() -> Optional[float]:
+    hours = float(os.getenv("BATCH_RETENTION_HOURS", "168"))
+    return hours * 3600 if hours > 0 else None
+
+# Global instance
+batch_result_store = BatchResultStore(
+    checkpoint_store,
+    max_cached_rows=int(os.getenv("BATCH_CACHE_MAX_ROWS", "100000")),
+    idle_ttl=float(os.getenv("BATCH_CACHE_IDLE_TTL", "900")),
+    retention=_retention_from_env()
+)
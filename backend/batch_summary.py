@@ -0,0 +1,103 @@
+"""
+Batch Summary - Running aggregates of a batch's results, updated as rows
+complete so a summary never needs the rows themselves
+"""
+
+import heapq
+import threading
+from typing import Optional, Dict, Any, Sequence
+
+HISTOGRAM_BUCKETS = 10
+BUCKET_WIDTH = 100 / HISTOGRAM_BUCKETS
+
+class BatchSummary:
+    """
+    Counts per validation_status and risk_level, a risk score histogram
+    (ten buckets of 10 points) and risk factor frequencies.
+
+    Most risk factors come from a small fixed set, but some embed values
+    ("3 other merchants at the same location"). At most max_factors
+    distinct factors are tracked; beyond that the least frequent one is
+    replaced and its count carried over (Space-Saving), which keeps the
+    top factors right while bounding memory.
+    """
+
+    def __init__(self, max_factors: int = 500):
+        self.max_factors = max_factors
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.validation_statuses: Dict[str, int] = {}
+        self.risk_levels: Dict[str, int] = {}
+        self.risk_score_sum = 0.0
+        self.scored_rows = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.risk_factors: Dict[str, int] = {}
+
+    def add(self, validation_status: Optional[str], risk_level: Optional[str], risk_score: Optional[float], risk_factors: Sequence[str]) -> None:
+        with self._lock:
+            self.rows += 1
+            if validation_status:
+                self.validation_statuses[validation_status] = self.validation_statuses.get(validation_status, 0) + 1
+            if risk_level:
+                self.risk_levels[risk_level] = self.risk_levels.get(risk_level, 0) + 1
+            if risk_score is not None:
+                self.risk_score_sum += risk_score
+                self.scored_rows += 1
+                bucket = min(max(int(risk_score // BUCKET_WIDTH), 0), HISTOGRAM_BUCKETS - 1)
+                self.histogram[bucket] += 1
+
+            factors = self.risk_factors
+            for factor in set(risk_factors):
+                count = factors.get(factor)
+                if count is not None:
+                    factors[factor] = count + 1
+                elif len(factors) < self.max_factors:
+                    factors[factor] = 1
+                else:
+                    evicted = min(factors, key=factors.get)
+                    factors[factor] = factors.pop(evicted) + 1
+
+    def to_dict(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            top_factors = heapq.nlargest(top, self.risk_factors.items(), key=lambda item: item[1])
+            return {
+                "rows": self.rows,
+                "validation_statuses": dict(self.validation_statuses),
+                "risk_levels": dict(self.risk_levels),
+                "average_risk_score": round(self.risk_score_sum / self.scored_rows, 2) if self.scored_rows else None,
+                "risk_score_histogram": [
+                    {"from": int(i * BUCKET_WIDTH), "to": int((i + 1) * BUCKET_WIDTH), "count": count}
+                    for i, count in enumerate(self.histogram)
+                ],
+                "top_risk_factors": [
+                    {"factor": factor, "count": count, "share": round(count / self.rows, 4)}
+                    for factor, count in top_factors
+                ]
+            }
+
+    def state(self) -> Dict[str, Any]:
+        """Checkpointable form, read back by from_state()"""
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "validation_statuses": dict(self.validation_statuses),
+                "risk_levels": dict(self.risk_levels),
+                "risk_score_sum": self.risk_score_sum,
+                "scored_rows": self.scored_rows,
+                "histogram": list(self.histogram),
+                "risk_factors": dict(self.risk_factors)
+            }
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]]) -> Optional["BatchSummary"]:
+        if not state:
+            return None
+        summary = cls()
+        summary.rows = state["rows"]
+        summary.validation_statuses = dict(state["validation_statuses"])
+        summary.risk_levels = dict(state["risk_levels"])
+        summary.risk_score_sum = state["risk_score_sum"]
+        summary.scored_rows = state["scored_rows"]
+        summary.histogram = list(state["histogram"])
+        summary.risk_factors = dict(state["risk_factors"])
+        return summary
@@ -0,0 +1,213 @@
+"""
+Circuit Breaker - Fails calls to a struggling upstream API immediately
+instead of letting every request wait out its timeout
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+class UpstreamUnavailable(Exception):
+    """An upstream API is failing, or its circuit is open"""
+
+    def __init__(self, upstream: str, retry_after: Optional[int] = None):
+        super().__init__(f"{upstream} is unavailable")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and their outcomes over the last window
+    seconds are counted. Once at least min_calls were made and
+    failure_rate of them failed, the circuit opens.
+
+    Open: calls raise UpstreamUnavailable right away for open_seconds.
+
+    Half-open: up to probes calls at a time go through. When probes of
+    them have succeeded the circuit closes; any failure opens it again.
+
+    is_failure decides which exceptions count against the upstream; other
+    exceptions (a place that does not exist, a parse error) count as
+    successful calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window: float = 60.0,
+        open_seconds: float = 30.0,
+        probes: int = 2,
+        is_failure: Callable[[Exception], bool] = lambda error: True
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(min_calls, 1)
+        self.window = window
+        self.open_seconds = open_seconds
+        self.probes = max(probes, 1)
+        self.is_failure = is_failure
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        # [second, calls, failures]
+        self._outcomes: deque = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._rejected = 0
+        self._opened = 0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._opened += 1
+        logger.warning(f"Circuit for {self.name} opened for {self.open_seconds:.0f}s")
+
+    def _retry_after(self, now: float) -> int:
+        return max(int(math.ceil(self._opened_at + self.open_seconds - now)), 1)
+
+    def before_call(self) -> bool:
+        """Admit a call or raise UpstreamUnavailable; True if the call is a half-open probe"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN:
+                if now < self._opened_at + self.open_seconds:
+                    self._rejected += 1
+                    raise UpstreamUnavailable(self.name, self._retry_after(now))
+                self._state = HALF_OPEN
+                self._probe_successes = 0
+                self._probes_in_flight = 0
+
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    self._rejected += 1
+                    raise UpstreamUnavailable(self.name, 1)
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, failed: bool, probe: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if self._state != HALF_OPEN:
+                    return
+                if failed:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._state = CLOSED
+                        logger.info(f"Circuit for {self.name} closed")
+                return
+
+            if self._state != CLOSED:
+                return
+            second = int(now)
+            if self._outcomes and self._outcomes[-1][0] == second:
+                self._outcomes[-1][1] += 1
+                self._outcomes[-1][2] += int(failed)
+            else:
+                self._outcomes.append([second, 1, int(failed)])
+            if not failed:
+                return
+
+            self._trim(now)
+            calls = sum(bucket[1] for bucket in self._outcomes)
+            failures = sum(bucket[2] for bucket in self._outcomes)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now)
+
+    @contextmanager
+    def call(self):
+        """Guard one upstream call: fail fast while open, record the outcome otherwise"""
+        probe = self.before_call()
+        try:
+            yield
+        except Exception as e:
+            self.record(self.is_failure(e), probe)
+            raise
+        except BaseException:
+            # Cancelled or interrupted: no verdict on the upstream
+            if probe:
+                with self._lock:
+                    self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            raise
+        self.record(False, probe)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        state = self.state
+        with self._lock:
+            self._trim(now)
+            calls = sum(bucket[1] for bucket in self._outcomes)
+            failures = sum(bucket[2] for bucket in self._outcomes)
+            return {
+                "state": state,
+                "recent_calls": calls,
+                "recent_failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "retry_after": self._retry_after(now) if state == OPEN else None,
+                "times_opened": self._opened,
+                "rejected": self._rejected
+            }
+
+def _google_failure(error: Exception) -> bool:
+    """
+    Timeouts, transport errors and quota or server errors; not NOT_FOUND
+    and the like. httpx errors come from the image proxy, which only
+    raises status errors for 429 and 5xx.
+    """
+    import googlemaps.exceptions
+    if isinstance(error, googlemaps.exceptions.ApiError):
+        return error.status in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
+    return isinstance(error, (googlemaps.exceptions.Timeout, googlemaps.exceptions.TransportError, httpx.HTTPError))
+
+def _receitaws_failure(error: Exception) -> bool:
+    return isinstance(error, (httpx.HTTPError, UpstreamUnavailable))
+
+def _breaker_from_env(name: str, prefix: str, is_failure: Callable[[Exception], bool], min_calls: str, window: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_rate=float(os.getenv(f"{prefix}_BREAKER_FAILURE_RATE", "0.5")),
+        min_calls=int(os.getenv(f"{prefix}_BREAKER_MIN_CALLS", min_calls)),
+        window=float(os.getenv(f"{prefix}_BREAKER_WINDOW_SECONDS", window)),
+        open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "30")),
+        probes=int(os.getenv(f"{prefix}_BREAKER_PROBES", "2")),
+        is_failure=is_failure
+    )
+
+# Global instances
+google_breaker = _breaker_from_env("google", "GOOGLE", _google_failure, min_calls="10", window="60")
+# ReceitaWS sees a few calls per minute, so it trips on fewer calls over a longer window
+receitaws_breaker = _breaker_from_env("receitaws", "RECEITAWS", _receitaws_failure, min_calls="3", window="300")
+
+def breaker_stats() -> Dict[str, Any]:
+    return {breaker.name: breaker.stats() for breaker in (google_breaker, receitaws_breaker)}
@@ -0,0 +1,212 @@
+"""
+CNPJ Name Index - Inverted token index over registered company and trade names
+"""
+
+import re
+import csv
+import heapq
+import logging
+import threading
+from array import array
+from typing import Optional, Dict, Any, List, Tuple
+
+from cnpj_service import cnpj_service
+
+logger = logging.getLogger(__name__)
+
+_STATE_CODES = {
+    "ac", "al", "ap", "am", "ba", "ce", "df", "es", "go", "ma", "mt", "ms", "mg", "pa",
+    "pb", "pr", "pe", "pi", "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to"
+}
+
+# Address parts: "Rua X, 100 - Centro, Campinas - SP" or "Campinas/SP"
+_ADDRESS_SEPARATORS = re.compile(r"\s*[,;/]\s*|\s+-\s+|-(?=[a-z]{2}\s*$)")
+# Parts after the locality: postal codes, numbers and the country
+_TRAILING_PART = re.compile(r"(cep\s*)?[\d.\- ]*|brasil|brazil")
+
+class CNPJNameIndex:
+    """In-memory inverted index used to find candidate CNPJs for a merchant name"""
+
+    def __init__(self, max_postings: int = 10000, max_ranked: int = 200):
+        # Tokens with more postings than this (e.g. "ltda", "comercio") are not
+        # used to generate candidates unless no rarer token is available
+        self.max_postings = max_postings
+        # Upper bound on candidates that get a full Jaccard ranking
+        self.max_ranked = max_ranked
+
+        self._lock = threading.Lock()
+        self._postings: Dict[str, array] = {}
+        # The same postings split by city, so a city-scoped search only
+        # reads that city's entries
+        self._city_postings: Dict[Tuple[str, int], array] = {}
+        self._doc_by_cnpj: Dict[str, int] = {}
+        self._cnpjs: List[str] = []
+        self._company_names: List[str] = []
+        self._trade_names: List[str] = []
+        self._doc_city = array('I')
+        self._city_ids: Dict[str, int] = {}
+        self._city_names: List[str] = [""]
+
+    def __len__(self) -> int:
+        return len(self._cnpjs)
+
+    def _tokens(self, *names: Optional[str]) -> set:
+        """Tokenize names exactly like compare_business_names does"""
+        tokens = set()
+        for name in names:
+            if name:
+                tokens.update(cnpj_service.normalize_name(name).split())
+        return tokens
+
+    def _city_id(self, city: Optional[str], create: bool = False) -> Optional[int]:
+        normalized = cnpj_service.normalize_name(city) if city else ""
+        if not normalized:
+            return 0 if create else None
+        city_id = self._city_ids.get(normalized)
+        if city_id is None and create:
+            city_id = len(self._city_names)
+            self._city_ids[normalized] = city_id
+            self._city_names.append(city or "")
+        return city_id
+
+    def add(self, cnpj: str, company_name: str, trade_name: Optional[str] = None, city: Optional[str] = None) -> bool:
+        """Add a registry entry to the index. Returns False if it was skipped."""
+        clean_cnpj = cnpj_service.clean_cnpj(cnpj)
+        if not cnpj_service.validate_cnpj_format(clean_cnpj):
+            return False
+
+        tokens = self._tokens(company_name, trade_name)
+        if not tokens:
+            return False
+
+        with self._lock:
+            if clean_cnpj in self._doc_by_cnpj:
+                # Registry entries are immutable enough for screening purposes
+                return False
+
+            doc_id = len(self._cnpjs)
+            self._doc_by_cnpj[clean_cnpj] = doc_id
+            self._cnpjs.append(clean_cnpj)
+            self._company_names.append(company_name or "")
+            self._trade_names.append(trade_name or "")
+            self._doc_city.append(self._city_id(city, create=True))
+
+            city_id = self._doc_city[doc_id]
+            for token in tokens:
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = array('I')
+                posting.append(doc_id)
+                if city_id:
+                    posting = self._city_postings.get((token, city_id))
+                    if posting is None:
+                        posting = self._city_postings[(token, city_id)] = array('I')
+                    posting.append(doc_id)
+
+        return True
+
+    def add_cnpj_data(self, cnpj_data: Dict[str, Any]) -> bool:
+        """Index a normalized record returned by CNPJService.get_cnpj_data"""
+        if not cnpj_data:
+            return False
+        return self.add(
+            cnpj_data.get('cnpj', ''),
+            cnpj_data.get('company_name', ''),
+            cnpj_data.get('trade_name'),
+            cnpj_data.get('address', {}).get('city')
+        )
+
+    def load_csv(self, path: str) -> int:
+        """
+        Load a registry extract with columns cnpj, company_name, trade_name and city
+        """
+        loaded = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if self.add(row.get('cnpj', ''), row.get('company_name', ''), row.get('trade_name'), row.get('city')):
+                    loaded += 1
+
+        logger.info(f"Loaded {loaded} CNPJ registry entries from {path}")
+        return loaded
+
+    def match_city(self, address: Optional[str]) -> Optional[str]:
+        """
+        The registry city an address is in, read from its locality part
+        only: the last part before the state code, postal code and country.
+        Street names ("Rua Sao Paulo") are never taken for the city.
+        """
+        if not address or not self._city_ids:
+            return None
+
+        parts = _ADDRESS_SEPARATORS.split(cnpj_service.normalize_name(address))
+        for part in reversed(parts):
+            part = " ".join(part.split())
+            if part in _STATE_CODES or _TRAILING_PART.fullmatch(part):
+                continue
+            city_id = self._city_ids.get(part)
+            return self._city_names[city_id] if city_id is not None else None
+        return None
+
+    def search(self, merchant_name: str, city: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return the top candidate CNPJs for a merchant name, ranked by Jaccard similarity
+        """
+        tokens = self._tokens(merchant_name)
+        if not tokens or limit <= 0:
+            return []
+
+        city_id = None
+        if city:
+            city_id = self._city_id(city)
+            if city_id is None:
+                return []
+
+        if city_id is None:
+            postings = (self._postings.get(token) for token in tokens)
+        else:
+            postings = (self._city_postings.get((token, city_id)) for token in tokens)
+        postings = sorted((posting for posting in postings if posting is not None), key=len)
+        if not postings:
+            return []
+
+        # Count shared tokens from the rarest postings only. Very common tokens
+        # would mean scanning most of the registry; they still count towards
+        # the final Jaccard ranking below.
+        doc_city = self._doc_city
+        if len(postings[0]) > self.max_postings:
+            # Only common tokens: every entry would share just the rarest
+            # one, so counting would not order them
+            top_docs = postings[0][:self.max_ranked]
+        else:
+            shared: Dict[int, int] = {}
+            for i, posting in enumerate(postings):
+                if i > 0 and len(posting) > self.max_postings:
+                    break
+                for doc_id in posting:
+                    shared[doc_id] = shared.get(doc_id, 0) + 1
+            top_docs = heapq.nlargest(self.max_ranked, shared, key=shared.get)
+
+        merchant_normalized = cnpj_service.normalize_name(merchant_name)
+        candidates = []
+        for doc_id in top_docs:
+            company_name = self._company_names[doc_id]
+            trade_name = self._trade_names[doc_id]
+            company_similarity = cnpj_service._calculate_name_similarity(
+                merchant_normalized, cnpj_service.normalize_name(company_name)
+            )
+            trade_similarity = cnpj_service._calculate_name_similarity(
+                merchant_normalized, cnpj_service.normalize_name(trade_name)
+            )
+            candidates.append({
+                'cnpj': self._cnpjs[doc_id],
+                'company_name': company_name,
+                'trade_name': trade_name or None,
+                'city': self._city_names[doc_city[doc_id]] or None,
+                'similarity_score': max(company_similarity, trade_similarity)
+            })
+
+        candidates.sort(key=lambda c: c['similarity_score'], reverse=True)
+        return candidates[:limit]
+
+# Global instance
+cnpj_name_index = CNPJNameIndex()
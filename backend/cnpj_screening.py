@@ -0,0 +1,261 @@
+"""
+CNPJ Screening - Matches merchants to CNPJs and compares them with the
+registry data, for single validations and as a stage of batches
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, CancelledError
+from typing import Optional, Dict, Any, List, Tuple
+
+from models import CNPJData, CNPJComparison
+from cnpj_service import cnpj_service
+from cnpj_index import cnpj_name_index
+from scoring import compare_addresses
+from circuit_breaker import UpstreamUnavailable
+from deadline import DeadlineExceeded
+from profiling import stage
+from upstream_scheduler import upstream_priority, BATCH
+
+logger = logging.getLogger(__name__)
+
+CNPJ_NAME_MATCH_THRESHOLD = float(os.getenv("CNPJ_NAME_MATCH_THRESHOLD", "0.9"))
+
+def resolve_cnpj(merchant_name: str, merchant_address: Optional[str] = None) -> Tuple[Optional[str], str, List[Dict[str, Any]]]:
+    """
+    (cnpj, match_source, candidates): a CNPJ written in the name or address,
+    else the best registry index match if it is in the address's city and
+    its name similarity reaches CNPJ_NAME_MATCH_THRESHOLD
+    """
+    search_text = f"{merchant_name} {merchant_address or ''}"
+    cnpj = cnpj_service.extract_cnpj_from_text(search_text)
+    if cnpj:
+        return cnpj, "TEXT", []
+
+    # Fall back to the registry name index
+    city = cnpj_name_index.match_city(merchant_address)
+    # The city narrows the search, unless nothing there matches the name
+    candidates = (city and cnpj_name_index.search(merchant_name, city=city)) or cnpj_name_index.search(merchant_name)
+    # An adopted CNPJ adds its registry risk to the merchant's score, so a
+    # guess needs a near-exact name in the same city; anything weaker is
+    # only reported as candidates
+    best = candidates[0] if candidates else None
+    if best and city and best['city'] == city and best['similarity_score'] >= CNPJ_NAME_MATCH_THRESHOLD:
+        return best['cnpj'], "NAME_INDEX", candidates
+    return None, "NAME_INDEX", candidates
+
+def compare_with_registry(merchant_name: str, merchant_address: Optional[str], cnpj_data: Optional[Dict[str, Any]], match_source: str, candidates: List[Dict[str, Any]]) -> CNPJComparison:
+    """Compare a merchant with the fetched registry data of its CNPJ (None if it could not be fetched)"""
+    if not cnpj_data:
+        return CNPJComparison(
+            cnpj_found=True,
+            cnpj_data=None,
+            name_comparison=None,
+            address_comparison=None,
+            risk_assessment={'error': 'Could not fetch CNPJ data'},
+            match_source=match_source,
+            candidates=candidates
+        )
+
+    # Compare business names
+    name_comparison = cnpj_service.compare_business_names(merchant_name, cnpj_data)
+
+    # Compare addresses if available
+    address_comparison = None
+    if merchant_address and cnpj_data.get('address', {}).get('full_address'):
+        cnpj_address = cnpj_data['address']['full_address']
+        address_comparison = compare_addresses(merchant_address, cnpj_address)
+
+    # Assess CNPJ-specific risk factors
+    cnpj_risk = cnpj_service.assess_cnpj_risk_factors(cnpj_data)
+
+    return CNPJComparison(
+        cnpj_found=True,
+        cnpj_data=CNPJData(**cnpj_data),
+        name_comparison=name_comparison,
+        address_comparison=address_comparison.dict() if address_comparison else None,
+        risk_assessment=cnpj_risk,
+        match_source=match_source,
+        candidates=candidates
+    )
+
+def unavailable_comparison(match_source: str, candidates: List[Dict[str, Any]]) -> CNPJComparison:
+    """CNPJ known but ReceitaWS down: the CNPJ checks are skipped, not failed"""
+    return CNPJComparison(
+        cnpj_found=True,
+        cnpj_data=None,
+        name_comparison=None,
+        address_comparison=None,
+        risk_assessment={'error': 'CNPJ service unavailable'},
+        match_source=match_source,
+        candidates=candidates,
+        service_unavailable=True
+    )
+
+def not_found_comparison(candidates: List[Dict[str, Any]]) -> CNPJComparison:
+    return CNPJComparison(
+        cnpj_found=False,
+        cnpj_data=None,
+        name_comparison=None,
+        address_comparison=None,
+        risk_assessment=None,
+        candidates=candidates
+    )
+
+async def process_cnpj_data(merchant_name: str, merchant_address: Optional[str] = None) -> Optional[CNPJComparison]:
+    """Process CNPJ data for Brazilian merchants"""
+    try:
+        with stage("cnpj.resolve"):
+            cnpj, match_source, candidates = resolve_cnpj(merchant_name, merchant_address)
+        if not cnpj:
+            return not_found_comparison(candidates)
+
+        # Fetch CNPJ data; while ReceitaWS is down, skip the CNPJ checks.
+        # Other requests run on this thread while it waits, so it is not sampled.
+        try:
+            with stage("cnpj.receitaws", sample=False):
+                cnpj_data = await cnpj_service.get_cnpj_data(cnpj)
+        except UpstreamUnavailable:
+            return unavailable_comparison(match_source, candidates)
+
+        if cnpj_data:
+            cnpj_name_index.add_cnpj_data(cnpj_data)
+        with stage("cnpj.compare"):
+            return compare_with_registry(merchant_name, merchant_address, cnpj_data, match_source, candidates)
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing CNPJ data: {str(e)}")
+        return CNPJComparison(
+            cnpj_found=False,
+            cnpj_data=None,
+            name_comparison=None,
+            address_comparison=None,
+            risk_assessment={'error': str(e)}
+        )
+
+class BatchCNPJStage:
+    """
+    CNPJ screening of one batch, running next to its Google stage.
+
+    Every row's CNPJ is resolved up front (locally, from the text or the
+    registry index). Each distinct CNPJ is then fetched once, in order of
+    first appearance, on the stage's own event loop thread with at most
+    concurrency requests in flight. The requests carry the batch's
+    priority, so the ReceitaWS scheduler paces them at the batch rate and
+    shares it with other batches. While ReceitaWS is unavailable a fetch
+    is retried up to retries times before its rows are marked unavailable.
+    """
+
+    def __init__(self, batch_id: str, merchants: List[Any], concurrency: int = 2, retries: int = 3):
+        self.batch_id = batch_id
+        self.concurrency = max(concurrency, 1)
+        self.retries = max(retries, 1)
+        # Per row: (name, address, cnpj, match_source, candidates)
+        self._rows = [
+            (merchant.merchant_name, merchant.address, *resolve_cnpj(merchant.merchant_name, merchant.address))
+            for merchant in merchants
+        ]
+        self._fetches: Dict[str, Future] = {}
+        for _, _, cnpj, _, _ in self._rows:
+            if cnpj and cnpj not in self._fetches:
+                self._fetches[cnpj] = Future()
+
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self) -> "BatchCNPJStage":
+        if self._fetches:
+            self._thread = threading.Thread(target=self._run, name=f"cnpj-{self.batch_id[:8]}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        with upstream_priority(BATCH, self.batch_id):
+            try:
+                asyncio.run(self._fetch_all())
+            except asyncio.CancelledError:
+                pass
+
+    async def _fetch_all(self) -> None:
+        with self._lock:
+            if self._stopped:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(cnpj: str, future: Future) -> None:
+            async with semaphore:
+                if not future.set_running_or_notify_cancel():
+                    return
+                for attempt in range(self.retries):
+                    try:
+                        cnpj_data = await cnpj_service.get_cnpj_data(cnpj)
+                        if cnpj_data:
+                            cnpj_name_index.add_cnpj_data(cnpj_data)
+                        future.set_result(cnpj_data)
+                        return
+                    except UpstreamUnavailable as e:
+                        if attempt == self.retries - 1:
+                            future.set_exception(e)
+                            return
+                        await asyncio.sleep(e.retry_after or 5)
+                    except asyncio.CancelledError:
+                        future.set_exception(UpstreamUnavailable("receitaws"))
+                        raise
+                    except Exception as e:
+                        future.set_exception(e)
+                        return
+
+        try:
+            await asyncio.gather(*(fetch(cnpj, future) for cnpj, future in self._fetches.items()))
+        finally:
+            with self._lock:
+                self._loop = None
+                self._task = None
+
+    def ready(self, index: int) -> bool:
+        """True if row index can be compared without waiting"""
+        cnpj = self._rows[index][2]
+        return not cnpj or self._fetches[cnpj].done()
+
+    def comparison(self, index: int) -> CNPJComparison:
+        """The CNPJ comparison of row index (of the merchants given), waiting for its fetch"""
+        name, address, cnpj, match_source, candidates = self._rows[index]
+        if not cnpj:
+            return not_found_comparison(candidates)
+        try:
+            cnpj_data = self._fetches[cnpj].result()
+        except (UpstreamUnavailable, CancelledError):
+            return unavailable_comparison(match_source, candidates)
+        except Exception as e:
+            logger.error(f"Error processing CNPJ data: {str(e)}")
+            return CNPJComparison(cnpj_found=False, risk_assessment={'error': str(e)})
+        return compare_with_registry(name, address, cnpj_data, match_source, candidates)
+
+    def close(self) -> None:
+        """Stop fetching; rows still waiting read as unavailable"""
+        with self._lock:
+            self._stopped = True
+            if self._loop is not None and self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+        for future in self._fetches.values():
+            future.cancel()
+
+# Rows the Google stage may run ahead of the CNPJ stage
+BATCH_CNPJ_LOOKAHEAD = int(os.getenv("BATCH_CNPJ_LOOKAHEAD", "1000"))
+
+def batch_cnpj_stage(batch_id: str, merchants: List[Any]) -> BatchCNPJStage:
+    return BatchCNPJStage(
+        batch_id,
+        merchants,
+        concurrency=int(os.getenv("BATCH_CNPJ_CONCURRENCY", "2")),
+        retries=int(os.getenv("BATCH_CNPJ_RETRIES", "3"))
+    ).start()
@@ -8,6 +8,10 @@ import logging
 from typing import Optional, Dict, Any
 from unidecode import unidecode
 import asyncio
+from contextlib import asynccontextmanager
+from upstream_scheduler import receitaws_scheduler
+from circuit_breaker import receitaws_breaker, UpstreamUnavailable
+from watchlist import partner_watchlist
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +22,28 @@ class CNPJService:
         # Using ReceitaWS API as it's free and reliable
         self.base_url = "https://www.receitaws.com.br/v1/cnpj"
         self.timeout = 10.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def start(self):
+        """Create the pooled HTTP client (called from the app lifespan)"""
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        self._client_loop = asyncio.get_running_loop()
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+    
+    @asynccontextmanager
+    async def _http_client(self):
+        """The pooled client, or a short-lived one outside the API event loop (batch threads)"""
+        if self._client is not None and asyncio.get_running_loop() is self._client_loop:
+            yield self._client
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                yield client
         
     def clean_cnpj(self, cnpj: str) -> str:
         """Clean CNPJ string, removing non-numeric characters"""
@@ -48,7 +74,9 @@ class CNPJService:
     
     async def get_cnpj_data(self, cnpj: str) -> Optional[Dict[str, Any]]:
         """
-        Fetch CNPJ data from Receita Federal via ReceitaWS API
+        Fetch CNPJ data from Receita Federal via ReceitaWS API. None if the
+        CNPJ is invalid or unknown; raises UpstreamUnavailable if ReceitaWS
+        is failing or its circuit is open.
         """
         clean_cnpj = self.clean_cnpj(cnpj)
         
@@ -57,30 +85,34 @@ class CNPJService:
             return None
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/{clean_cnpj}")
-                
-                if response.status_code == 200:
-                    data = response.json()
+            with receitaws_breaker.call():
+                async with receitaws_scheduler.aslot(), self._http_client() as client:
+                    response = await client.get(f"{self.base_url}/{clean_cnpj}")
                     
-                    # Check if the response contains error
-                    if data.get('status') == 'ERROR':
-                        logger.warning(f"CNPJ API error for {clean_cnpj}: {data.get('message')}")
-                        return None
+                    if response.status_code == 200:
+                        data = response.json()
+                        
+                        # Check if the response contains error
+                        if data.get('status') == 'ERROR':
+                            logger.warning(f"CNPJ API error for {clean_cnpj}: {data.get('message')}")
+                            return None
+                        
+                        return self._normalize_cnpj_data(data)
                     
-                    return self._normalize_cnpj_data(data)
-                
-                elif response.status_code == 429:
-                    logger.warning("CNPJ API rate limit exceeded")
-                    return None
-                
-                else:
-                    logger.error(f"CNPJ API error: {response.status_code}")
-                    return None
+                    elif response.status_code == 429 or response.status_code >= 500:
+                        # Counted by the circuit breaker
+                        logger.warning(f"CNPJ API unavailable: {response.status_code}")
+                        raise UpstreamUnavailable("receitaws")
                     
-        except httpx.TimeoutException:
-            logger.error(f"Timeout fetching CNPJ data for {clean_cnpj}")
-            return None
+                    else:
+                        logger.error(f"CNPJ API error: {response.status_code}")
+                        return None
+                    
+        except UpstreamUnavailable:
+            raise
+        except httpx.HTTPError as e:
+            logger.error(f"Error reaching CNPJ API for {clean_cnpj}: {str(e) or type(e).__name__}")
+            raise UpstreamUnavailable("receitaws")
         except Exception as e:
             logger.error(f"Error fetching CNPJ data for {clean_cnpj}: {str(e)}")
             return None
@@ -140,6 +172,12 @@ class CNPJService:
         
         return " - ".join(parts)
     
+    def normalize_name(self, name: Optional[str]) -> str:
+        """Normalize a business name for comparison (lowercase, no accents)"""
+        if not name:
+            return ''
+        return unidecode(name.lower().strip())
+    
     def compare_business_names(self, merchant_name: str, cnpj_data: Dict[str, Any]) -> Dict[str, Any]:
         """Compare merchant name with CNPJ registered names"""
         if not merchant_name or not cnpj_data:
@@ -151,12 +189,12 @@ class CNPJService:
             }
         
         # Normalize names for comparison
-        merchant_normalized = unidecode(merchant_name.lower().strip())
+        merchant_normalized = self.normalize_name(merchant_name)
         company_name = cnpj_data.get('company_name', '')
         trade_name = cnpj_data.get('trade_name', '')
         
-        company_normalized = unidecode(company_name.lower().strip()) if company_name else ''
-        trade_normalized = unidecode(trade_name.lower().strip()) if trade_name else ''
+        company_normalized = self.normalize_name(company_name)
+        trade_normalized = self.normalize_name(trade_name)
         
         # Calculate similarities
         company_similarity = self._calculate_name_similarity(merchant_normalized, company_normalized)
@@ -250,7 +288,15 @@ class CNPJService:
             risk_factors.append("Micro Individual Entrepreneur (MEI)")
             risk_score += 5
         
+        # Screen partners (QSA) against the sanctions/PEP watchlist
+        partner_hits = partner_watchlist.screen_partners(cnpj_data.get('partners') or [])
+        for hit in partner_hits:
+            risk_factors.append(f"Partner {hit['partner']} matches {hit['list']} watchlist entry {hit['name']} ({hit['similarity']:.0%})")
+            risk_score += hit['risk_score']
+        
         recommendations = []
+        if partner_hits:
+            recommendations.append("Review partner watchlist matches before approving")
         if risk_score > 30:
             recommendations.append("Enhanced due diligence recommended")
         if risk_score > 50:
@@ -261,7 +307,8 @@ class CNPJService:
         return {
             'risk_factors': risk_factors,
             'risk_score': min(risk_score, 100),
-            'recommendations': recommendations
+            'recommendations': recommendations,
+            'partner_hits': partner_hits
         }
 
 # Global instance
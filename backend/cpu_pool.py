@@ -0,0 +1,104 @@
+"""
+CPU Pool - Process pool for the CPU-bound scoring stage of large batches
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Tuple
+
+from models import MerchantInfo, CNPJComparison
+from scoring import compare_addresses, calculate_risk_score
+
+logger = logging.getLogger(__name__)
+
+# (merchant_info, provided_address, transaction_amount, colocation_count, cnpj_comparison)
+# as plain dicts/scalars, which pickle much faster than Pydantic models
+ScoringItem = Tuple[Optional[Dict[str, Any]], Optional[str], Optional[float], int, Optional[Dict[str, Any]]]
+ScoredItem = Tuple[Optional[Dict[str, Any]], Dict[str, Any]]
+
+def scoring_item(merchant_request: Any, merchant_info: Optional[MerchantInfo], colocation_count: int = 0, cnpj_comparison: Optional[CNPJComparison] = None) -> ScoringItem:
+    """Pack one merchant for the scoring workers"""
+    return (
+        merchant_info.dict() if merchant_info else None,
+        merchant_request.address,
+        merchant_request.transaction_amount,
+        colocation_count,
+        cnpj_comparison.dict() if cnpj_comparison else None
+    )
+
+def score_chunk(items: List[ScoringItem]) -> List[ScoredItem]:
+    """Address comparison and risk scoring for a chunk of merchants (runs in a worker process)"""
+    scored = []
+    for merchant_info_data, provided_address, transaction_amount, colocation_count, cnpj_data in items:
+        merchant_info = MerchantInfo(**merchant_info_data) if merchant_info_data else None
+        cnpj_comparison = CNPJComparison(**cnpj_data) if cnpj_data else None
+
+        address_comparison = None
+        if merchant_info and provided_address:
+            address_comparison = compare_addresses(provided_address, merchant_info.address)
+
+        risk_assessment = calculate_risk_score(
+            merchant_info, transaction_amount, address_comparison, cnpj_comparison, colocation_count
+        )
+        scored.append((
+            address_comparison.dict() if address_comparison else None,
+            risk_assessment.dict()
+        ))
+    return scored
+
+def _workers_from_env() -> int:
+    workers = os.getenv("CPU_POOL_WORKERS", "0").strip().lower()
+    if workers == "auto":
+        return os.cpu_count() or 1
+    return int(workers)
+
+class ScoringPool:
+    """Lazily started process pool, only used for batches large enough to amortize it"""
+
+    def __init__(self, workers: int = 0, min_batch_size: int = 500, chunk_size: int = 256):
+        self.workers = workers
+        self.min_batch_size = min_batch_size
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def enabled_for(self, batch_size: int) -> bool:
+        return self.workers > 0 and batch_size >= self.min_batch_size
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers import only models/scoring, never the API module,
+                # and we avoid forking a process that is running threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started scoring pool with {self.workers} workers")
+            return self._executor
+
+    def submit(self, items: List[ScoringItem]) -> Future:
+        try:
+            return self._get_executor().submit(score_chunk, items)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool once
+            logger.warning("Scoring pool is broken, restarting it")
+            self.shutdown()
+            return self._get_executor().submit(score_chunk, items)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# Global instance
+scoring_pool = ScoringPool(
+    workers=_workers_from_env(),
+    min_batch_size=int(os.getenv("CPU_POOL_MIN_BATCH", "500")),
+    chunk_size=int(os.getenv("CPU_POOL_CHUNK_SIZE", "256"))
+)
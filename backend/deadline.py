@@ -0,0 +1,35 @@
+"""
+Deadline - Time budget of one request, visible to every stage it runs
+(including threads started with run_in_threadpool, which copy the context)
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before a stage could start or finish"""
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Give the block (and tasks or threads started in it) seconds to finish; None means no deadline"""
+    token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left in the current deadline (at least 0), or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    if deadline_remaining() == 0.0:
+        raise DeadlineExceeded()
@@ -0,0 +1,46 @@
+"""
+Field Selection - Trims response payloads to the fields requested with ?fields=
+"""
+
+from typing import Optional, Dict, Any
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse "validation_status,risk_assessment.risk_level" into a nested selection tree.
+    A None value selects the whole field, a dict selects some of its sub-fields.
+    """
+    if not fields:
+        return None
+
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        if not parts:
+            continue
+
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                # The parent field is already selected whole
+                node = None
+                break
+            node = node.setdefault(part, {})
+        if node is not None:
+            node[parts[-1]] = None
+
+    return tree or None
+
+def select_fields(data: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    """Apply a selection tree from parse_fields to a dict (or list of dicts)"""
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    return {
+        key: data[key] if subtree is None else select_fields(data[key], subtree)
+        for key, subtree in tree.items()
+        if key in data
+    }
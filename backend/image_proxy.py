@@ -0,0 +1,258 @@
+"""
+Image Proxy - Fetches Google place photos and Street View images once and
+serves them from a size-bounded disk cache, keeping the API key server-side
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+
+import httpx
+
+from circuit_breaker import google_breaker
+from upstream_scheduler import google_scheduler
+
+logger = logging.getLogger(__name__)
+
+PLACE_PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+STREETVIEW_URL = "https://maps.googleapis.com/maps/api/streetview"
+STREETVIEW_METADATA_URL = "https://maps.googleapis.com/maps/api/streetview/metadata"
+
+# Photo widths are snapped to a few sizes so the cache is not split per pixel
+PHOTO_WIDTHS = (200, 400, 800, 1600)
+# Street View Static images are limited to 640x640
+STREETVIEW_MAX_SIZE = 640
+
+class ImageNotFound(Exception):
+    """Google has no image for the request"""
+
+class ImageFetchError(Exception):
+    """Google could not be reached or returned an error"""
+
+def photo_width(maxwidth: int) -> int:
+    return next((width for width in PHOTO_WIDTHS if width >= maxwidth), PHOTO_WIDTHS[-1])
+
+class ImageCache:
+    """
+    One file per image plus a small JSON sidecar (content type, ETag).
+    Entries are evicted least recently used once the cache exceeds
+    max_bytes; recency survives restarts through the file mtime.
+    Concurrent requests for an uncached image share one Google fetch.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, api_key: Optional[str], timeout: float = 15.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.api_key = api_key
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        self._fetch_locks: Dict[str, asyncio.Lock] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hits = 0
+        self._misses = 0
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._load_index)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key[:2], key)
+        return base, f"{base}.json"
+
+    def _load_index(self) -> None:
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    meta_path = os.path.join(root, name)
+                    data_path = meta_path[:-len(".json")]
+                    try:
+                        with open(meta_path) as f:
+                            meta = json.load(f)
+                        stat = os.stat(data_path)
+                    except (OSError, ValueError):
+                        continue
+                    meta["size"] = stat.st_size
+                    entries.append((stat.st_mtime, meta))
+
+        with self._lock:
+            for _, meta in sorted(entries, key=lambda entry: entry[0]):
+                self._index[meta["key"]] = meta
+                self._total_bytes += meta["size"]
+        logger.info(f"Image cache has {len(entries)} images ({self._total_bytes} bytes)")
+
+    def _read(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                return None
+            self._index.move_to_end(key)
+
+        data_path, _ = self._paths(key)
+        try:
+            with open(data_path, "rb") as f:
+                data = f.read()
+            os.utime(data_path)
+        except OSError:
+            # Evicted (or removed) between the lookup and the read
+            return None
+        return meta, data
+
+    def _store(self, key: str, data: bytes, content_type: str) -> Dict[str, Any]:
+        data_path, meta_path = self._paths(key)
+        meta = {
+            "key": key,
+            "content_type": content_type,
+            "etag": f'"{hashlib.sha256(data).hexdigest()[:32]}"',
+            "size": len(data)
+        }
+
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp_path = f"{data_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, data_path)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous:
+                self._total_bytes -= previous["size"]
+            self._index[key] = meta
+            self._total_bytes += len(data)
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_meta = self._index.popitem(last=False)
+                self._total_bytes -= old_meta["size"]
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            for path in self._paths(old_key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return meta
+
+    async def _get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Tuple[bytes, str]]]) -> Tuple[Dict[str, Any], bytes]:
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self._read, key)
+        if cached:
+            self._hits += 1
+            return cached
+
+        lock = self._fetch_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                # Another request may have fetched it while we waited
+                cached = await loop.run_in_executor(None, self._read, key)
+                if cached:
+                    self._hits += 1
+                    return cached
+
+                self._misses += 1
+                data, content_type = await fetch()
+                meta = await loop.run_in_executor(None, self._store, key, data, content_type)
+                return meta, data
+        finally:
+            if not lock.locked():
+                self._fetch_locks.pop(key, None)
+
+    async def _google_get(self, url: str, params: Dict[str, Any]) -> httpx.Response:
+        """
+        One Google request through the shared breaker: raises
+        UpstreamUnavailable while it is open. Transport errors and quota or
+        server errors count against it; a missing image does not.
+        """
+        if not self.api_key:
+            raise ImageFetchError("Google Maps API not configured")
+        try:
+            with google_breaker.call():
+                async with google_scheduler.aslot():
+                    response = await self._client.get(url, params={**params, "key": self.api_key})
+                if response.status_code == 429 or response.status_code >= 500:
+                    response.raise_for_status()
+                return response
+        except httpx.HTTPError as e:
+            raise ImageFetchError(f"Error fetching image: {str(e)}")
+
+    def _image(self, response: httpx.Response) -> Tuple[bytes, str]:
+        content_type = response.headers.get("content-type", "")
+        if response.status_code in (400, 404):
+            raise ImageNotFound()
+        if response.status_code != 200 or not content_type.startswith("image/"):
+            raise ImageFetchError(f"Google returned {response.status_code} ({content_type})")
+        return response.content, content_type
+
+    async def place_photo(self, photo_reference: str, maxwidth: int = 400) -> Tuple[Dict[str, Any], bytes]:
+        width = photo_width(maxwidth)
+        key = hashlib.sha256(f"photo|{photo_reference}|{width}".encode()).hexdigest()
+
+        async def fetch():
+            response = await self._google_get(PLACE_PHOTO_URL, {"photoreference": photo_reference, "maxwidth": width})
+            return self._image(response)
+
+        return await self._get_or_fetch(key, fetch)
+
+    async def street_view(self, lat: float, lng: float, width: int = 640, height: int = 480, heading: Optional[float] = None, pitch: float = 0.0, fov: float = 90.0) -> Tuple[Dict[str, Any], bytes]:
+        # About 10 cm of precision is plenty and lets nearby requests share a cache entry
+        params = {
+            "location": f"{lat:.6f},{lng:.6f}",
+            "size": f"{min(max(width, 1), STREETVIEW_MAX_SIZE)}x{min(max(height, 1), STREETVIEW_MAX_SIZE)}",
+            "pitch": round(pitch, 1),
+            "fov": round(fov, 1)
+        }
+        if heading is not None:
+            params["heading"] = round(heading % 360, 1)
+        key = hashlib.sha256(("streetview|" + "|".join(f"{k}={v}" for k, v in sorted(params.items()))).encode()).hexdigest()
+
+        async def fetch():
+            # The metadata call is free, and avoids paying for (and caching)
+            # the grey "no imagery" placeholder
+            metadata = await self._google_get(STREETVIEW_METADATA_URL, {"location": params["location"]})
+            try:
+                status = metadata.json().get("status")
+            except ValueError:
+                raise ImageFetchError("Invalid Street View metadata response")
+            if status == "ZERO_RESULTS" or status == "NOT_FOUND":
+                raise ImageNotFound()
+            if status != "OK":
+                raise ImageFetchError(f"Street View metadata status {status}")
+
+            response = await self._google_get(STREETVIEW_URL, params)
+            return self._image(response)
+
+        return await self._get_or_fetch(key, fetch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "images": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+# Global instance
+image_cache = ImageCache(
+    directory=os.getenv("IMAGE_CACHE_DIR", "image_cache"),
+    max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    api_key=os.getenv("GOOGLE_MAPS_API_KEY")
+)
@@ -1,32 +1,145 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, Header, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import googlemaps
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional, List, Dict, Any, Tuple
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
+
+# Load environment variables before the service modules read their settings
+load_dotenv()
+
 import logging
 from datetime import datetime
-import difflib
-import re
-import pandas as pd
 import csv
 import io
 import uuid
+import threading
 import json
+import orjson
+import hmac
+from collections import OrderedDict, deque
 from cnpj_service import cnpj_service
-
-# Load environment variables
-load_dotenv()
+from models import (
+    MerchantValidationRequest, MerchantInfo, AddressComparison, CNPJData, CNPJComparison,
+    RiskAssessment, ValidationResult, BatchValidationRequest, RiskLevelChange,
+    RevalidationStatus, BatchValidationStatus, ScreeningVerdict
+)
+from scoring import compare_addresses, calculate_risk_score
+from cnpj_index import cnpj_name_index
+from cnpj_screening import process_cnpj_data, batch_cnpj_stage, BatchCNPJStage, BATCH_CNPJ_LOOKAHEAD
+from spatial_index import merchant_locations
+from merchant_screening import merchant_screener, DENY
+from watchlist import partner_watchlist
+from revalidation import validation_ledger, SNAPSHOT_FIELDS
+from compression import CompressionMiddleware
+from field_selection import parse_fields, select_fields
+from cpu_pool import scoring_pool, scoring_item
+from batch_checkpoint import checkpoint_store
+from upstream_scheduler import google_scheduler, upstream_priority, upstream_stats, BATCH
+from circuit_breaker import google_breaker, breaker_stats, UpstreamUnavailable, CLOSED
+from deadline import request_deadline, deadline_remaining, DeadlineExceeded
+from profiling import profiler, stage
+from batch_export import stream_csv, stream_parquet, parquet_available
+from merchant_store import merchant_store
+from audit_log import validation_audit, audit_batch
+from validation_queries import search_validations, validation_summary, ValidationStoreUnavailable
+from batch_events import batch_events, BATCH_COMPLETED, BATCH_FAILED, BATCH_PAUSED, FINAL_EVENTS
+from image_proxy import image_cache, ImageNotFound, ImageFetchError
+from batch_store import batch_result_store, BatchResults
+from batch_summary import BatchSummary
+from batch_dedup import batch_dedup, batch_content_hash
+from batch_admission import batch_admission, AdmissionRejected, DEFAULT_TENANT
+from merchant_autocomplete import merchant_autocomplete, places_autocomplete, prediction_result, load_stored_merchants
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Startup timings, served by /ready
+startup_report: Dict[str, Any] = {"ready": False, "steps": {}}
+
+@contextmanager
+def startup_step(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_report["steps"][name] = round((time.perf_counter() - started) * 1000, 1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    startup_report["import_ms"] = round((started - _import_started) * 1000, 1)
+    
+    with startup_step("google_client"):
+        init_google_client()
+    with startup_step("cnpj_client"):
+        await cnpj_service.start()
+    with startup_step("batch_events"):
+        await batch_events.start()
+    with startup_step("image_cache"):
+        await image_cache.start()
+    with startup_step("merchant_store"):
+        await merchant_store.start()
+        await validation_ledger.start()
+    with startup_step("audit_log"):
+        await validation_audit.start()
+    if merchant_screener.configured:
+        # Loaded before the replica is ready, so no listed merchant reaches the upstreams
+        with startup_step("screening_lists"):
+            try:
+                merchant_screener.reload()
+            except Exception as e:
+                logger.error(f"Error loading screening lists: {str(e)}")
+    if partner_watchlist.configured:
+        # CNPJ partners are screened from the first validation on
+        with startup_step("partner_watchlist"):
+            try:
+                partner_watchlist.reload()
+            except Exception as e:
+                logger.error(f"Error loading partner watchlist: {str(e)}")
+    with startup_step("batch_checkpoints"):
+        shutdown_requested.clear()
+        batch_admission.start()
+        restore_checkpointed_batches()
+        await batch_result_store.start(on_expired=forget_batch)
+    
+    startup_report["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_report["ready"] = True
+    logger.info(f"Startup complete: {startup_report}")
+    
+    # The registry index is only an optional fallback, so it loads after
+    # the replica is already serving traffic
+    if CNPJ_REGISTRY_PATH:
+        asyncio.get_running_loop().run_in_executor(None, load_cnpj_registry)
+    if merchant_store.running:
+        asyncio.create_task(load_autocomplete_index())
+    
+    yield
+    
+    startup_report["ready"] = False
+    # Waits for running batches to stop, off the event loop
+    await run_in_threadpool(shutdown_batches)
+    await batch_result_store.close()
+    await cnpj_service.close()
+    await batch_events.close()
+    await image_cache.close()
+    await validation_audit.close()
+    await validation_ledger.close()
+    await merchant_store.close()
+
 app = FastAPI(
     title="Locus Merchant Audit - Merchant Validation API",
     description="Merchant validation platform for fraud and AML teams using Google Maps APIs",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -38,98 +151,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Google Maps client
+# Compress large payloads (batch results) with brotli or gzip
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
+# Google Maps client, created in the app lifespan
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-if not GOOGLE_MAPS_API_KEY:
-    logger.warning("GOOGLE_MAPS_API_KEY not found in environment variables")
-    gmaps = None
-else:
+gmaps = None
+
+def init_google_client():
+    """Initialize the Google Maps client (imports googlemaps on first use)"""
+    global gmaps
+    if not GOOGLE_MAPS_API_KEY:
+        logger.warning("GOOGLE_MAPS_API_KEY not found in environment variables")
+        return
+    
+    import googlemaps
     gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
 
 # In-memory storage for batch processing (in production, use a database)
 batch_storage = {}
+revalidation_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Revalidation jobs kept for /revalidation-status; the oldest finished ones go first
+REVALIDATION_MAX_JOBS = int(os.getenv("REVALIDATION_MAX_JOBS", "100"))
+
+# Batch statuses that end a run; their results may be evicted from memory
+FINISHED_STATUSES = ("COMPLETED", "FAILED", "PAUSED")
+pause_requests = set()
+
+# Set at shutdown: running batches stop after their current row, keep their
+# PROCESSING status and resume from their checkpoint on restart
+shutdown_requested = threading.Event()
+
+# Seconds shutdown waits for running batches to stop
+BATCH_SHUTDOWN_TIMEOUT = float(os.getenv("BATCH_SHUTDOWN_TIMEOUT", "30"))
+
+# Optional registry extract used for name-based CNPJ candidate search
+CNPJ_REGISTRY_PATH = os.getenv("CNPJ_REGISTRY_PATH")
 
-# Pydantic models
-class MerchantValidationRequest(BaseModel):
-    merchant_name: str
-    address: Optional[str] = None
-    place_id: Optional[str] = None
-    phone: Optional[str] = None
-    transaction_amount: Optional[float] = None
-    transaction_type: Optional[str] = None
-
-class MerchantInfo(BaseModel):
-    place_id: str
-    name: str
-    address: str
-    phone: Optional[str] = None
-    website: Optional[str] = None
-    rating: Optional[float] = None
-    user_ratings_total: Optional[int] = None
-    business_status: Optional[str] = None
-    types: List[str] = []
-    location: Dict[str, float]
-    price_level: Optional[int] = None
-    opening_hours: Optional[Dict[str, Any]] = None
-    photos: List[str] = []
-
-class AddressComparison(BaseModel):
-    provided_address: str
-    google_address: str
-    similarity_score: float  # 0-100
-    is_match: bool
-    differences: List[str]
-
-class CNPJData(BaseModel):
-    cnpj: str
-    company_name: str
-    trade_name: Optional[str] = None
-    legal_nature: Optional[str] = None
-    main_activity: Optional[str] = None
-    secondary_activities: List[str] = []
-    registration_status: Optional[str] = None
-    registration_date: Optional[str] = None
-    address: Dict[str, str] = {}
-    phone: Optional[str] = None
-    email: Optional[str] = None
-    share_capital: Optional[str] = None
-    company_size: Optional[str] = None
-    last_update: Optional[str] = None
-    partners: List[Dict[str, Any]] = []
-
-class CNPJComparison(BaseModel):
-    cnpj_found: bool
-    cnpj_data: Optional[CNPJData] = None
-    name_comparison: Optional[Dict[str, Any]] = None
-    address_comparison: Optional[Dict[str, Any]] = None
-    risk_assessment: Optional[Dict[str, Any]] = None
-
-class RiskAssessment(BaseModel):
-    risk_score: float  # 0-100
-    risk_level: str  # LOW, MEDIUM, HIGH, CRITICAL
-    risk_factors: List[str]
-    recommendations: List[str]
-
-class ValidationResult(BaseModel):
-    merchant_info: Optional[MerchantInfo] = None
-    risk_assessment: RiskAssessment
-    address_comparison: Optional[AddressComparison] = None
-    cnpj_comparison: Optional[CNPJComparison] = None
-    validation_status: str  # VALID, SUSPICIOUS, INVALID, ERROR
-    timestamp: datetime
-    search_query: str
-
-class BatchValidationRequest(BaseModel):
-    merchants: List[MerchantValidationRequest]
-
-class BatchValidationStatus(BaseModel):
-    batch_id: str
-    status: str  # PENDING, PROCESSING, COMPLETED, FAILED
-    total_merchants: int
-    processed_merchants: int
-    created_at: datetime
-    completed_at: Optional[datetime] = None
-    results: Optional[List[ValidationResult]] = None
+# Merchants closer than this are considered to share a location
+COLOCATION_RADIUS_M = float(os.getenv("COLOCATION_RADIUS_M", "25"))
+
+# Admin endpoints and on-demand profiling (X-Profile) need X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Batches whose chunks are all profiled (submitted with X-Profile)
+profiled_batches = set()
+
+# A resubmitted batch returns the earlier one while it runs or up to this
+# many seconds after it finished (0 disables deduplication)
+BATCH_DEDUP_WINDOW = float(os.getenv("BATCH_DEDUP_WINDOW_SECONDS", "3600"))
+
+# Browser cache lifetime of proxied images, in seconds
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+def load_cnpj_registry():
+    started = time.perf_counter()
+    try:
+        cnpj_name_index.load_csv(CNPJ_REGISTRY_PATH)
+    except Exception as e:
+        logger.error(f"Error loading CNPJ registry from {CNPJ_REGISTRY_PATH}: {str(e)}")
+    startup_report["steps"]["cnpj_registry_background"] = round((time.perf_counter() - started) * 1000, 1)
+
+async def load_autocomplete_index():
+    started = time.perf_counter()
+    try:
+        await load_stored_merchants(merchant_autocomplete)
+    except Exception as e:
+        logger.error(f"Error loading stored merchants for autocomplete: {str(e)}")
+    startup_report["steps"]["autocomplete_background"] = round((time.perf_counter() - started) * 1000, 1)
+
+def restore_checkpointed_batches():
+    """Reload checkpointed batches and resume those interrupted by a restart"""
+    # Finished batches keep their results on disk until they are requested
+    for state, results in checkpoint_store.load_batches(lazy_statuses=FINISHED_STATUSES):
+        try:
+            batch_data = BatchValidationStatus(**state).dict()
+        except Exception as e:
+            logger.error(f"Skipping invalid checkpoint state: {str(e)}")
+            continue
+        
+        batch_id = batch_data["batch_id"]
+        batch_storage[batch_id] = batch_data
+        if batch_data["content_hash"]:
+            batch_dedup.register(batch_id, batch_data["tenant_id"] or DEFAULT_TENANT, batch_data["content_hash"], batch_data["idempotency_key"])
+        
+        if results is None:
+            finished_at = batch_data["completed_at"] or batch_data["created_at"]
+            batch_result_store.register(batch_id, finished_at.timestamp(), BatchSummary.from_state(state.get("summary")))
+            continue
+        
+        batch_data["processed_merchants"] = len(results)
+        batch_result_store.open(batch_id, results)
+        merchants = [MerchantValidationRequest(**row) for row in checkpoint_store.load_merchants(batch_id)]
+        logger.info(f"Resuming batch {batch_id} at merchant {len(results)} of {len(merchants)}")
+        # Already accepted before the restart, so not checked against the limits again
+        enqueue_batch(batch_id, merchants, processed=len(results))
+
+def forget_batch(batch_id: str):
+    """Drop a finished batch past its retention period, including its checkpoint"""
+    batch_storage.pop(batch_id, None)
+    pause_requests.discard(batch_id)
+    profiled_batches.discard(batch_id)
+    batch_dedup.forget(batch_id)
+    batch_events.forget(batch_id)
+    checkpoint_store.delete(batch_id)
+
+def shutdown_batches():
+    # Stop running batches before the upstream clients are closed; each
+    # checkpoints itself as it stops
+    shutdown_requested.set()
+    batch_admission.shutdown(timeout=BATCH_SHUTDOWN_TIMEOUT)
+    # Flush rows of any batch that did not stop in time
+    for batch_id in batch_result_store.active_ids():
+        checkpoint_batch(batch_id, force=True)
+    scoring_pool.shutdown()
 
 @app.get("/")
 async def root():
@@ -139,275 +275,70 @@ async def root():
         "status": "active"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until upstream clients are initialized"""
+    status_code = 200 if startup_report["ready"] else 503
+    return ORJSONResponse({**startup_report, "google_maps_api": "connected" if gmaps else "not_configured"}, status_code=status_code)
+
 @app.get("/health")
 async def health_check():
+    breakers = breaker_stats()
     return {
-        "status": "healthy",
+        "status": "healthy" if all(breaker["state"] == CLOSED for breaker in breakers.values()) else "degraded",
         "google_maps_api": "connected" if gmaps else "not_configured",
+        "upstreams": upstream_stats(),
+        "circuit_breakers": breakers,
+        "merchant_store": merchant_store.stats(),
+        "revalidation_ledger": validation_ledger.stats(),
+        "audit_log": validation_audit.stats(),
+        "webhooks": batch_events.stats(),
+        "batch_admission": batch_admission.stats(),
+        "batch_dedup": batch_dedup.stats(),
+        "screening": merchant_screener.stats(),
+        "partner_watchlist": partner_watchlist.stats(),
+        "batch_results": batch_result_store.stats(),
+        "image_cache": image_cache.stats(),
+        "autocomplete": {**merchant_autocomplete.stats(), **places_autocomplete.stats()},
+        "profiler": profiler.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
-def normalize_address(address: str) -> str:
-    """Normalize address for comparison"""
-    if not address:
-        return ""
-    
-    # Convert to lowercase
-    normalized = address.lower()
-    
-    # Remove common abbreviations and standardize
-    replacements = {
-        r'\bst\b': 'street',
-        r'\bave\b': 'avenue',
-        r'\brd\b': 'road',
-        r'\bdr\b': 'drive',
-        r'\bblvd\b': 'boulevard',
-        r'\bapt\b': 'apartment',
-        r'\bste\b': 'suite',
-        r'\bfl\b': 'floor',
-        r'\bn\b': 'north',
-        r'\bs\b': 'south',
-        r'\be\b': 'east',
-        r'\bw\b': 'west',
-    }
-    
-    for pattern, replacement in replacements.items():
-        normalized = re.sub(pattern, replacement, normalized)
-    
-    # Remove extra spaces and punctuation
-    normalized = re.sub(r'[^\w\s]', ' ', normalized)
-    normalized = re.sub(r'\s+', ' ', normalized)
-    
-    return normalized.strip()
+def unavailable_error(error: UpstreamUnavailable) -> HTTPException:
+    """503 for a failing upstream, with Retry-After while its circuit is open"""
+    headers = {"Retry-After": str(error.retry_after)} if error.retry_after else None
+    return HTTPException(status_code=503, detail=f"{error.upstream} is temporarily unavailable", headers=headers)
 
-def compare_addresses(provided_address: str, google_address: str) -> AddressComparison:
-    """Compare provided address with Google Places address"""
-    if not provided_address or not google_address:
-        return AddressComparison(
-            provided_address=provided_address or "",
-            google_address=google_address or "",
-            similarity_score=0.0,
-            is_match=False,
-            differences=["One or both addresses are missing"]
-        )
+def register_merchant_location(merchant_info: Optional[MerchantInfo]) -> int:
+    """Add a resolved merchant to the spatial index and return its co-location count"""
+    if not merchant_info or not merchant_info.location:
+        return 0
     
-    # Normalize addresses
-    norm_provided = normalize_address(provided_address)
-    norm_google = normalize_address(google_address)
-    
-    # Calculate similarity using difflib
-    similarity = difflib.SequenceMatcher(None, norm_provided, norm_google).ratio() * 100
-    
-    # Find differences
-    differences = []
-    if similarity < 90:
-        provided_words = set(norm_provided.split())
-        google_words = set(norm_google.split())
-        
-        only_in_provided = provided_words - google_words
-        only_in_google = google_words - provided_words
-        
-        if only_in_provided:
-            differences.append(f"Only in provided: {', '.join(only_in_provided)}")
-        if only_in_google:
-            differences.append(f"Only in Google: {', '.join(only_in_google)}")
-    
-    return AddressComparison(
-        provided_address=provided_address,
-        google_address=google_address,
-        similarity_score=similarity,
-        is_match=similarity >= 80,  # 80% threshold for match
-        differences=differences
+    merchant_locations.add_merchant(merchant_info)
+    return merchant_locations.count_nearby(
+        merchant_info.location["lat"],
+        merchant_info.location["lng"],
+        COLOCATION_RADIUS_M,
+        exclude_place_id=merchant_info.place_id
     )
 
-async def process_cnpj_data(merchant_name: str, merchant_address: Optional[str] = None) -> Optional[CNPJComparison]:
-    """Process CNPJ data for Brazilian merchants"""
-    try:
-        # Try to extract CNPJ from merchant name or address
-        cnpj = None
-        search_text = f"{merchant_name} {merchant_address or ''}"
-        
-        cnpj = cnpj_service.extract_cnpj_from_text(search_text)
-        
-        if not cnpj:
-            # If no CNPJ found in text, return None
-            return CNPJComparison(
-                cnpj_found=False,
-                cnpj_data=None,
-                name_comparison=None,
-                address_comparison=None,
-                risk_assessment=None
-            )
-        
-        # Fetch CNPJ data
-        cnpj_data = await cnpj_service.get_cnpj_data(cnpj)
-        
-        if not cnpj_data:
-            return CNPJComparison(
-                cnpj_found=True,
-                cnpj_data=None,
-                name_comparison=None,
-                address_comparison=None,
-                risk_assessment={'error': 'Could not fetch CNPJ data'}
-            )
-        
-        # Compare business names
-        name_comparison = cnpj_service.compare_business_names(merchant_name, cnpj_data)
-        
-        # Compare addresses if available
-        address_comparison = None
-        if merchant_address and cnpj_data.get('address', {}).get('full_address'):
-            cnpj_address = cnpj_data['address']['full_address']
-            address_comparison = compare_addresses(merchant_address, cnpj_address)
-        
-        # Assess CNPJ-specific risk factors
-        cnpj_risk = cnpj_service.assess_cnpj_risk_factors(cnpj_data)
-        
-        return CNPJComparison(
-            cnpj_found=True,
-            cnpj_data=CNPJData(**cnpj_data),
-            name_comparison=name_comparison,
-            address_comparison=address_comparison.dict() if address_comparison else None,
-            risk_assessment=cnpj_risk
-        )
-        
-    except Exception as e:
-        logger.error(f"Error processing CNPJ data: {str(e)}")
-        return CNPJComparison(
-            cnpj_found=False,
-            cnpj_data=None,
-            name_comparison=None,
-            address_comparison=None,
-            risk_assessment={'error': str(e)}
-        )
-
-def calculate_risk_score(merchant_info: Optional[MerchantInfo], transaction_amount: Optional[float] = None, address_comparison: Optional[AddressComparison] = None, cnpj_comparison: Optional[CNPJComparison] = None) -> RiskAssessment:
-    """
-    Calculate risk score based on merchant information and transaction details
-    """
-    risk_score = 0
-    risk_factors = []
-    recommendations = []
-    
-    if not merchant_info:
-        return RiskAssessment(
-            risk_score=100,
-            risk_level="CRITICAL",
-            risk_factors=["Merchant not found in Google Places"],
-            recommendations=["Investigate merchant existence", "Verify transaction legitimacy"]
-        )
+def record_validation(request: MerchantValidationRequest, result: ValidationResult) -> None:
+    """Remember a completed validation so it can be incrementally re-validated later"""
+    if not result.merchant_info or result.validation_status == "ERROR":
+        return
     
-    # Business status check
-    if merchant_info.business_status == "CLOSED_PERMANENTLY":
-        risk_score += 40
-        risk_factors.append("Business permanently closed")
-        recommendations.append("Verify if transaction is legitimate for closed business")
-    elif merchant_info.business_status == "CLOSED_TEMPORARILY":
-        risk_score += 20
-        risk_factors.append("Business temporarily closed")
-    
-    # Rating and reviews check
-    if merchant_info.user_ratings_total is not None:
-        if merchant_info.user_ratings_total == 0:
-            risk_score += 25
-            risk_factors.append("No customer reviews")
-            recommendations.append("Verify business legitimacy due to lack of reviews")
-        elif merchant_info.user_ratings_total < 10:
-            risk_score += 15
-            risk_factors.append("Very few customer reviews")
-    
-    if merchant_info.rating is not None and merchant_info.rating < 3.0:
-        risk_score += 15
-        risk_factors.append("Low customer rating")
-    
-    # Business type analysis
-    high_risk_types = ["atm", "bank", "casino", "night_club", "liquor_store"]
-    medium_risk_types = ["gas_station", "convenience_store", "jewelry_store"]
-    
-    for business_type in merchant_info.types:
-        if business_type in high_risk_types:
-            risk_score += 10
-            risk_factors.append(f"High-risk business type: {business_type}")
-        elif business_type in medium_risk_types:
-            risk_score += 5
-            risk_factors.append(f"Medium-risk business type: {business_type}")
-    
-    # Transaction amount analysis
-    if transaction_amount:
-        if transaction_amount > 10000:  # High value transaction
-            risk_score += 15
-            risk_factors.append("High-value transaction")
-            recommendations.append("Enhanced due diligence for high-value transaction")
-        elif transaction_amount > 5000:
-            risk_score += 10
-            risk_factors.append("Medium-value transaction")
-    
-    # Missing information penalties
-    if not merchant_info.phone:
-        risk_score += 10
-        risk_factors.append("No phone number available")
-    
-    if not merchant_info.website:
-        risk_score += 5
-        risk_factors.append("No website available")
-    
-    # Address comparison analysis
-    if address_comparison:
-        if not address_comparison.is_match:
-            if address_comparison.similarity_score < 50:
-                risk_score += 30
-                risk_factors.append("Address mismatch - significant differences")
-                recommendations.append("Verify correct merchant location")
-            elif address_comparison.similarity_score < 80:
-                risk_score += 15
-                risk_factors.append("Address mismatch - minor differences")
-                recommendations.append("Confirm address details with merchant")
-    
-    # CNPJ analysis for Brazilian merchants
-    if cnpj_comparison and cnpj_comparison.cnpj_found:
-        if not cnpj_comparison.cnpj_data:
-            risk_score += 25
-            risk_factors.append("CNPJ found but data unavailable")
-            recommendations.append("Verify CNPJ status manually")
-        else:
-            # Add CNPJ-specific risk factors
-            cnpj_risk = cnpj_comparison.risk_assessment
-            if cnpj_risk and cnpj_risk.get('risk_score', 0) > 0:
-                cnpj_risk_score = cnpj_risk['risk_score']
-                risk_score += min(cnpj_risk_score, 40)  # Cap CNPJ risk at 40 points
-                risk_factors.extend(cnpj_risk.get('risk_factors', []))
-                recommendations.extend(cnpj_risk.get('recommendations', []))
-            
-            # Name comparison with CNPJ
-            name_comp = cnpj_comparison.name_comparison
-            if name_comp and name_comp.get('similarity_score', 0) < 0.6:
-                risk_score += 20
-                risk_factors.append("Merchant name doesn't match CNPJ registration")
-                recommendations.append("Verify business name with official registration")
-    
-    # Determine risk level
-    risk_score = min(risk_score, 100)  # Cap at 100
-    
-    if risk_score >= 80:
-        risk_level = "CRITICAL"
-        recommendations.append("Immediate investigation required")
-    elif risk_score >= 60:
-        risk_level = "HIGH"
-        recommendations.append("Enhanced monitoring recommended")
-    elif risk_score >= 30:
-        risk_level = "MEDIUM"
-        recommendations.append("Standard monitoring sufficient")
-    else:
-        risk_level = "LOW"
-        recommendations.append("Low risk - standard processing")
-    
-    return RiskAssessment(
-        risk_score=risk_score,
-        risk_level=risk_level,
-        risk_factors=risk_factors,
-        recommendations=recommendations
+    # Re-validations go straight to Place Details instead of Text Search
+    replay_request = request.dict()
+    replay_request["place_id"] = result.merchant_info.place_id
+    replay_request["session_token"] = None
+    validation_ledger.record(
+        replay_request,
+        result.merchant_info,
+        result.risk_assessment.risk_level,
+        result.risk_assessment.risk_score
     )
 
+
 def search_merchant_by_name_and_address(name: str, address: Optional[str] = None) -> Optional[MerchantInfo]:
     """
     Search for merchant using name and optionally address
@@ -422,7 +353,8 @@ def search_merchant_by_name_and_address(name: str, address: Optional[str] = None
             query += f" {address}"
         
         # Search for places
-        places_result = gmaps.places(query=query, type="establishment")
+        with stage("places.text_search"), google_breaker.call(), google_scheduler.slot():
+            places_result = gmaps.places(query=query, type="establishment")
         
         if not places_result.get("results"):
             return None
@@ -432,11 +364,12 @@ def search_merchant_by_name_and_address(name: str, address: Optional[str] = None
         place_id = place["place_id"]
         
         # Get detailed information
-        details = gmaps.place(place_id=place_id, fields=[
-            "place_id", "name", "formatted_address", "formatted_phone_number",
-            "website", "rating", "user_ratings_total", "business_status",
-            "types", "geometry", "price_level", "opening_hours", "photos"
-        ])
+        with stage("places.details"), google_breaker.call(), google_scheduler.slot():
+            details = gmaps.place(place_id=place_id, fields=[
+                "place_id", "name", "formatted_address", "formatted_phone_number",
+                "website", "rating", "user_ratings_total", "business_status",
+                "types", "geometry", "price_level", "opening_hours", "photos"
+            ])
         
         place_details = details["result"]
         
@@ -445,7 +378,8 @@ def search_merchant_by_name_and_address(name: str, address: Optional[str] = None
         if "photos" in place_details:
             for photo in place_details["photos"][:3]:  # Limit to 3 photos
                 photo_reference = photo["photo_reference"]
-                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_reference}&key={GOOGLE_MAPS_API_KEY}"
+                # Served through the image proxy, so the API key never reaches the client
+                photo_url = f"/images/place-photo/{photo_reference}?maxwidth=400"
                 photos.append(photo_url)
         
         return MerchantInfo(
@@ -467,11 +401,13 @@ def search_merchant_by_name_and_address(name: str, address: Optional[str] = None
             photos=photos
         )
         
+    except (UpstreamUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error searching merchant: {str(e)}")
         return None
 
-def get_merchant_by_place_id(place_id: str) -> Optional[MerchantInfo]:
+def get_merchant_by_place_id(place_id: str, session_token: Optional[str] = None) -> Optional[MerchantInfo]:
     """
     Get merchant information by Google Place ID
     """
@@ -479,11 +415,12 @@ def get_merchant_by_place_id(place_id: str) -> Optional[MerchantInfo]:
         return None
     
     try:
-        details = gmaps.place(place_id=place_id, fields=[
-            "place_id", "name", "formatted_address", "formatted_phone_number",
-            "website", "rating", "user_ratings_total", "business_status",
-            "types", "geometry", "price_level", "opening_hours", "photos"
-        ])
+        with stage("places.details"), google_breaker.call(), google_scheduler.slot():
+            details = gmaps.place(place_id=place_id, session_token=session_token, fields=[
+                "place_id", "name", "formatted_address", "formatted_phone_number",
+                "website", "rating", "user_ratings_total", "business_status",
+                "types", "geometry", "price_level", "opening_hours", "photos"
+            ])
         
         place_details = details["result"]
         
@@ -492,7 +429,8 @@ def get_merchant_by_place_id(place_id: str) -> Optional[MerchantInfo]:
         if "photos" in place_details:
             for photo in place_details["photos"][:3]:  # Limit to 3 photos
                 photo_reference = photo["photo_reference"]
-                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_reference}&key={GOOGLE_MAPS_API_KEY}"
+                # Served through the image proxy, so the API key never reaches the client
+                photo_url = f"/images/place-photo/{photo_reference}?maxwidth=400"
                 photos.append(photo_url)
         
         return MerchantInfo(
@@ -514,73 +452,134 @@ def get_merchant_by_place_id(place_id: str) -> Optional[MerchantInfo]:
             photos=photos
         )
         
+    except (UpstreamUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error getting merchant by place_id: {str(e)}")
         return None
 
+def stage_result(task: "asyncio.Future", stage: str, skipped_stages: List[str], default=None):
+    """
+    Result of a validation stage. A stage still running at the deadline is
+    cancelled (a Google lookup already in a thread stops at its next upstream
+    call) and, like one that ran out of time, listed in skipped_stages.
+    """
+    if not task.done():
+        task.cancel()
+        # Nobody awaits it any more; fetch its exception so it is not logged as unretrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        skipped_stages.append(stage)
+        return default
+    if isinstance(task.exception(), DeadlineExceeded):
+        skipped_stages.append(stage)
+        return default
+    return task.result()
+
+def is_admin(x_admin_token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and x_admin_token and hmac.compare_digest(x_admin_token, ADMIN_TOKEN))
+
+def require_admin(x_admin_token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 @app.post("/validate-merchant", response_model=ValidationResult)
-async def validate_merchant(request: MerchantValidationRequest):
+async def validate_merchant(
+    request: MerchantValidationRequest,
+    response: Response,
+    fields: Optional[str] = None,
+    deadline_ms: Optional[int] = None,
+    x_deadline_ms: Optional[int] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
     """
-    Validate a merchant using Google Places API and assess risk
+    Validate a merchant using Google Places API and assess risk.
+    Use fields=validation_status,risk_assessment.risk_level to trim the response.
+    
+    With a deadline (deadline_ms, or the X-Deadline-Ms header), stages not
+    finished in time are cancelled and the result is scored on the evidence
+    available, listing the missing stages in skipped_stages.
+    
+    X-Profile (with X-Admin-Token) profiles the call; the profile id is
+    returned in X-Profile-Id.
     """
     if not gmaps:
         raise HTTPException(status_code=500, detail="Google Maps API not configured")
     
-    merchant_info = None
-    search_query = ""
+    budget_ms = deadline_ms if deadline_ms is not None else x_deadline_ms
+    if budget_ms is not None and budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms must be positive")
+    
+    trigger = profiler.trigger(bool(x_profile) and is_admin(x_admin_token))
+    with profiler.profile("validation", f"validate-merchant: {request.merchant_name}", trigger) as profile:
+        result = await run_validation(request, fields, budget_ms)
+    
+    if profile is not None:
+        (result if isinstance(result, Response) else response).headers["X-Profile-Id"] = profile.id
+    return result
+
+async def run_validation(request: MerchantValidationRequest, fields: Optional[str], budget_ms: Optional[int]):
+    # Merchants on the allow or deny list get their verdict without upstream calls
+    with stage("screening"):
+        screening = merchant_screener.screen(request.place_id, request.merchant_name, request.address)
+    if screening:
+        result = screened_result(request, screening)
+        if fields:
+            return ORJSONResponse(select_fields(result.dict(), parse_fields(fields)))
+        return result
     
+    cnpj = None
     try:
-        # Try to get merchant by place_id first
-        if request.place_id:
-            merchant_info = get_merchant_by_place_id(request.place_id)
-            search_query = f"place_id: {request.place_id}"
-        
-        # If no place_id or not found, search by name and address
-        if not merchant_info and request.merchant_name:
-            merchant_info = search_merchant_by_name_and_address(
-                request.merchant_name, 
-                request.address
-            )
-            search_query = f"name: {request.merchant_name}"
-            if request.address:
-                search_query += f", address: {request.address}"
+        # The Google lookup and the CNPJ check are independent, so they run
+        # side by side. Google calls are blocking; keep them off the event loop.
+        with request_deadline(budget_ms / 1000 if budget_ms else None):
+            lookup = asyncio.ensure_future(run_in_threadpool(lookup_merchant, request))
+            cnpj = asyncio.ensure_future(process_cnpj_data(request.merchant_name, request.address))
+            await asyncio.wait((lookup, cnpj), timeout=deadline_remaining())
         
-        # Compare addresses if both are available
-        address_comparison = None
-        if merchant_info and request.address:
-            address_comparison = compare_addresses(request.address, merchant_info.address)
+        skipped_stages = []
+        merchant_info, search_query = stage_result(lookup, "google_places", skipped_stages, (None, f"name: {request.merchant_name}"))
         
         # Process CNPJ data for Brazilian merchants
         cnpj_comparison = None
         try:
-            cnpj_comparison = await process_cnpj_data(request.merchant_name, request.address)
+            cnpj_comparison = stage_result(cnpj, "cnpj", skipped_stages)
         except Exception as e:
             logger.warning(f"Error processing CNPJ data: {str(e)}")
         
+        # Compare addresses if both are available
+        address_comparison = None
+        if merchant_info and request.address:
+            with stage("address_comparison"):
+                address_comparison = compare_addresses(request.address, merchant_info.address)
+        
+        # Index the resolved location and count merchants sharing it
+        colocation_count = register_merchant_location(merchant_info)
+        
         # Calculate risk assessment
-        risk_assessment = calculate_risk_score(merchant_info, request.transaction_amount, address_comparison, cnpj_comparison)
-        
-        # Determine validation status
-        if not merchant_info:
-            validation_status = "INVALID"
-        elif risk_assessment.risk_level in ["CRITICAL", "HIGH"]:
-            validation_status = "SUSPICIOUS"
-        else:
-            validation_status = "VALID"
-        
-        return ValidationResult(
-            merchant_info=merchant_info,
-            risk_assessment=risk_assessment,
-            address_comparison=address_comparison,
-            cnpj_comparison=cnpj_comparison,
-            validation_status=validation_status,
-            timestamp=datetime.now(),
-            search_query=search_query
-        )
+        with stage("risk_scoring"):
+            risk_assessment = calculate_risk_score(
+                merchant_info, request.transaction_amount, address_comparison, cnpj_comparison, colocation_count,
+                places_skipped="google_places" in skipped_stages
+            )
         
+        result = finalize_result(request, merchant_info, search_query, risk_assessment, address_comparison, cnpj_comparison, skipped_stages)
+        
+        if fields:
+            return ORJSONResponse(select_fields(result.dict(), parse_fields(fields)))
+        return result
+        
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         logger.error(f"Error validating merchant: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Validation error: {str(e)}")
+    finally:
+        # A failed Google lookup leaves the CNPJ check nobody waits for
+        if cnpj is not None and not cnpj.done():
+            cnpj.cancel()
 
 @app.get("/search-merchants")
 async def search_merchants(query: str, limit: int = 5):
@@ -591,7 +590,12 @@ async def search_merchants(query: str, limit: int = 5):
         raise HTTPException(status_code=500, detail="Google Maps API not configured")
     
     try:
-        places_result = gmaps.places(query=query, type="establishment")
+        def text_search():
+            with google_breaker.call(), google_scheduler.slot():
+                return gmaps.places(query=query, type="establishment")
+        
+        # Run off the event loop so waiting for an upstream slot blocks nothing else
+        places_result = await run_in_threadpool(text_search)
         
         results = []
         for place in places_result.get("results", [])[:limit]:
@@ -606,10 +610,99 @@ async def search_merchants(query: str, limit: int = 5):
         
         return {"results": results, "query": query}
         
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         logger.error(f"Error searching merchants: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
+@app.get("/merchants/autocomplete")
+async def autocomplete_merchants(query: str, limit: int = 5, session_token: Optional[str] = None):
+    """
+    Type-ahead over merchants we have already resolved. Google Places
+    Autocomplete is only asked when too few are known locally; pass the
+    returned session_token on every keystroke and to /validate-merchant.
+    """
+    if limit < 1 or limit > 20:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 20")
+    
+    results = merchant_autocomplete.search(query, limit)
+    session_token = places_autocomplete.session(session_token)
+    source = "local"
+    
+    if len(results) < limit and gmaps and places_autocomplete.wants_google(query):
+        predictions = places_autocomplete.cached(query)
+        if predictions is None:
+            def google_autocomplete():
+                with google_breaker.call(), google_scheduler.slot():
+                    return gmaps.places_autocomplete(query, session_token=session_token, types="establishment")
+            
+            try:
+                predictions = [prediction_result(p) for p in await run_in_threadpool(google_autocomplete)]
+                places_autocomplete.store(query, session_token, predictions)
+            except Exception as e:
+                # Local matches are still worth returning
+                logger.warning(f"Error in Places Autocomplete: {str(e)}")
+                predictions = []
+        
+        known = {result["place_id"] for result in results}
+        for prediction in predictions:
+            if len(results) >= limit:
+                break
+            if prediction["place_id"] not in known:
+                results.append(prediction)
+                source = "local+google"
+    
+    return {"results": results, "query": query, "session_token": session_token, "source": source}
+
+@app.get("/merchants/nearby")
+async def get_nearby_merchants(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = 100,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    List validated merchants within radius_m meters of a point
+    """
+    if radius_m <= 0 or radius_m > 50000:
+        raise HTTPException(status_code=400, detail="radius_m must be between 0 and 50000")
+    
+    merchants = merchant_locations.nearby(lat, lng, radius_m, limit=limit)
+    return {
+        "results": merchants,
+        "center": {"lat": lat, "lng": lng},
+        "radius_m": radius_m
+    }
+
+async def proxied_image(request: Request, load) -> Response:
+    """Serve an image from the image cache, answering 304 when the browser has it"""
+    try:
+        meta, data = await load()
+    except ImageNotFound:
+        raise HTTPException(status_code=404, detail="Image not available")
+    except ImageFetchError as e:
+        logger.error(f"Error proxying image: {str(e)}")
+        raise HTTPException(status_code=502, detail="Image could not be fetched")
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    
+    headers = {"ETag": meta["etag"], "Cache-Control": f"private, max-age={IMAGE_CACHE_MAX_AGE}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if meta["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=meta["content_type"], headers=headers)
+
+@app.get("/images/place-photo/{photo_reference}")
+async def get_place_photo(photo_reference: str, request: Request, maxwidth: int = 400):
+    """Place photo, fetched from Google once and then served from the disk cache"""
+    return await proxied_image(request, lambda: image_cache.place_photo(photo_reference, maxwidth))
+
+@app.get("/images/streetview")
+async def get_street_view(request: Request, lat: float, lng: float, width: int = 640, height: int = 480, heading: Optional[float] = None, pitch: float = 0.0, fov: float = 90.0):
+    """Street View image (at most 640x640), fetched from Google once and then served from the disk cache"""
+    return await proxied_image(request, lambda: image_cache.street_view(lat, lng, width, height, heading, pitch, fov))
+
 @app.get("/cnpj/{cnpj}")
 async def get_cnpj_info(cnpj: str):
     """
@@ -632,10 +725,25 @@ async def get_cnpj_info(cnpj: str):
         
     except HTTPException:
         raise
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         logger.error(f"Error fetching CNPJ {cnpj}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"CNPJ lookup error: {str(e)}")
 
+@app.get("/cnpj-candidates")
+async def search_cnpj_candidates(name: str, city: Optional[str] = None, limit: int = 5):
+    """
+    Find candidate CNPJs for a merchant name using the local registry index
+    """
+    candidates = cnpj_name_index.search(name, city=city, limit=limit)
+    return {
+        "candidates": candidates,
+        "query": name,
+        "city": city,
+        "indexed_entries": len(cnpj_name_index)
+    }
+
 @app.post("/compare-cnpj")
 async def compare_merchant_with_cnpj(merchant_name: str, cnpj: str, merchant_address: Optional[str] = None):
     """
@@ -669,110 +777,652 @@ async def compare_merchant_with_cnpj(merchant_name: str, cnpj: str, merchant_add
         
     except HTTPException:
         raise
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         logger.error(f"Error comparing merchant with CNPJ {cnpj}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"CNPJ comparison error: {str(e)}")
 
+@stage("google_places")
+def lookup_merchant(merchant_request: MerchantValidationRequest) -> Tuple[Optional[MerchantInfo], str]:
+    """Resolve a merchant through Google Places (network-bound stage)"""
+    merchant_info = None
+    search_query = ""
+    
+    # Try to get merchant by place_id first
+    if merchant_request.place_id:
+        session_token = places_autocomplete.end_session(merchant_request.session_token)
+        merchant_info = get_merchant_by_place_id(merchant_request.place_id, session_token)
+        search_query = f"place_id: {merchant_request.place_id}"
+    
+    # If no place_id or not found, search by name and address
+    if not merchant_info and merchant_request.merchant_name:
+        merchant_info = search_merchant_by_name_and_address(
+            merchant_request.merchant_name, 
+            merchant_request.address
+        )
+        search_query = f"name: {merchant_request.merchant_name}"
+        if merchant_request.address:
+            search_query += f", address: {merchant_request.address}"
+    
+    if merchant_info:
+        merchant_store.add_merchant(merchant_info)
+        merchant_autocomplete.add_merchant(merchant_info)
+    
+    return merchant_info, search_query
+
+@stage("finalize")
+def finalize_result(merchant_request: MerchantValidationRequest, merchant_info: Optional[MerchantInfo], search_query: str, risk_assessment: RiskAssessment, address_comparison: Optional[AddressComparison] = None, cnpj_comparison: Optional[CNPJComparison] = None, skipped_stages: Optional[List[str]] = None) -> ValidationResult:
+    """Determine the validation status and record the outcome"""
+    skipped_stages = skipped_stages or []
+    if "google_places" in skipped_stages:
+        validation_status = "UNVERIFIED"
+    elif not merchant_info:
+        validation_status = "INVALID"
+    elif risk_assessment.risk_level in ["CRITICAL", "HIGH"]:
+        validation_status = "SUSPICIOUS"
+    else:
+        validation_status = "VALID"
+    
+    result = ValidationResult(
+        merchant_info=merchant_info,
+        risk_assessment=risk_assessment,
+        address_comparison=address_comparison,
+        cnpj_comparison=cnpj_comparison,
+        validation_status=validation_status,
+        timestamp=datetime.now(),
+        search_query=search_query,
+        skipped_stages=skipped_stages
+    )
+    record_validation(merchant_request, result)
+    validation_audit.add_result(merchant_request, result)
+    
+    return result
+
+def screened_result(merchant_request: MerchantValidationRequest, screening: ScreeningVerdict) -> ValidationResult:
+    """Validation result of a merchant on the allow or deny list"""
+    reason = f": {screening.reason}" if screening.reason else ""
+    if screening.verdict == DENY:
+        validation_status = "SUSPICIOUS"
+        risk_assessment = RiskAssessment(
+            risk_score=100,
+            risk_level="CRITICAL",
+            risk_factors=[f"Merchant on deny list (by {screening.matched_on}){reason}"],
+            recommendations=["Block transaction - merchant denied by investigators"]
+        )
+    else:
+        validation_status = "VALID"
+        risk_assessment = RiskAssessment(
+            risk_score=0,
+            risk_level="LOW",
+            risk_factors=[],
+            recommendations=[f"Known-good merchant (allow list, by {screening.matched_on}){reason} - standard processing"]
+        )
+    
+    result = ValidationResult(
+        merchant_info=None,
+        risk_assessment=risk_assessment,
+        validation_status=validation_status,
+        timestamp=datetime.now(),
+        search_query=f"screening: {screening.matched_on}",
+        screening=screening
+    )
+    validation_audit.add_result(merchant_request, result)
+    return result
+
+def error_result(merchant_request: MerchantValidationRequest, error: Exception) -> ValidationResult:
+    """Validation result for a merchant that could not be processed"""
+    result = ValidationResult(
+        merchant_info=None,
+        risk_assessment=RiskAssessment(
+            risk_score=100,
+            risk_level="CRITICAL",
+            risk_factors=[f"Processing error: {str(error)}"],
+            recommendations=["Manual review required"]
+        ),
+        address_comparison=None,
+        validation_status="ERROR",
+        timestamp=datetime.now(),
+        search_query=f"name: {merchant_request.merchant_name}"
+    )
+    validation_audit.add_result(merchant_request, result)
+    
+    return result
+
+def score_merchant(merchant_request: MerchantValidationRequest, merchant_info: Optional[MerchantInfo], search_query: str, cnpj_comparison: Optional[CNPJComparison] = None) -> ValidationResult:
+    """Scoring stage of a merchant already looked up"""
+    # Compare addresses if both are available
+    address_comparison = None
+    if merchant_info and merchant_request.address:
+        with stage("address_comparison"):
+            address_comparison = compare_addresses(merchant_request.address, merchant_info.address)
+    
+    # Index the resolved location and count merchants sharing it
+    colocation_count = register_merchant_location(merchant_info)
+    
+    # Calculate risk assessment
+    with stage("risk_scoring"):
+        risk_assessment = calculate_risk_score(merchant_info, merchant_request.transaction_amount, address_comparison, cnpj_comparison, colocation_count)
+    
+    return finalize_result(merchant_request, merchant_info, search_query, risk_assessment, address_comparison, cnpj_comparison)
+
 async def process_single_merchant(merchant_request: MerchantValidationRequest) -> ValidationResult:
-    """Process a single merchant validation"""
+    """
+    Process a single merchant validation with the Google lookup and the
+    CNPJ check side by side, as /validate-merchant does, so its score is
+    comparable to a recorded one
+    """
     try:
-        merchant_info = None
-        search_query = ""
-        
-        # Try to get merchant by place_id first
-        if merchant_request.place_id:
-            merchant_info = get_merchant_by_place_id(merchant_request.place_id)
-            search_query = f"place_id: {merchant_request.place_id}"
-        
-        # If no place_id or not found, search by name and address
-        if not merchant_info and merchant_request.merchant_name:
-            merchant_info = search_merchant_by_name_and_address(
-                merchant_request.merchant_name, 
-                merchant_request.address
-            )
-            search_query = f"name: {merchant_request.merchant_name}"
-            if merchant_request.address:
-                search_query += f", address: {merchant_request.address}"
-        
-        # Compare addresses if both are available
-        address_comparison = None
-        if merchant_info and merchant_request.address:
-            address_comparison = compare_addresses(merchant_request.address, merchant_info.address)
-        
-        # Calculate risk assessment
-        risk_assessment = calculate_risk_score(merchant_info, merchant_request.transaction_amount, address_comparison)
-        
-        # Determine validation status
-        if not merchant_info:
-            validation_status = "INVALID"
-        elif risk_assessment.risk_level in ["CRITICAL", "HIGH"]:
-            validation_status = "SUSPICIOUS"
-        else:
-            validation_status = "VALID"
-        
-        return ValidationResult(
-            merchant_info=merchant_info,
-            risk_assessment=risk_assessment,
-            address_comparison=address_comparison,
-            validation_status=validation_status,
-            timestamp=datetime.now(),
-            search_query=search_query
+        (merchant_info, search_query), cnpj_comparison = await asyncio.gather(
+            run_in_threadpool(lookup_merchant, merchant_request),
+            process_cnpj_data(merchant_request.merchant_name, merchant_request.address)
         )
+        return score_merchant(merchant_request, merchant_info, search_query, cnpj_comparison)
         
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error processing merchant: {str(e)}")
-        # Return error result
-        return ValidationResult(
-            merchant_info=None,
-            risk_assessment=RiskAssessment(
-                risk_score=100,
-                risk_level="CRITICAL",
-                risk_factors=[f"Processing error: {str(e)}"],
-                recommendations=["Manual review required"]
-            ),
-            address_comparison=None,
-            validation_status="ERROR",
-            timestamp=datetime.now(),
-            search_query=f"name: {merchant_request.merchant_name}"
-        )
+        return error_result(merchant_request, e)
+
+class BatchPaused(Exception):
+    """Raised inside a batch loop when a pause (or shutdown) was requested"""
+
+def stop_requested(batch_id: str) -> bool:
+    return batch_id in pause_requests or shutdown_requested.is_set()
+
+def when_available(batch_id: str, call):
+    """
+    Run a batch row's upstream call, waiting out open circuits instead of
+    failing the row; a pause request ends the wait
+    """
+    while True:
+        if stop_requested(batch_id):
+            raise BatchPaused()
+        try:
+            return call()
+        except UpstreamUnavailable as e:
+            logger.info(f"Batch {batch_id} waiting for {e.upstream}")
+            resume_at = time.monotonic() + (e.retry_after or 1)
+            while time.monotonic() < resume_at and not stop_requested(batch_id):
+                time.sleep(0.5)
+
+def wait_for_cnpj(batch_id: str, cnpj_stage: BatchCNPJStage, index: int) -> CNPJComparison:
+    """CNPJ comparison of a batch row, waiting for the CNPJ stage; a pause request ends the wait"""
+    with stage("cnpj_wait"):
+        while not cnpj_stage.ready(index):
+            if stop_requested(batch_id):
+                raise BatchPaused()
+            time.sleep(0.2)
+        return cnpj_stage.comparison(index)
+
+def batch_chunk_profile(batch_id: str, start: int):
+    """Profile of the batch chunk starting at row start (of the rows left to process), if it is to be profiled"""
+    trigger = profiler.trigger(batch_id in profiled_batches)
+    return profiler.profile("batch_chunk", f"batch {batch_id}: rows from {start}", trigger, sample_thread=True)
+
+def checkpoint_batch(batch_id: str, force: bool = False):
+    """Update progress and persist completed rows every checkpoint interval"""
+    results = batch_result_store.get(batch_id)
+    batch_storage[batch_id]["processed_merchants"] = len(results)
+    batch_admission.record_progress(batch_id, len(results))
+    batch_events.progress(batch_storage[batch_id])
+    if force or checkpoint_store.due(batch_id, len(results)):
+        # The summary is saved with the state, so a restored batch has it without its rows
+        state = {**batch_storage[batch_id], "summary": results.summary.state()}
+        checkpoint_store.checkpoint(batch_id, state, results)
+
+def process_batch_with_pool(batch_id: str, merchants: List[MerchantValidationRequest], results: BatchResults, cnpj_stage: BatchCNPJStage):
+    """
+    Batch processing for large batches: Google lookups run here, while address
+    comparison and risk scoring of each chunk run on the scoring process pool.
+    A chunk is scored once the CNPJ stage has its rows.
+    """
+    # Looked-up chunks waiting for the CNPJ stage, then chunks being scored
+    awaiting = deque()
+    pending = deque()
+    
+    def chunk_ready(start, rows):
+        return all(cnpj_stage.ready(start + i) for i in range(len(rows)))
+    
+    def submit(start, rows):
+        comparisons = [wait_for_cnpj(batch_id, cnpj_stage, start + i) for i in range(len(rows))]
+        items = [
+            scoring_item(merchant, merchant_info, colocation_count, cnpj_comparison)
+            for (merchant, merchant_info, _, colocation_count), cnpj_comparison in zip(rows, comparisons)
+        ]
+        pending.append((rows, comparisons, scoring_pool.submit(items)))
+    
+    def collect(rows, comparisons, future):
+        try:
+            with stage("scoring_wait"):
+                scored = future.result()
+        except Exception as e:
+            logger.error(f"Error scoring chunk of batch {batch_id}: {str(e)}")
+            scored = None
+        
+        for i, (merchant, merchant_info, search_query, _) in enumerate(rows):
+            if scored is None:
+                result = error_result(merchant, RuntimeError("Scoring worker failed"))
+            else:
+                address_comparison, risk_assessment = scored[i]
+                result = finalize_result(
+                    merchant,
+                    merchant_info,
+                    search_query,
+                    RiskAssessment(**risk_assessment),
+                    AddressComparison(**address_comparison) if address_comparison else None,
+                    comparisons[i]
+                )
+            results.append(result.dict())
+        checkpoint_batch(batch_id)
+    
+    try:
+        for start in range(0, len(merchants), scoring_pool.chunk_size):
+            if stop_requested(batch_id):
+                break
+            
+            with batch_chunk_profile(batch_id, start):
+                rows = []
+                for merchant in merchants[start:start + scoring_pool.chunk_size]:
+                    merchant_info, search_query = when_available(batch_id, lambda: lookup_merchant(merchant))
+                    colocation_count = register_merchant_location(merchant_info)
+                    rows.append((merchant, merchant_info, search_query, colocation_count))
+                awaiting.append((start, rows))
+                
+                # Score chunks whose CNPJs are in, in order, while the next one is looked up;
+                # the Google stage runs at most BATCH_CNPJ_LOOKAHEAD rows ahead
+                while awaiting and (chunk_ready(*awaiting[0]) or len(awaiting) * scoring_pool.chunk_size > BATCH_CNPJ_LOOKAHEAD):
+                    submit(*awaiting.popleft())
+                while pending and pending[0][2].done():
+                    collect(*pending.popleft())
+        
+        while awaiting:
+            submit(*awaiting.popleft())
+    except BatchPaused:
+        # Rows not yet submitted are looked up again on resume
+        pass
+    
+    while pending:
+        collect(*pending.popleft())
+    
+    if stop_requested(batch_id):
+        raise BatchPaused()
+
+def process_batch_rows(batch_id: str, merchants: List[MerchantValidationRequest], results: BatchResults, cnpj_stage: BatchCNPJStage):
+    """
+    Batch processing row by row. Rows are completed in order as their CNPJ
+    comes in, while the Google stage runs up to BATCH_CNPJ_LOOKAHEAD rows ahead.
+    """
+    pending = deque()
+    
+    def finish(index, merchant, looked_up):
+        cnpj_comparison = wait_for_cnpj(batch_id, cnpj_stage, index)
+        try:
+            if isinstance(looked_up, Exception):
+                raise looked_up
+            result = score_merchant(merchant, *looked_up, cnpj_comparison)
+        except Exception as e:
+            logger.error(f"Error processing merchant: {str(e)}")
+            result = error_result(merchant, e)
+        results.append(result.dict())
+        
+        # Update progress
+        checkpoint_batch(batch_id)
+    
+    for start in range(0, len(merchants), scoring_pool.chunk_size):
+        with batch_chunk_profile(batch_id, start):
+            for index in range(start, min(start + scoring_pool.chunk_size, len(merchants))):
+                merchant = merchants[index]
+                try:
+                    looked_up = when_available(batch_id, lambda: lookup_merchant(merchant))
+                except BatchPaused:
+                    raise
+                except Exception as e:
+                    looked_up = e
+                pending.append((index, merchant, looked_up))
+                
+                while pending and (cnpj_stage.ready(pending[0][0]) or len(pending) > BATCH_CNPJ_LOOKAHEAD):
+                    finish(*pending.popleft())
+    
+    while pending:
+        finish(*pending.popleft())
 
 def process_batch_validation(batch_id: str, merchants: List[MerchantValidationRequest]):
-    """Background task to process batch validation"""
+    """Background task to process (or resume) a batch validation"""
+    # Upstream calls of this batch yield to interactive validations and
+    # share batch capacity fairly with other running batches
+    with upstream_priority(BATCH, batch_id), audit_batch(batch_id):
+        run_batch_validation(batch_id, merchants)
+
+def run_batch_validation(batch_id: str, merchants: List[MerchantValidationRequest]):
+    results = batch_result_store.open(batch_id)
+    batch = batch_storage[batch_id]
     try:
-        batch_storage[batch_id]["status"] = "PROCESSING"
-        results = []
+        batch["status"] = "PROCESSING"
+        checkpoint_batch(batch_id, force=True)
         
-        for i, merchant in enumerate(merchants):
-            # Process single merchant (this would be async in a real implementation)
-            import asyncio
-            result = asyncio.run(process_single_merchant(merchant))
-            results.append(result)
-            
-            # Update progress
-            batch_storage[batch_id]["processed_merchants"] = i + 1
-            
-            # Small delay to prevent API rate limiting
-            import time
-            time.sleep(0.1)
+        # Rows completed before a pause or restart are not processed again
+        remaining = merchants[len(results):]
+        
+        # CNPJs are fetched on their own stage, overlapping the Google lookups
+        cnpj_stage = batch_cnpj_stage(batch_id, remaining)
+        try:
+            if scoring_pool.enabled_for(len(remaining)):
+                process_batch_with_pool(batch_id, remaining, results, cnpj_stage)
+            else:
+                process_batch_rows(batch_id, remaining, results, cnpj_stage)
+        finally:
+            cnpj_stage.close()
         
         # Complete the batch
-        batch_storage[batch_id]["status"] = "COMPLETED"
-        batch_storage[batch_id]["completed_at"] = datetime.now()
-        batch_storage[batch_id]["results"] = results
+        batch["status"] = "COMPLETED"
+        batch["completed_at"] = datetime.now()
+        checkpoint_batch(batch_id, force=True)
+        batch_result_store.release(batch_id)
+        batch_events.publish(BATCH_COMPLETED, batch, {
+            "links": {"status": f"/batch-status/{batch_id}", "export": f"/batch/{batch_id}/export"}
+        })
+        
+    except BatchPaused:
+        if shutdown_requested.is_set() and batch_id not in pause_requests:
+            # Still PROCESSING, so the restarted service resumes it
+            checkpoint_batch(batch_id, force=True)
+            batch_result_store.release(batch_id)
+            logger.info(f"Batch {batch_id} stopped for shutdown after {len(results)} merchants")
+            return
+        pause_requests.discard(batch_id)
+        batch["status"] = "PAUSED"
+        checkpoint_batch(batch_id, force=True)
+        batch_result_store.release(batch_id)
+        batch_events.publish(BATCH_PAUSED, batch)
+        logger.info(f"Batch {batch_id} paused after {len(results)} merchants")
         
     except Exception as e:
         logger.error(f"Error processing batch {batch_id}: {str(e)}")
-        batch_storage[batch_id]["status"] = "FAILED"
+        batch["status"] = "FAILED"
+        checkpoint_batch(batch_id, force=True)
+        batch_result_store.release(batch_id)
+        batch_events.publish(BATCH_FAILED, batch, {"error": str(e)})
+
+def create_batch(merchants: List[MerchantValidationRequest], callback_url: Optional[str] = None, tenant_id: str = DEFAULT_TENANT, profile: bool = False, content_hash: Optional[str] = None, idempotency_key: Optional[str] = None) -> BatchValidationStatus:
+    """Register a new batch; checkpoint_new_batch() must run before it is queued. With profile every chunk is profiled"""
+    batch_id = str(uuid.uuid4())
+    batch_status = BatchValidationStatus(
+        batch_id=batch_id,
+        status="PENDING",
+        total_merchants=len(merchants),
+        processed_merchants=0,
+        created_at=datetime.now(),
+        callback_url=callback_url,
+        tenant_id=tenant_id,
+        content_hash=content_hash,
+        idempotency_key=idempotency_key
+    )
+    
+    # Store batch
+    batch_storage[batch_id] = batch_status.dict()
+    batch_result_store.create(batch_id)
+    if content_hash:
+        batch_dedup.register(batch_id, tenant_id, content_hash, idempotency_key)
+    if profile:
+        profiled_batches.add(batch_id)
+    
+    return batch_status
+
+def checkpoint_new_batch(batch_id: str, merchants: List[MerchantValidationRequest]):
+    """Write a new batch's rows to its checkpoint; serializes and fsyncs, so run it in the threadpool"""
+    try:
+        checkpoint_store.start(batch_id, batch_storage[batch_id], [merchant.dict() for merchant in merchants])
+    except OSError as e:
+        logger.error(f"Error checkpointing new batch {batch_id}: {str(e)}")
+
+def reusable_batch(batch_id: str) -> bool:
+    """A batch a resubmission may return: still queued, running or paused, or completed within the window"""
+    batch_data = batch_storage.get(batch_id)
+    if batch_data is None:
+        return False
+    if batch_data["status"] in ["PENDING", "PROCESSING", "PAUSED"]:
+        return True
+    completed_at = batch_data["completed_at"]
+    return batch_data["status"] == "COMPLETED" and completed_at is not None and (datetime.now() - completed_at).total_seconds() <= BATCH_DEDUP_WINDOW
+
+def batch_request_hash(merchants: List[MerchantValidationRequest], callback_url: Optional[str]) -> Optional[str]:
+    """Content hash of a submission, None when dedup is off; hashes every row, so run it in the threadpool"""
+    if BATCH_DEDUP_WINDOW <= 0:
+        return None
+    return batch_content_hash((merchant.dict() for merchant in merchants), callback_url)
+
+def find_duplicate_batch(content_hash: Optional[str], tenant_id: str, idempotency_key: Optional[str]) -> Optional[str]:
+    """
+    Earlier batch_id or None. Only a batch with the same rows and
+    callback_url is returned; reusing an Idempotency-Key for different
+    ones is a 409. Runs on the event loop, together with create_batch(),
+    so two identical submissions cannot both miss each other.
+    """
+    if content_hash is None:
+        return None
+    
+    batch_id = batch_dedup.find(tenant_id, content_hash, idempotency_key, reusable_batch)
+    if batch_id and batch_storage[batch_id]["content_hash"] != content_hash:
+        raise HTTPException(status_code=409, detail="Idempotency-Key was already used for different rows or callback_url")
+    return batch_id
+
+def admit_batch(tenant_id: str, rows: int):
+    """Turn an admission rejection into 413, 429 or 503 with Retry-After"""
+    try:
+        batch_admission.check(tenant_id, rows)
+    except AdmissionRejected as e:
+        detail = {"message": e.reason}
+        headers = None
+        if e.retry_after:
+            detail["retry_after"] = e.retry_after
+            detail["estimated_start_at"] = e.estimated_start_at.isoformat()
+            headers = {"Retry-After": str(e.retry_after)}
+        raise HTTPException(status_code=e.status_code, detail=detail, headers=headers)
+
+def enqueue_batch(batch_id: str, merchants: List[MerchantValidationRequest], processed: int = 0):
+    """Hand a batch to the admission queue; it starts as soon as a slot is free"""
+    tenant_id = batch_storage[batch_id].get("tenant_id") or DEFAULT_TENANT
+    batch_admission.submit(
+        batch_id,
+        tenant_id,
+        len(merchants),
+        lambda: process_batch_validation(batch_id, merchants),
+        processed=processed
+    )
+
+def batch_status_response(batch_id: str) -> BatchValidationStatus:
+    """Batch status without results, with its place in the queue while it waits"""
+    return BatchValidationStatus(**{**batch_storage[batch_id], **(batch_admission.queue_status(batch_id) or {}), "results": None})
+
+def fetch_merchant_snapshot(place_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cheap Place Details lookup (Basic Data fields only) used to detect upstream changes
+    """
+    if not gmaps:
+        return None
+    
+    try:
+        with google_breaker.call(), google_scheduler.slot():
+            details = gmaps.place(place_id=place_id, fields=list(SNAPSHOT_FIELDS))
+        return validation_ledger.snapshot_from_details(details["result"])
+    except Exception as e:
+        logger.error(f"Error fetching snapshot for {place_id}: {str(e)}")
+        return None
+
+def process_revalidation(job_id: str, entries: List[Dict[str, Any]]):
+    """Background task to re-validate stale merchants, rescoring only those that changed"""
+    with upstream_priority(BATCH, f"revalidation:{job_id}"):
+        run_revalidation(job_id, entries)
+
+def run_revalidation(job_id: str, entries: List[Dict[str, Any]]):
+    job = revalidation_jobs[job_id]
+    try:
+        job["status"] = "PROCESSING"
+        
+        for entry in entries:
+            job["checked_merchants"] += 1
+            snapshot = fetch_merchant_snapshot(entry["place_id"])
+            
+            if snapshot is None:
+                job["failed_merchants"] += 1
+                continue
+            
+            if snapshot == entry["snapshot"]:
+                validation_ledger.touch(entry["place_id"])
+                job["unchanged_merchants"] += 1
+                continue
+            
+            # Upstream data changed - run the full validation again
+            request = MerchantValidationRequest(**entry["request"])
+            try:
+                result = asyncio.run(process_single_merchant(request))
+            except UpstreamUnavailable:
+                # Left stale, so the next run picks it up again
+                job["failed_merchants"] += 1
+                continue
+            
+            if result.validation_status == "ERROR":
+                job["failed_merchants"] += 1
+                continue
+            
+            job["rescored_merchants"] += 1
+            new_level = result.risk_assessment.risk_level
+            if new_level != entry["risk_level"]:
+                job["risk_changes"].append(RiskLevelChange(
+                    place_id=entry["place_id"],
+                    merchant_name=request.merchant_name,
+                    previous_risk_level=entry["risk_level"],
+                    new_risk_level=new_level,
+                    previous_risk_score=entry["risk_score"],
+                    new_risk_score=result.risk_assessment.risk_score
+                ).dict())
+        
+        job["status"] = "COMPLETED"
+        job["completed_at"] = datetime.now()
+        
+    except Exception as e:
+        logger.error(f"Error processing revalidation {job_id}: {str(e)}")
+        job["status"] = "FAILED"
+
+@app.get("/validations")
+async def list_validations(
+    risk_level: Optional[str] = None,
+    risk_factor: Optional[str] = None,
+    validation_status: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    place_id: Optional[str] = None,
+    days: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """
+    Search stored validations, newest first, e.g.
+    risk_level=CRITICAL&risk_factor=Business permanently closed&days=30.
+    Pass next_cursor back as cursor= for the next page.
+    """
+    try:
+        return await search_validations(
+            risk_level=risk_level.upper() if risk_level else None,
+            risk_factor=risk_factor,
+            validation_status=validation_status.upper() if validation_status else None,
+            batch_id=batch_id,
+            place_id=place_id,
+            days=days,
+            limit=max(1, min(limit, 1000)),
+            cursor=cursor
+        )
+    except ValidationStoreUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except Exception as e:
+        logger.error(f"Error searching validations: {str(e)}")
+        raise HTTPException(status_code=503, detail="Validation store unavailable")
+
+@app.get("/validations/summary")
+async def get_validation_summary(days: int = 30, batch_id: Optional[str] = None):
+    """Risk level and status distribution over the last days, or for one batch"""
+    try:
+        return await validation_summary(days=max(days, 1), batch_id=batch_id)
+    except ValidationStoreUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading validation summary: {str(e)}")
+        raise HTTPException(status_code=503, detail="Validation store unavailable")
+
+@app.post("/revalidate", response_model=RevalidationStatus)
+async def revalidate_stale_merchants(background_tasks: BackgroundTasks, limit: Optional[int] = None):
+    """Re-validate merchants whose last validation is past the TTL for their risk level"""
+    if not gmaps:
+        raise HTTPException(status_code=500, detail="Google Maps API not configured")
+    
+    try:
+        entries = await validation_ledger.stale_entries(limit=limit)
+    except ValidationStoreUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading stale merchants: {str(e)}")
+        raise HTTPException(status_code=503, detail="Merchant store unavailable")
+    
+    job_id = str(uuid.uuid4())
+    job_status = RevalidationStatus(
+        job_id=job_id,
+        status="PENDING",
+        stale_merchants=len(entries),
+        created_at=datetime.now()
+    )
+    
+    revalidation_jobs[job_id] = job_status.dict()
+    expire_revalidation_jobs()
+    background_tasks.add_task(process_revalidation, job_id, entries)
+    
+    return job_status
+
+def expire_revalidation_jobs():
+    """Drop the oldest finished jobs beyond REVALIDATION_MAX_JOBS"""
+    excess = len(revalidation_jobs) - REVALIDATION_MAX_JOBS
+    if excess <= 0:
+        return
+    finished = [job_id for job_id, job in revalidation_jobs.items() if job["status"] in ("COMPLETED", "FAILED")]
+    for job_id in finished[:excess]:
+        del revalidation_jobs[job_id]
+
+@app.get("/revalidation-status/{job_id}", response_model=RevalidationStatus)
+async def get_revalidation_status(job_id: str):
+    """Get progress and risk-level delta report of a re-validation job"""
+    if job_id not in revalidation_jobs:
+        raise HTTPException(status_code=404, detail="Revalidation job not found")
+    
+    return RevalidationStatus(**revalidation_jobs[job_id])
 
 @app.post("/upload-csv", response_model=BatchValidationStatus)
-async def upload_csv_for_validation(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    """Upload CSV file for batch merchant validation"""
+async def upload_csv_for_validation(
+    response: Response,
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None),
+    x_tenant_id: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Upload CSV file for batch merchant validation.
+    callback_url receives signed webhooks on progress milestones, completion and failure.
+    Batches are admitted per X-Tenant-ID, and resubmissions return the
+    earlier batch; see /validate-batch.
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV")
+    if callback_url:
+        await validate_callback_url(callback_url)
     
     try:
         # Read CSV content
         content = await file.read()
+        # pandas is only needed here, so it is imported on first upload
+        import pandas as pd
         df = pd.read_csv(io.StringIO(content.decode('utf-8')))
         
         # Validate required columns
@@ -796,56 +1446,299 @@ async def upload_csv_for_validation(background_tasks: BackgroundTasks, file: Upl
             )
             merchants.append(merchant_request)
         
+        tenant_id = x_tenant_id or DEFAULT_TENANT
+        content_hash = await run_in_threadpool(batch_request_hash, merchants, callback_url)
+        duplicate_id = find_duplicate_batch(content_hash, tenant_id, idempotency_key)
+        if duplicate_id:
+            response.headers["Idempotent-Replayed"] = "true"
+            return batch_status_response(duplicate_id)
+        admit_batch(tenant_id, len(merchants))
+        
         # Create batch
-        batch_id = str(uuid.uuid4())
-        batch_status = BatchValidationStatus(
-            batch_id=batch_id,
-            status="PENDING",
-            total_merchants=len(merchants),
-            processed_merchants=0,
-            created_at=datetime.now()
+        batch_status = create_batch(
+            merchants, callback_url, tenant_id,
+            profile=bool(x_profile) and is_admin(x_admin_token),
+            content_hash=content_hash,
+            idempotency_key=idempotency_key
         )
+        await run_in_threadpool(checkpoint_new_batch, batch_status.batch_id, merchants)
         
-        # Store batch
-        batch_storage[batch_id] = batch_status.dict()
-        
-        # Start background processing
-        background_tasks.add_task(process_batch_validation, batch_id, merchants)
+        # Queue for background processing
+        enqueue_batch(batch_status.batch_id, merchants)
         
-        return batch_status
+        return batch_status_response(batch_status.batch_id)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing CSV upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"CSV processing error: {str(e)}")
 
 @app.get("/batch-status/{batch_id}", response_model=BatchValidationStatus)
-async def get_batch_status(batch_id: str):
-    """Get status of batch validation"""
+async def get_batch_status(batch_id: str, fields: Optional[str] = None):
+    """
+    Get status of batch validation.
+    fields= trims each entry of results, e.g. fields=validation_status,risk_assessment
+    """
     if batch_id not in batch_storage:
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    batch_data = batch_storage[batch_id]
-    return BatchValidationStatus(**batch_data)
+    # Results are stored as plain dicts already, so skip re-validating them
+    # through the Pydantic model and serialize straight to JSON
+    batch_data = {**batch_storage[batch_id], **(batch_admission.queue_status(batch_id) or {})}
+    if batch_data["status"] == "COMPLETED":
+        # May read an evicted batch back from disk; keep that off the event loop
+        batch_data["results"] = await run_in_threadpool(lambda: list(batch_result_store.rows(batch_id)))
+    if fields and batch_data.get("results") is not None:
+        batch_data["results"] = select_fields(batch_data["results"], parse_fields(fields))
+    return ORJSONResponse(batch_data)
+
+@app.get("/batch/{batch_id}/export")
+async def export_batch(batch_id: str, format: str = "csv"):
+    """
+    Stream batch results as CSV or Parquet, one flattened row per merchant.
+    A running batch exports the rows completed so far.
+    """
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    export_format = format.lower()
+    if export_format == "csv":
+        media_type = "text/csv"
+        stream = stream_csv
+    elif export_format == "parquet":
+        if not parquet_available():
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        media_type = "application/vnd.apache.parquet"
+        stream = stream_parquet
+    else:
+        raise HTTPException(status_code=400, detail="format must be csv or parquet")
+    
+    # Rows of an evicted batch are streamed from its checkpoint, never reloaded;
+    # a sync generator is iterated in the threadpool, keeping the event loop free
+    rows = await run_in_threadpool(batch_result_store.rows, batch_id)
+    return StreamingResponse(
+        stream(rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch_id}.{export_format}"'}
+    )
 
 @app.post("/validate-batch", response_model=BatchValidationStatus)
-async def validate_batch(background_tasks: BackgroundTasks, request: BatchValidationRequest):
-    """Validate multiple merchants in batch"""
-    batch_id = str(uuid.uuid4())
-    batch_status = BatchValidationStatus(
-        batch_id=batch_id,
-        status="PENDING",
-        total_merchants=len(request.merchants),
-        processed_merchants=0,
-        created_at=datetime.now()
+async def validate_batch(
+    request: BatchValidationRequest,
+    response: Response,
+    x_tenant_id: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Validate multiple merchants in batch.
+    Batches wait in a bounded queue; when it (or the X-Tenant-ID's share)
+    is full the request fails with 429/503 and a Retry-After.
+    
+    Submitting the same rows and callback_url again (or the same
+    Idempotency-Key) while the first batch runs, or within
+    BATCH_DEDUP_WINDOW_SECONDS of its completion, returns that batch with
+    Idempotent-Replayed: true.
+    X-Profile (with X-Admin-Token) profiles every chunk of the batch.
+    """
+    if request.callback_url:
+        await validate_callback_url(request.callback_url)
+    tenant_id = x_tenant_id or DEFAULT_TENANT
+    content_hash = await run_in_threadpool(batch_request_hash, request.merchants, request.callback_url)
+    duplicate_id = find_duplicate_batch(content_hash, tenant_id, idempotency_key)
+    if duplicate_id:
+        response.headers["Idempotent-Replayed"] = "true"
+        return batch_status_response(duplicate_id)
+    admit_batch(tenant_id, len(request.merchants))
+    batch_status = create_batch(
+        request.merchants, request.callback_url, tenant_id,
+        profile=bool(x_profile) and is_admin(x_admin_token),
+        content_hash=content_hash,
+        idempotency_key=idempotency_key
     )
+    await run_in_threadpool(checkpoint_new_batch, batch_status.batch_id, request.merchants)
     
-    # Store batch
-    batch_storage[batch_id] = batch_status.dict()
+    # Queue for background processing
+    enqueue_batch(batch_status.batch_id, request.merchants)
     
-    # Start background processing
-    background_tasks.add_task(process_batch_validation, batch_id, request.merchants)
+    return batch_status_response(batch_status.batch_id)
+
+async def validate_callback_url(callback_url: str):
+    try:
+        await batch_events.validate_callback_url(callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/batch/{batch_id}/events")
+async def stream_batch_events(batch_id: str):
+    """
+    Server-sent events for one batch: the current status first, then
+    batch.progress updates until batch.completed, batch.failed or batch.paused
+    """
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
     
-    return batch_status
+    def frame(payload: Dict[str, Any]) -> bytes:
+        return b"event: " + payload["event"].encode() + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+    
+    async def events():
+        queue = batch_events.subscribe(batch_id)
+        try:
+            batch_data = batch_storage[batch_id]
+            yield frame({
+                "event": "batch.status",
+                **{key: value for key, value in batch_data.items() if key not in ("results", "callback_url")}
+            })
+            if batch_data["status"] in ["COMPLETED", "FAILED", "PAUSED"]:
+                return
+            
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield b": keep-alive\n\n"
+                    continue
+                yield frame(payload)
+                if payload["event"] in FINAL_EVENTS:
+                    return
+        finally:
+            batch_events.unsubscribe(batch_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/batch/{batch_id}/summary")
+async def get_batch_summary(batch_id: str, top: int = 10):
+    """
+    Counts per validation status and risk level, average risk score, a risk
+    score histogram and the top risk factors. Maintained as rows complete,
+    so it is current while the batch is still running.
+    """
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    batch_data = batch_storage[batch_id]
+    summary = await run_in_threadpool(batch_result_store.summary, batch_id)
+    return {
+        "batch_id": batch_id,
+        "status": batch_data["status"],
+        "total_merchants": batch_data["total_merchants"],
+        **summary.to_dict(top=max(1, min(top, 100)))
+    }
+
+@app.get("/batch/{batch_id}/webhooks")
+async def get_batch_webhook_deliveries(batch_id: str):
+    """Delivery attempts of this batch's webhooks, oldest first"""
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return {
+        "batch_id": batch_id,
+        "callback_url": batch_storage[batch_id].get("callback_url"),
+        "deliveries": batch_events.delivery_log(batch_id)
+    }
+
+@app.post("/batch/{batch_id}/pause", response_model=BatchValidationStatus)
+async def pause_batch(batch_id: str):
+    """Pause a running batch after its current row; completed rows are checkpointed"""
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    batch_data = batch_storage[batch_id]
+    if batch_data["status"] not in ["PENDING", "PROCESSING"]:
+        raise HTTPException(status_code=409, detail=f"Batch is {batch_data['status']}, not running")
+    
+    if batch_admission.withdraw(batch_id):
+        # Still queued, so there is no running loop to stop
+        batch_data["status"] = "PAUSED"
+        checkpoint_batch(batch_id, force=True)
+        batch_result_store.release(batch_id)
+        batch_events.publish(BATCH_PAUSED, batch_data)
+    else:
+        pause_requests.add(batch_id)
+    return batch_status_response(batch_id)
+
+@app.post("/batch/{batch_id}/resume", response_model=BatchValidationStatus)
+async def resume_batch(batch_id: str):
+    """Resume a paused or failed batch from its last checkpoint"""
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    batch_data = batch_storage[batch_id]
+    if batch_data["status"] not in ["PAUSED", "FAILED"]:
+        raise HTTPException(status_code=409, detail=f"Batch is {batch_data['status']}, cannot resume")
+    
+    merchants = [MerchantValidationRequest(**row) for row in checkpoint_store.load_merchants(batch_id)]
+    if len(merchants) != batch_data["total_merchants"]:
+        raise HTTPException(status_code=409, detail="Batch checkpoint is incomplete, cannot resume")
+    
+    processed = await run_in_threadpool(batch_result_store.count, batch_id)
+    admit_batch(batch_data.get("tenant_id") or DEFAULT_TENANT, len(merchants) - processed)
+    
+    pause_requests.discard(batch_id)
+    batch_data["status"] = "PENDING"
+    enqueue_batch(batch_id, merchants, processed=processed)
+    
+    return batch_status_response(batch_id)
+
+@app.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Profiles kept in the ring buffer, newest first"""
+    require_admin(x_admin_token)
+    return {**profiler.stats(), "profiles": profiler.list()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "json", top: int = 25, x_admin_token: Optional[str] = Header(None)):
+    """
+    Download a profile: its stage timeline and hot functions as JSON, or
+    with format=collapsed its folded stacks for flamegraph tools
+    """
+    require_admin(x_admin_token)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "collapsed":
+        return Response(
+            content=profile.collapsed(),
+            media_type="text/plain",
+            headers={"Content-Disposition": f"attachment; filename=profile_{profile_id}.folded"}
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Format must be json or collapsed")
+    return ORJSONResponse(profile.to_dict(top))
+
+@app.post("/admin/screening/reload")
+async def reload_screening_lists(x_admin_token: Optional[str] = Header(None)):
+    """Reload the allow and deny lists from their files; on error the current lists stay in use"""
+    require_admin(x_admin_token)
+    if not merchant_screener.configured:
+        raise HTTPException(status_code=409, detail="No screening lists configured (SCREENING_ALLOW_PATH, SCREENING_DENY_PATH)")
+    
+    try:
+        return await run_in_threadpool(merchant_screener.reload)
+    except Exception as e:
+        logger.error(f"Error reloading screening lists: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Screening lists not reloaded: {str(e)}")
+
+@app.post("/admin/watchlist/reload")
+async def reload_partner_watchlist(x_admin_token: Optional[str] = Header(None)):
+    """Reload the partner watchlist from WATCHLIST_PATH; on error the current list stays in use"""
+    require_admin(x_admin_token)
+    if not partner_watchlist.configured:
+        raise HTTPException(status_code=409, detail="No partner watchlist configured (WATCHLIST_PATH)")
+    
+    try:
+        return await run_in_threadpool(partner_watchlist.reload)
+    except Exception as e:
+        logger.error(f"Error reloading partner watchlist: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Partner watchlist not reloaded: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,374 @@
+"""
+Merchant Autocomplete - Type-ahead over merchants we have already resolved,
+with Google Places Autocomplete (billed per session) as the fallback
+"""
+
+import os
+import re
+import time
+import uuid
+import asyncio
+import heapq
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Set
+
+from unidecode import unidecode
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_SESSION_TOKEN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+def normalize_query(text: Optional[str]) -> str:
+    """Lowercase, accents and punctuation removed, single spaces"""
+    if not text:
+        return ""
+    return " ".join(_NON_WORD.sub(" ", unidecode(text.lower())).split())
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _popularity(entry: Dict[str, Any], normalized: str) -> tuple:
+    """Sort key among equally good matches: most reviewed, then shortest name"""
+    return (-(entry.get("user_ratings_total") or 0), len(normalized))
+
+class MerchantAutocompleteIndex:
+    """
+    Word-prefix index (a sorted vocabulary plus postings per word) and a
+    trigram index over merchant names. Names whose words start with every
+    query word rank first; trigram similarity then catches typos and
+    fragments from the middle of a word.
+    """
+
+    def __init__(self, max_prefix_words: int = 2000, max_trigram_postings: int = 5000, min_similarity: float = 0.3):
+        # A one-letter prefix may cover much of the vocabulary; expanding it
+        # is capped, and longer words of the query narrow the result anyway
+        self.max_prefix_words = max_prefix_words
+        # Trigrams shared by most names (" pa", "ria") are skipped unless
+        # no rarer trigram is available
+        self.max_trigram_postings = max_trigram_postings
+        self.min_similarity = min_similarity
+
+        self._lock = threading.Lock()
+        self._doc_by_place: Dict[str, int] = {}
+        self._entries: List[Optional[Dict[str, Any]]] = []
+        self._names: List[str] = []
+        self._trigram_counts: List[int] = []
+        self._popularity: List[tuple] = []
+        self._vocabulary: List[str] = []
+        self._word_docs: Dict[str, Set[int]] = {}
+        self._trigram_docs: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_by_place)
+
+    def _unlink(self, doc_id: int) -> None:
+        name = self._names[doc_id]
+        for word in set(name.split()):
+            docs = self._word_docs.get(word)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._word_docs[word]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+        for gram in trigrams(name):
+            docs = self._trigram_docs.get(gram)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._trigram_docs[gram]
+
+    def _add(self, place_id: str, name: str, attributes: Dict[str, Any], new_words: Optional[List[str]] = None) -> bool:
+        """Index one merchant; the caller holds the lock"""
+        normalized = normalize_query(name)
+        if not normalized:
+            return False
+        entry = {"place_id": place_id, "name": name, **attributes}
+
+        doc_id = self._doc_by_place.get(place_id)
+        if doc_id is not None:
+            if self._names[doc_id] == normalized:
+                self._entries[doc_id] = entry
+                self._popularity[doc_id] = _popularity(entry, normalized)
+                return True
+            # Renamed on Google: re-index under a new doc id
+            self._unlink(doc_id)
+            self._entries[doc_id] = None
+
+        doc_id = len(self._entries)
+        self._doc_by_place[place_id] = doc_id
+        self._entries.append(entry)
+        self._names.append(normalized)
+        grams = trigrams(normalized)
+        self._trigram_counts.append(len(grams))
+        self._popularity.append(_popularity(entry, normalized))
+
+        for word in set(normalized.split()):
+            docs = self._word_docs.get(word)
+            if docs is None:
+                docs = self._word_docs[word] = set()
+                if new_words is None:
+                    bisect.insort(self._vocabulary, word)
+                else:
+                    new_words.append(word)
+            docs.add(doc_id)
+        for gram in grams:
+            self._trigram_docs.setdefault(gram, set()).add(doc_id)
+        return True
+
+    def add(self, place_id: str, name: str, **attributes: Any) -> bool:
+        """Add or refresh a merchant. Returns False if the name has nothing to index."""
+        with self._lock:
+            return self._add(place_id, name, attributes)
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk variant of add for rows with place_id, name and attributes"""
+        new_words: List[str] = []
+        added = 0
+        with self._lock:
+            for row in rows:
+                attributes = dict(row)
+                if self._add(attributes.pop("place_id"), attributes.pop("name"), attributes, new_words):
+                    added += 1
+            # One sort per chunk instead of one insertion per new word
+            if new_words:
+                self._vocabulary.extend(new_words)
+                self._vocabulary.sort()
+        return added
+
+    def add_merchant(self, merchant_info: Any) -> None:
+        """Index a resolved MerchantInfo"""
+        self.add(
+            merchant_info.place_id,
+            merchant_info.name,
+            address=merchant_info.address,
+            rating=merchant_info.rating,
+            user_ratings_total=merchant_info.user_ratings_total,
+            types=merchant_info.types,
+            business_status=merchant_info.business_status
+        )
+
+    def _prefix_words(self, prefix: str) -> List[str]:
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + "\x7f", start, min(len(vocabulary), start + self.max_prefix_words))
+        return vocabulary[start:end]
+
+    def _prefix_matches(self, query_words: List[str]) -> Set[int]:
+        """Docs with a word starting with each query word"""
+        expansions = [self._prefix_words(word) for word in query_words]
+        sizes = [sum(len(self._word_docs[word]) for word in words) for words in expansions]
+        # Materialize the most selective prefix only; the other query words
+        # are checked against the candidates' names
+        rarest = min(range(len(query_words)), key=sizes.__getitem__)
+        docs: Set[int] = set()
+        for word in expansions[rarest]:
+            docs |= self._word_docs[word]
+
+        others = [word for i, word in enumerate(query_words) if i != rarest]
+        if not others:
+            return docs
+        names = self._names
+        return {
+            doc_id for doc_id in docs
+            if all(any(word.startswith(prefix) for word in names[doc_id].split()) for prefix in others)
+        }
+
+    def _similar_docs(self, normalized: str, exclude: Set[int], max_ranked: int) -> List[tuple]:
+        query_grams = trigrams(normalized)
+        postings = sorted(
+            (self._trigram_docs[gram] for gram in query_grams if gram in self._trigram_docs),
+            key=len
+        )
+        shared: Dict[int, int] = {}
+        for i, docs in enumerate(postings):
+            if i > 0 and len(docs) > self.max_trigram_postings:
+                break
+            for doc_id in docs:
+                if doc_id not in exclude:
+                    shared[doc_id] = shared.get(doc_id, 0) + 1
+
+        # Skipped common trigrams are counted again in the exact Jaccard
+        # similarity of the best candidates
+        similar = []
+        for doc_id in heapq.nlargest(max_ranked, shared, key=shared.get):
+            count = len(query_grams & trigrams(self._names[doc_id]))
+            similarity = count / (len(query_grams) + self._trigram_counts[doc_id] - count)
+            if similarity >= self.min_similarity:
+                similar.append((similarity, doc_id))
+        similar.sort(reverse=True)
+        return similar
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Best local matches for a partially typed merchant name"""
+        normalized = normalize_query(query)
+        if not normalized or limit <= 0:
+            return []
+
+        with self._lock:
+            matched = self._prefix_matches(list(set(normalized.split())))
+
+            # Names starting with the whole query first, then the most reviewed
+            names = self._names
+            popularity = self._popularity
+            ranked = heapq.nsmallest(
+                limit,
+                matched,
+                key=lambda doc_id: (not names[doc_id].startswith(normalized), popularity[doc_id])
+            )
+            results = [{**self._entries[doc_id], "match": "prefix"} for doc_id in ranked]
+
+            # Trigrams are only worth it once there is enough text to compare
+            if len(results) < limit and len(normalized) >= 3:
+                for similarity, doc_id in self._similar_docs(normalized, matched, max(limit * 10, 50)):
+                    if len(results) >= limit:
+                        break
+                    results.append({**self._entries[doc_id], "match": "similar", "similarity": round(similarity, 3)})
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "merchants": len(self._doc_by_place),
+            "words": len(self._vocabulary),
+            "trigrams": len(self._trigram_docs)
+        }
+
+class PlacesAutocomplete:
+    """
+    Session tokens and a shared prediction cache for the Google fallback.
+    Google bills every keystroke of a session, plus the Place Details call
+    that ends it, as one session; identical queries from any session are
+    answered from the cache while it is fresh.
+    """
+
+    def __init__(self, session_ttl: float = 180.0, max_sessions: int = 10000, cache_ttl: float = 600.0, cache_size: int = 5000, min_chars: int = 3):
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.min_chars = min_chars
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._google_calls = 0
+        self._cache_hits = 0
+        self._sessions_started = 0
+
+    def session(self, token: Optional[str]) -> str:
+        """The client's session token while it is still valid, otherwise a new one"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token) if token else None
+            if session is not None and now - session["started"] < self.session_ttl:
+                return token
+
+            token = uuid.uuid4().hex
+            self._sessions[token] = {"started": now, "google_calls": 0}
+            self._sessions_started += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return token
+
+    def end_session(self, token: Optional[str]) -> Optional[str]:
+        """
+        Close a session when its merchant is looked up; returns the token to
+        pass to Place Details, or None if the session is unknown or expired
+        """
+        if not token or not _SESSION_TOKEN.match(token):
+            return None
+        with self._lock:
+            session = self._sessions.pop(token, None)
+        if session is None or time.monotonic() - session["started"] >= self.session_ttl:
+            return None
+        return token
+
+    def wants_google(self, query: str) -> bool:
+        return len(normalize_query(query)) >= self.min_chars
+
+    def cached(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        key = normalize_query(query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+            expires, predictions = cached
+            if time.monotonic() >= expires:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+            return predictions
+
+    def store(self, query: str, token: str, predictions: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._google_calls += 1
+            session = self._sessions.get(token)
+            if session is not None:
+                session["google_calls"] += 1
+
+            key = normalize_query(query)
+            self._cache[key] = (time.monotonic() + self.cache_ttl, predictions)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "sessions_started": self._sessions_started,
+                "google_calls": self._google_calls,
+                "cache_hits": self._cache_hits,
+                "cached_queries": len(self._cache)
+            }
+
+def prediction_result(prediction: Dict[str, Any]) -> Dict[str, Any]:
+    """Autocomplete result for a Google Places Autocomplete prediction"""
+    formatting = prediction.get("structured_formatting", {})
+    return {
+        "place_id": prediction["place_id"],
+        "name": formatting.get("main_text") or prediction.get("description", ""),
+        "address": formatting.get("secondary_text"),
+        "types": prediction.get("types", []),
+        "match": "google"
+    }
+
+async def load_stored_merchants(index: MerchantAutocompleteIndex, chunk_size: int = 1000) -> int:
+    """
+    Fill the index from the merchants table, so known merchants survive
+    restarts. Chunks are indexed in a worker thread; searches keep being
+    answered between chunks.
+    """
+    from sqlalchemy import select
+    from database import engine, MerchantInfo as MerchantRecord
+
+    table = MerchantRecord.__table__
+    query = select(
+        table.c.place_id, table.c.name, table.c.address, table.c.rating,
+        table.c.user_ratings_total, table.c.types, table.c.business_status
+    ).execution_options(yield_per=chunk_size)
+
+    loop = asyncio.get_running_loop()
+    loaded = 0
+    async with engine.connect() as conn:
+        result = await conn.stream(query)
+        async for rows in result.mappings().partitions():
+            loaded += await loop.run_in_executor(None, index.add_many, [dict(row) for row in rows])
+
+    logger.info(f"Loaded {loaded} stored merchants into the autocomplete index")
+    return loaded
+
+# Global instances
+merchant_autocomplete = MerchantAutocompleteIndex(
+    min_similarity=float(os.getenv("AUTOCOMPLETE_MIN_SIMILARITY", "0.3"))
+)
+places_autocomplete = PlacesAutocomplete(
+    cache_ttl=float(os.getenv("AUTOCOMPLETE_CACHE_TTL", "600")),
+    min_chars=int(os.getenv("AUTOCOMPLETE_GOOGLE_MIN_CHARS", "3"))
+)
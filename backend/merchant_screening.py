@@ -0,0 +1,196 @@
+"""
+Merchant Screening - Allow and deny lists of merchants, checked before any
+upstream call so known merchants get their verdict without Google or ReceitaWS
+"""
+
+import os
+import re
+import csv
+import math
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+from models import ScreeningVerdict
+from cnpj_service import cnpj_service
+from scoring import normalize_address
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "ALLOW"
+DENY = "DENY"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+def screening_keys(place_id: Optional[str], merchant_name: Optional[str], address: Optional[str], cnpj: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(matched_on, key) pairs identifying a merchant, strongest identifier first"""
+    keys = []
+    if place_id:
+        keys.append(("place_id", f"place:{place_id.strip()}"))
+    cnpj = cnpj_service.clean_cnpj(cnpj) if cnpj else None
+    if cnpj:
+        keys.append(("cnpj", f"cnpj:{cnpj}"))
+    # Accents, case, punctuation and spacing do not tell merchants apart
+    name = " ".join(_PUNCTUATION.sub(" ", cnpj_service.normalize_name(merchant_name)).split())
+    if name:
+        keys.append(("name_address", f"name:{name}|{normalize_address(address or '')}"))
+    return keys
+
+class BloomFilter:
+    """Bit array with hashes derived from a 128-bit key digest (double hashing)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 64)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+class ScreeningList:
+    """
+    One list: a Bloom filter answers most misses from a few bit probes, and
+    an exact store of key digests (with the listing reason) confirms hits,
+    so a filter false positive never produces a verdict
+    """
+
+    def __init__(self, entries: Dict[bytes, Optional[str]], error_rate: float = 0.001):
+        self._entries = entries
+        self._filter = BloomFilter(len(entries), error_rate)
+        for digest in entries:
+            self._filter.add(digest)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def filter_bytes(self) -> int:
+        return self._filter.nbytes
+
+    def lookup(self, digest: bytes) -> Tuple[bool, bool, Optional[str]]:
+        """(passed the filter, listed, reason)"""
+        if digest not in self._filter:
+            return False, False, None
+        if digest not in self._entries:
+            return True, False, None
+        return True, True, self._entries[digest]
+
+    @classmethod
+    def from_csv(cls, path: Optional[str], error_rate: float = 0.001) -> "ScreeningList":
+        """
+        Load a list with any of the columns place_id, cnpj, merchant_name
+        (with address) and an optional reason; every identifier given in a
+        row is listed
+        """
+        entries: Dict[bytes, Optional[str]] = {}
+        if path:
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    reason = (row.get('reason') or '').strip() or None
+                    for _, key in screening_keys(row.get('place_id'), row.get('merchant_name'), row.get('address'), row.get('cnpj')):
+                        entries[_digest(key)] = reason
+        return cls(entries, error_rate)
+
+class MerchantScreener:
+    """
+    Allow and deny lists, replaced together on reload: a new pair is built
+    from the files first, then swapped in with one assignment, so a check
+    sees either the old lists or the new ones. The deny list wins when a
+    merchant is on both.
+    """
+
+    def __init__(self, allow_path: Optional[str] = None, deny_path: Optional[str] = None, error_rate: float = 0.001):
+        self.allow_path = allow_path
+        self.deny_path = deny_path
+        self.error_rate = error_rate
+        self._reload_lock = threading.Lock()
+        self._lists: Tuple[ScreeningList, ScreeningList] = (ScreeningList({}), ScreeningList({}))
+        self._loaded_at: Optional[datetime] = None
+        self._stats_lock = threading.Lock()
+        self._checks = 0
+        self._verdicts = {ALLOW: 0, DENY: 0}
+        self._filter_false_positives = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.allow_path or self.deny_path)
+
+    def reload(self) -> Dict[str, Any]:
+        """Load both lists from their files; on error the current lists stay in place"""
+        with self._reload_lock:
+            allow = ScreeningList.from_csv(self.allow_path, self.error_rate)
+            deny = ScreeningList.from_csv(self.deny_path, self.error_rate)
+            self._lists = (allow, deny)
+            self._loaded_at = datetime.now()
+        logger.info(f"Loaded screening lists: {len(allow)} allow keys, {len(deny)} deny keys")
+        return self.stats()
+
+    def screen(self, place_id: Optional[str], merchant_name: Optional[str], address: Optional[str]) -> Optional[ScreeningVerdict]:
+        """Verdict for a listed merchant, or None when it has to be validated upstream"""
+        allow, deny = self._lists
+        if not len(allow) and not len(deny):
+            return None
+
+        # Only a CNPJ written in the request counts; name index matches are fuzzy
+        cnpj = cnpj_service.extract_cnpj_from_text(f"{merchant_name or ''} {address or ''}")
+        verdict = None
+        false_positives = 0
+        for matched_on, key in screening_keys(place_id, merchant_name, address, cnpj):
+            digest = _digest(key)
+            for name, screening_list in ((DENY, deny), (ALLOW, allow)):
+                if name == ALLOW and verdict is not None:
+                    continue
+                passed, listed, reason = screening_list.lookup(digest)
+                if listed:
+                    verdict = ScreeningVerdict(verdict=name, matched_on=matched_on, reason=reason)
+                    break
+                false_positives += passed
+            if verdict is not None and verdict.verdict == DENY:
+                break
+
+        with self._stats_lock:
+            self._checks += 1
+            self._filter_false_positives += false_positives
+            if verdict is not None:
+                self._verdicts[verdict.verdict] += 1
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        allow, deny = self._lists
+        with self._stats_lock:
+            return {
+                "allow_keys": len(allow),
+                "deny_keys": len(deny),
+                "filter_bytes": allow.filter_bytes + deny.filter_bytes,
+                "loaded_at": self._loaded_at.isoformat() if self._loaded_at else None,
+                "checks": self._checks,
+                "verdicts": dict(self._verdicts),
+                "filter_false_positives": self._filter_false_positives
+            }
+
+# Global instance
+merchant_screener = MerchantScreener(
+    allow_path=os.getenv("SCREENING_ALLOW_PATH"),
+    deny_path=os.getenv("SCREENING_DENY_PATH"),
+    error_rate=float(os.getenv("SCREENING_FILTER_ERROR_RATE", "0.001"))
+)
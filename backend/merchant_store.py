@@ -0,0 +1,142 @@
+"""
+Merchant Store - Bulk upserts of resolved Google merchants into the
+merchants table
+"""
+
+import os
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from models import MerchantInfo
+from write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+UPSERT_COLUMNS = [
+    "place_id", "name", "address", "phone", "website", "rating", "user_ratings_total",
+    "business_status", "types", "latitude", "longitude", "price_level", "opening_hours",
+    "photos", "risk_level", "risk_score", "validation_request", "created_at", "updated_at",
+    "last_validated"
+]
+
+# Only set by a recorded validation; a plain lookup keeps the stored values
+VALIDATION_COLUMNS = ["risk_level", "risk_score", "validation_request", "last_validated"]
+
+class MerchantStore(WriteBehindBuffer):
+    """
+    Every resolved MerchantInfo is queued by place_id and written in bulk
+    with INSERT ... ON CONFLICT (place_id) DO UPDATE, one transaction per
+    flush. Repeated lookups of the same merchant between flushes collapse
+    into a single row write.
+
+    The row also holds the outcome of the merchant's last validation, the
+    revalidation ledger (see revalidation.py).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__("merchants", **kwargs)
+        self._engine = None
+        self._upsert = None
+
+    async def start(self) -> None:
+        if not os.getenv("DATABASE_URL"):
+            logger.info("DATABASE_URL not set, resolved merchants will not be stored")
+            return
+
+        # SQLAlchemy and the driver are only imported when a database is configured
+        from sqlalchemy import func
+        from sqlalchemy.dialects.postgresql import insert
+        from database import engine, create_tables, MerchantInfo as MerchantRecord
+
+        try:
+            await create_tables()
+        except Exception as e:
+            logger.warning(f"Database unavailable, resolved merchants will not be stored: {str(e)}")
+            await engine.dispose()
+            return
+
+        table = MerchantRecord.__table__
+        stmt = insert(table)
+        set_ = {name: stmt.excluded[name] for name in UPSERT_COLUMNS if name != "created_at"}
+        for name in VALIDATION_COLUMNS:
+            set_[name] = func.coalesce(stmt.excluded[name], table.c[name])
+        self._upsert = stmt.on_conflict_do_update(
+            index_elements=["place_id"],
+            # created_at keeps the time of the first insert
+            set_=set_
+        )
+        self._engine = engine
+        await super().start()
+
+    async def close(self) -> None:
+        await super().close()
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+    def add_merchant(self, merchant_info: MerchantInfo) -> None:
+        if self.running:
+            self.add(merchant_row(merchant_info), key=merchant_info.place_id)
+
+    def add_validation(self, merchant_info: MerchantInfo, request: Dict[str, Any], risk_level: str, risk_score: float) -> None:
+        """Store a merchant with the outcome of its validation"""
+        if self.running:
+            validation = {
+                "risk_level": risk_level,
+                "risk_score": risk_score,
+                "validation_request": request,
+                "last_validated": datetime.now()
+            }
+            self.add(merchant_row(merchant_info, validation), key=merchant_info.place_id)
+
+    def merge(self, older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        A plain lookup queued after a validation of the same merchant carries
+        no outcome; keep the pending one instead of losing it
+        """
+        merged = dict(newer)
+        for name in VALIDATION_COLUMNS:
+            if merged.get(name) is None:
+                merged[name] = older.get(name)
+        return merged
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        # A stable key order keeps concurrent API processes from deadlocking
+        rows = sorted(rows, key=lambda row: row["place_id"])
+        async with self._engine.begin() as conn:
+            await conn.execute(self._upsert, rows)
+
+def merchant_row(merchant_info: MerchantInfo, validation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Column values of the merchants table for a resolved merchant"""
+    now = datetime.now()
+    validation = validation or {}
+    return {
+        "place_id": merchant_info.place_id,
+        "name": merchant_info.name,
+        "address": merchant_info.address,
+        "phone": merchant_info.phone,
+        "website": merchant_info.website,
+        "rating": merchant_info.rating,
+        "user_ratings_total": merchant_info.user_ratings_total,
+        "business_status": merchant_info.business_status,
+        "types": merchant_info.types,
+        "latitude": merchant_info.location.get("lat"),
+        "longitude": merchant_info.location.get("lng"),
+        "price_level": merchant_info.price_level,
+        "opening_hours": merchant_info.opening_hours,
+        "photos": merchant_info.photos,
+        "risk_level": validation.get("risk_level"),
+        "risk_score": validation.get("risk_score"),
+        "validation_request": validation.get("validation_request"),
+        "created_at": now,
+        "updated_at": now,
+        "last_validated": validation.get("last_validated")
+    }
+
+# Global instance
+merchant_store = MerchantStore(
+    batch_size=int(os.getenv("MERCHANT_UPSERT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("MERCHANT_UPSERT_INTERVAL", "1.0")),
+    max_pending=int(os.getenv("MERCHANT_UPSERT_MAX_PENDING", "50000"))
+)
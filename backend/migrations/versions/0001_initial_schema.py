@@ -0,0 +1,69 @@
+"""Initial schema: merchant_validations and merchants
+
+Databases created by create_tables() before migrations existed already
+have these tables; the statements only create what is missing, so
+`alembic upgrade head` works on those as well as on an empty database.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS merchant_validations (
+            id SERIAL PRIMARY KEY,
+            merchant_name VARCHAR NOT NULL,
+            address VARCHAR,
+            place_id VARCHAR,
+            phone VARCHAR,
+            transaction_amount FLOAT,
+            transaction_type VARCHAR,
+            google_places_data JSONB,
+            risk_score FLOAT,
+            risk_level VARCHAR,
+            risk_factors JSONB,
+            recommendations JSONB,
+            validation_status VARCHAR,
+            search_query VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_merchant_validations_id ON merchant_validations (id)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS merchants (
+            id SERIAL PRIMARY KEY,
+            place_id VARCHAR NOT NULL,
+            name VARCHAR NOT NULL,
+            address VARCHAR,
+            phone VARCHAR,
+            website VARCHAR,
+            rating FLOAT,
+            user_ratings_total INTEGER,
+            business_status VARCHAR,
+            types JSONB,
+            latitude FLOAT,
+            longitude FLOAT,
+            price_level INTEGER,
+            opening_hours JSONB,
+            photos JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            last_validated TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_merchants_id ON merchants (id)")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_merchants_place_id ON merchants (place_id)")
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS merchants")
+    op.execute("DROP TABLE IF EXISTS merchant_validations")
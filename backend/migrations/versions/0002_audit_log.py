@@ -0,0 +1,78 @@
+"""Audit log: audit_id and batch_id on merchant_validations, query indexes
+and the daily and per-batch summary tables
+
+The audit log inserts with ON CONFLICT (audit_id), which needs the unique
+index; without it every write fails and rows stay in the spill directory.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE merchant_validations ADD COLUMN IF NOT EXISTS audit_id VARCHAR")
+    op.execute("ALTER TABLE merchant_validations ADD COLUMN IF NOT EXISTS batch_id VARCHAR")
+    # Same name as the constraint create_tables() makes, so a database
+    # created with the new models is left as it is
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS merchant_validations_audit_id_key "
+        "ON merchant_validations (audit_id)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_merchant_validations_batch_id ON merchant_validations (batch_id)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_merchant_validations_risk_factors "
+        "ON merchant_validations USING gin (risk_factors jsonb_path_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_merchant_validations_risk_level_created_at "
+        "ON merchant_validations (risk_level, created_at)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_merchant_validations_created_at ON merchant_validations (created_at)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_merchant_validations_place_id_created_at "
+        "ON merchant_validations (place_id, created_at)"
+    )
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS validation_daily_summary (
+            day DATE NOT NULL,
+            risk_level VARCHAR NOT NULL,
+            validation_status VARCHAR NOT NULL,
+            validations BIGINT NOT NULL,
+            risk_score_sum FLOAT NOT NULL,
+            PRIMARY KEY (day, risk_level, validation_status)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS validation_batch_summary (
+            batch_id VARCHAR NOT NULL,
+            risk_level VARCHAR NOT NULL,
+            validation_status VARCHAR NOT NULL,
+            validations BIGINT NOT NULL,
+            risk_score_sum FLOAT NOT NULL,
+            PRIMARY KEY (batch_id, risk_level, validation_status)
+        )
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS validation_batch_summary")
+    op.execute("DROP TABLE IF EXISTS validation_daily_summary")
+    for index in (
+        "ix_merchant_validations_place_id_created_at",
+        "ix_merchant_validations_created_at",
+        "ix_merchant_validations_risk_level_created_at",
+        "ix_merchant_validations_risk_factors",
+        "ix_merchant_validations_batch_id",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+    op.execute("ALTER TABLE merchant_validations DROP CONSTRAINT IF EXISTS merchant_validations_audit_id_key")
+    op.execute("DROP INDEX IF EXISTS merchant_validations_audit_id_key")
+    op.execute("ALTER TABLE merchant_validations DROP COLUMN IF EXISTS batch_id")
+    op.execute("ALTER TABLE merchant_validations DROP COLUMN IF EXISTS audit_id")
@@ -0,0 +1,25 @@
+"""Outcome of the last validation on merchants, read by /revalidate
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE merchants ADD COLUMN IF NOT EXISTS risk_level VARCHAR")
+    op.execute("ALTER TABLE merchants ADD COLUMN IF NOT EXISTS risk_score FLOAT")
+    op.execute("ALTER TABLE merchants ADD COLUMN IF NOT EXISTS validation_request JSONB")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_merchants_last_validated ON merchants (last_validated)")
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_merchants_last_validated")
+    op.execute("ALTER TABLE merchants DROP COLUMN IF EXISTS validation_request")
+    op.execute("ALTER TABLE merchants DROP COLUMN IF EXISTS risk_score")
+    op.execute("ALTER TABLE merchants DROP COLUMN IF EXISTS risk_level")
@@ -0,0 +1,130 @@
+"""
+Pydantic models shared by the API and the scoring workers
+"""
+
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+
+class MerchantValidationRequest(BaseModel):
+    merchant_name: str
+    address: Optional[str] = None
+    place_id: Optional[str] = None
+    phone: Optional[str] = None
+    transaction_amount: Optional[float] = None
+    transaction_type: Optional[str] = None
+    # Autocomplete session that led to place_id; ends the Google billing session
+    session_token: Optional[str] = None
+
+class MerchantInfo(BaseModel):
+    place_id: str
+    name: str
+    address: str
+    phone: Optional[str] = None
+    website: Optional[str] = None
+    rating: Optional[float] = None
+    user_ratings_total: Optional[int] = None
+    business_status: Optional[str] = None
+    types: List[str] = []
+    location: Dict[str, float]
+    price_level: Optional[int] = None
+    opening_hours: Optional[Dict[str, Any]] = None
+    photos: List[str] = []
+
+class AddressComparison(BaseModel):
+    provided_address: str
+    google_address: str
+    similarity_score: float  # 0-100
+    is_match: bool
+    differences: List[str]
+
+class CNPJData(BaseModel):
+    cnpj: str
+    company_name: str
+    trade_name: Optional[str] = None
+    legal_nature: Optional[str] = None
+    main_activity: Optional[str] = None
+    secondary_activities: List[str] = []
+    registration_status: Optional[str] = None
+    registration_date: Optional[str] = None
+    address: Dict[str, str] = {}
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    share_capital: Optional[str] = None
+    company_size: Optional[str] = None
+    last_update: Optional[str] = None
+    partners: List[Dict[str, Any]] = []
+
+class CNPJComparison(BaseModel):
+    cnpj_found: bool
+    cnpj_data: Optional[CNPJData] = None
+    name_comparison: Optional[Dict[str, Any]] = None
+    address_comparison: Optional[Dict[str, Any]] = None
+    risk_assessment: Optional[Dict[str, Any]] = None
+    match_source: Optional[str] = None  # TEXT, NAME_INDEX
+    candidates: List[Dict[str, Any]] = []
+    service_unavailable: bool = False  # ReceitaWS down or its circuit open; CNPJ checks skipped
+
+class RiskAssessment(BaseModel):
+    risk_score: float  # 0-100
+    risk_level: str  # LOW, MEDIUM, HIGH, CRITICAL
+    risk_factors: List[str]
+    recommendations: List[str]
+    colocated_merchants: int = 0
+
+class ScreeningVerdict(BaseModel):
+    verdict: str  # ALLOW, DENY
+    matched_on: str  # place_id, cnpj, name_address
+    reason: Optional[str] = None
+
+class ValidationResult(BaseModel):
+    merchant_info: Optional[MerchantInfo] = None
+    risk_assessment: RiskAssessment
+    address_comparison: Optional[AddressComparison] = None
+    cnpj_comparison: Optional[CNPJComparison] = None
+    validation_status: str  # VALID, SUSPICIOUS, INVALID, UNVERIFIED, ERROR
+    timestamp: datetime
+    search_query: str
+    skipped_stages: List[str] = []  # google_places, cnpj: not finished within the request deadline
+    screening: Optional[ScreeningVerdict] = None  # Set when an allow or deny list decided without upstream calls
+
+class BatchValidationRequest(BaseModel):
+    merchants: List[MerchantValidationRequest]
+    callback_url: Optional[str] = None
+
+class RiskLevelChange(BaseModel):
+    place_id: str
+    merchant_name: str
+    previous_risk_level: str
+    new_risk_level: str
+    previous_risk_score: float
+    new_risk_score: float
+
+class RevalidationStatus(BaseModel):
+    job_id: str
+    status: str  # PENDING, PROCESSING, COMPLETED, FAILED
+    stale_merchants: int
+    checked_merchants: int = 0
+    unchanged_merchants: int = 0
+    rescored_merchants: int = 0
+    failed_merchants: int = 0
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    risk_changes: List[RiskLevelChange] = []
+
+class BatchValidationStatus(BaseModel):
+    batch_id: str
+    status: str  # PENDING, PROCESSING, COMPLETED, FAILED
+    total_merchants: int
+    processed_merchants: int
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    callback_url: Optional[str] = None
+    tenant_id: Optional[str] = None
+    # Identify resubmissions of the same batch
+    content_hash: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    # Set while the batch waits in the admission queue
+    queue_position: Optional[int] = None
+    estimated_start_at: Optional[datetime] = None
+    results: Optional[List[ValidationResult]] = None
@@ -0,0 +1,248 @@
+"""
+Profiling - Opt-in sampling profiles and stage timelines of single
+validations and batch chunks, kept in a ring buffer for download
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+
+class Profile:
+    """
+    One profiled unit of work. Stages are timed as they run; while a stage
+    runs synchronously its thread is also sampled, so samples never pick
+    up other requests sharing the event loop. At most max_stages stages
+    are kept in the timeline; stage_totals covers all of them.
+    """
+
+    def __init__(self, kind: str, label: str, trigger: str, max_stages: int = 500, max_depth: int = 64):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.trigger = trigger
+        self.max_stages = max_stages
+        self.max_depth = max_depth
+        self.started_at = datetime.now()
+        self.duration_ms: Optional[float] = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        # thread id -> number of open sampled stages on it
+        self._threads: Dict[int, int] = {}
+        self.stages: List[Dict[str, Any]] = []
+        self.stage_totals: Dict[str, List[float]] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def enter_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads[thread_id] = self._threads.get(thread_id, 0) + 1
+
+    def leave_thread(self, thread_id: int) -> None:
+        with self._lock:
+            depth = self._threads.get(thread_id, 0) - 1
+            if depth > 0:
+                self._threads[thread_id] = depth
+            else:
+                self._threads.pop(thread_id, None)
+
+    def add_stage(self, name: str, started: float, ended: float) -> None:
+        duration_ms = (ended - started) * 1000
+        with self._lock:
+            totals = self.stage_totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration_ms
+            if len(self.stages) < self.max_stages:
+                self.stages.append({
+                    "stage": name,
+                    "start_ms": round((started - self._started) * 1000, 2),
+                    "duration_ms": round(duration_ms, 2),
+                    "thread": threading.current_thread().name
+                })
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        with self._lock:
+            for thread_id in self._threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def finish(self) -> None:
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "samples": self.samples
+        }
+
+    def to_dict(self, top: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            own: Counter = Counter()
+            cumulative: Counter = Counter()
+            for stack, count in self.stacks.items():
+                own[stack[-1]] += count
+                for function in set(stack):
+                    cumulative[function] += count
+            total = max(self.samples, 1)
+            return {
+                **self.summary(),
+                "stage_totals": {
+                    name: {"count": int(count), "total_ms": round(total_ms, 2)}
+                    for name, (count, total_ms) in sorted(self.stage_totals.items(), key=lambda item: -item[1][1])
+                },
+                "stages": list(self.stages),
+                "hot_functions": [
+                    {"function": function, "own": count, "own_share": round(count / total, 4), "cumulative_share": round(cumulative[function] / total, 4)}
+                    for function, count in own.most_common(top)
+                ],
+                "hot_paths": [
+                    {"function": function, "cumulative_share": round(count / total, 4)}
+                    for function, count in cumulative.most_common(top)
+                ]
+            }
+
+    def collapsed(self) -> str:
+        """Folded stacks ("a;b;c count" lines), for flamegraph.pl or speedscope"""
+        with self._lock:
+            return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.items())
+
+class Profiler:
+    """
+    Keeps the last capacity profiles. A profile is taken when requested
+    (the admin header) or, for every request or batch chunk, with
+    probability sample_rate. One sampler thread walks the stacks of the
+    sampled threads every interval seconds, and only while a profile runs.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, interval: float = 0.005, capacity: int = 50):
+        self.sample_rate = sample_rate
+        self.interval = max(interval, 0.001)
+        self._profiles: deque = deque(maxlen=max(capacity, 1))
+        self._cond = threading.Condition()
+        self._active: List[Profile] = []
+        self._sampler: Optional[threading.Thread] = None
+        self._taken = {"requested": 0, "sampled": 0}
+
+    def trigger(self, requested: bool = False) -> Optional[str]:
+        """Why a unit of work should be profiled, or None if it should not"""
+        if requested:
+            return "requested"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    @contextmanager
+    def profile(self, kind: str, label: str, trigger: Optional[str], sample_thread: bool = False):
+        """
+        Profile the block if trigger is set (yields the Profile, else None).
+        With sample_thread the current thread is sampled for the whole
+        block; otherwise only inside stage() blocks.
+        """
+        if trigger is None:
+            yield None
+            return
+
+        profile = Profile(kind, label, trigger)
+        token = _current.set(profile)
+        thread_id = threading.get_ident()
+        if sample_thread:
+            profile.enter_thread(thread_id)
+        with self._cond:
+            self._active.append(profile)
+            self._taken[trigger] += 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._sampler.start()
+            self._cond.notify_all()
+        try:
+            yield profile
+        finally:
+            _current.reset(token)
+            if sample_thread:
+                profile.leave_thread(thread_id)
+            profile.finish()
+            with self._cond:
+                self._active.remove(profile)
+                self._profiles.append(profile)
+
+    def _sample_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                active = list(self._active)
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [profile.summary() for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._cond:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "sample_rate": self.sample_rate,
+                "stored": len(self._profiles),
+                "capacity": self._profiles.maxlen,
+                "running": len(self._active),
+                "taken": dict(self._taken)
+            }
+
+@contextmanager
+def stage(name: str, sample: bool = True):
+    """
+    Time a stage of the current profile (a no-op when nothing is being
+    profiled). Pass sample=False for stages that await on the event loop,
+    whose thread runs other requests meanwhile.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    thread_id = threading.get_ident()
+    if sample:
+        profile.enter_thread(thread_id)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, started, time.perf_counter())
+        if sample:
+            profile.leave_thread(thread_id)
+
+# Global instance
+profiler = Profiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+    capacity=int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+)
@@ -0,0 +1,137 @@
+"""
+Revalidation Ledger - Tracks when each merchant was last validated so that
+re-screening only touches stale or changed merchants
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from merchant_store import merchant_store
+from validation_queries import ValidationStoreUnavailable
+from write_behind import WriteBehindBuffer
+
+# Place Details fields used for the cheap change check. These are all
+# Basic Data fields, billed far below a full details request.
+SNAPSHOT_FIELDS = {
+    "business_status": "business_status",
+    "formatted_address": "address",
+    "name": "name",
+}
+
+DEFAULT_TTL_DAYS = {
+    "CRITICAL": 1,
+    "HIGH": 3,
+    "MEDIUM": 7,
+    "LOW": 30,
+}
+
+def _ttl_from_env() -> Dict[str, timedelta]:
+    ttls = {}
+    for risk_level, days in DEFAULT_TTL_DAYS.items():
+        days = float(os.getenv(f"REVALIDATION_TTL_DAYS_{risk_level}", days))
+        ttls[risk_level] = timedelta(days=days)
+    return ttls
+
+class ValidationLedger(WriteBehindBuffer):
+    """
+    Last validation outcome per place_id, kept in the merchants table
+    (risk_level, risk_score, the request to replay and last_validated) so
+    it survives restarts and is shared by all replicas. Outcomes are
+    written with the merchant row by the merchant store; this buffer only
+    writes the new last_validated of merchants found unchanged.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, timedelta]] = None, **kwargs):
+        super().__init__("merchant_revalidations", **kwargs)
+        self.ttls = ttls or _ttl_from_env()
+        self._engine = None
+        self._touch = None
+
+    async def start(self) -> None:
+        """Runs when the merchant store does; start that first"""
+        if not merchant_store.running:
+            return
+
+        from sqlalchemy import update, bindparam
+        from database import engine, MerchantInfo as MerchantRecord
+
+        table = MerchantRecord.__table__
+        self._touch = (
+            update(table)
+            .where(table.c.place_id == bindparam("touched_place_id"))
+            .values(last_validated=bindparam("touched_at"))
+        )
+        self._engine = engine
+        await super().start()
+
+    async def close(self) -> None:
+        await super().close()
+        self._engine = None
+
+    def snapshot(self, merchant_info: Any) -> Dict[str, Any]:
+        """Subset of a MerchantInfo that the cheap refresh can compare against"""
+        return {attr: getattr(merchant_info, attr, None) for attr in SNAPSHOT_FIELDS.values()}
+
+    def snapshot_from_details(self, place_details: Dict[str, Any]) -> Dict[str, Any]:
+        """Same subset, built from a Place Details response"""
+        return {attr: place_details.get(field) for field, attr in SNAPSHOT_FIELDS.items()}
+
+    def record(self, request: Dict[str, Any], merchant_info: Any, risk_level: str, risk_score: float) -> None:
+        """Store the outcome of a completed validation"""
+        merchant_store.add_validation(merchant_info, request, risk_level, risk_score)
+
+    def touch(self, place_id: str) -> None:
+        """Mark a merchant as validated now without changing its outcome"""
+        self.add({"touched_place_id": place_id, "touched_at": datetime.now()}, key=place_id)
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        async with self._engine.begin() as conn:
+            await conn.execute(self._touch, rows)
+
+    async def stale_entries(self, now: Optional[datetime] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Merchants whose last validation is older than the TTL for their risk level, oldest first"""
+        if self._engine is None:
+            raise ValidationStoreUnavailable("Merchant store unavailable, validation outcomes are not stored")
+
+        from sqlalchemy import select, case
+        from database import MerchantInfo as MerchantRecord
+
+        table = MerchantRecord.__table__
+        now = now or datetime.now()
+        # Latest last_validated that is stale, per risk level
+        cutoff = case(
+            {risk_level: now - ttl for risk_level, ttl in self.ttls.items()},
+            value=table.c.risk_level,
+            else_=now - self.ttls["LOW"]
+        )
+        query = (
+            select(
+                table.c.place_id, table.c.validation_request, table.c.risk_level, table.c.risk_score,
+                table.c.last_validated, *(table.c[attr] for attr in SNAPSHOT_FIELDS.values())
+            )
+            .where(table.c.validation_request.isnot(None), table.c.last_validated <= cutoff)
+            .order_by(table.c.last_validated)
+            .limit(limit)
+        )
+
+        async with self._engine.connect() as conn:
+            rows = (await conn.execute(query)).mappings().all()
+
+        return [
+            {
+                "place_id": row["place_id"],
+                "request": row["validation_request"],
+                "snapshot": {attr: row[attr] for attr in SNAPSHOT_FIELDS.values()},
+                "risk_level": row["risk_level"],
+                "risk_score": row["risk_score"],
+                "last_validated": row["last_validated"]
+            }
+            for row in rows
+        ]
+
+# Global instance
+validation_ledger = ValidationLedger(
+    batch_size=int(os.getenv("MERCHANT_UPSERT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("MERCHANT_UPSERT_INTERVAL", "1.0"))
+)
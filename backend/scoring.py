@@ -0,0 +1,233 @@
+"""
+Scoring - CPU-bound address comparison and risk scoring.
+
+Kept free of API state (FastAPI app, Google client) so that process pool
+workers can import it cheaply.
+"""
+
+import os
+import re
+import difflib
+from typing import Optional
+
+from models import MerchantInfo, AddressComparison, CNPJComparison, RiskAssessment
+
+COLOCATION_RISK_THRESHOLD = int(os.getenv("COLOCATION_RISK_THRESHOLD", "3"))
+
+def normalize_address(address: str) -> str:
+    """Normalize address for comparison"""
+    if not address:
+        return ""
+    
+    # Convert to lowercase
+    normalized = address.lower()
+    
+    # Remove common abbreviations and standardize
+    replacements = {
+        r'\bst\b': 'street',
+        r'\bave\b': 'avenue',
+        r'\brd\b': 'road',
+        r'\bdr\b': 'drive',
+        r'\bblvd\b': 'boulevard',
+        r'\bapt\b': 'apartment',
+        r'\bste\b': 'suite',
+        r'\bfl\b': 'floor',
+        r'\bn\b': 'north',
+        r'\bs\b': 'south',
+        r'\be\b': 'east',
+        r'\bw\b': 'west',
+    }
+    
+    for pattern, replacement in replacements.items():
+        normalized = re.sub(pattern, replacement, normalized)
+    
+    # Remove extra spaces and punctuation
+    normalized = re.sub(r'[^\w\s]', ' ', normalized)
+    normalized = re.sub(r'\s+', ' ', normalized)
+    
+    return normalized.strip()
+
+def compare_addresses(provided_address: str, google_address: str) -> AddressComparison:
+    """Compare provided address with Google Places address"""
+    if not provided_address or not google_address:
+        return AddressComparison(
+            provided_address=provided_address or "",
+            google_address=google_address or "",
+            similarity_score=0.0,
+            is_match=False,
+            differences=["One or both addresses are missing"]
+        )
+    
+    # Normalize addresses
+    norm_provided = normalize_address(provided_address)
+    norm_google = normalize_address(google_address)
+    
+    # Calculate similarity using difflib
+    similarity = difflib.SequenceMatcher(None, norm_provided, norm_google).ratio() * 100
+    
+    # Find differences
+    differences = []
+    if similarity < 90:
+        provided_words = set(norm_provided.split())
+        google_words = set(norm_google.split())
+        
+        only_in_provided = provided_words - google_words
+        only_in_google = google_words - provided_words
+        
+        if only_in_provided:
+            differences.append(f"Only in provided: {', '.join(only_in_provided)}")
+        if only_in_google:
+            differences.append(f"Only in Google: {', '.join(only_in_google)}")
+    
+    return AddressComparison(
+        provided_address=provided_address,
+        google_address=google_address,
+        similarity_score=similarity,
+        is_match=similarity >= 80,  # 80% threshold for match
+        differences=differences
+    )
+
+def calculate_risk_score(merchant_info: Optional[MerchantInfo], transaction_amount: Optional[float] = None, address_comparison: Optional[AddressComparison] = None, cnpj_comparison: Optional[CNPJComparison] = None, colocation_count: int = 0, places_skipped: bool = False) -> RiskAssessment:
+    """
+    Calculate risk score based on merchant information and transaction details.
+    With places_skipped (the Google lookup ran out of time), the merchant is
+    scored on the remaining evidence instead of as not found.
+    """
+    risk_score = 0
+    risk_factors = []
+    recommendations = []
+    
+    if places_skipped:
+        risk_score += 25
+        risk_factors.append("Merchant not verified (Google Places lookup skipped)")
+        recommendations.append("Re-validate without a deadline")
+    elif not merchant_info:
+        return RiskAssessment(
+            risk_score=100,
+            risk_level="CRITICAL",
+            risk_factors=["Merchant not found in Google Places"],
+            recommendations=["Investigate merchant existence", "Verify transaction legitimacy"]
+        )
+    
+    if merchant_info:
+        # Business status check
+        if merchant_info.business_status == "CLOSED_PERMANENTLY":
+            risk_score += 40
+            risk_factors.append("Business permanently closed")
+            recommendations.append("Verify if transaction is legitimate for closed business")
+        elif merchant_info.business_status == "CLOSED_TEMPORARILY":
+            risk_score += 20
+            risk_factors.append("Business temporarily closed")
+    
+        # Rating and reviews check
+        if merchant_info.user_ratings_total is not None:
+            if merchant_info.user_ratings_total == 0:
+                risk_score += 25
+                risk_factors.append("No customer reviews")
+                recommendations.append("Verify business legitimacy due to lack of reviews")
+            elif merchant_info.user_ratings_total < 10:
+                risk_score += 15
+                risk_factors.append("Very few customer reviews")
+    
+        if merchant_info.rating is not None and merchant_info.rating < 3.0:
+            risk_score += 15
+            risk_factors.append("Low customer rating")
+    
+        # Business type analysis
+        high_risk_types = ["atm", "bank", "casino", "night_club", "liquor_store"]
+        medium_risk_types = ["gas_station", "convenience_store", "jewelry_store"]
+    
+        for business_type in merchant_info.types:
+            if business_type in high_risk_types:
+                risk_score += 10
+                risk_factors.append(f"High-risk business type: {business_type}")
+            elif business_type in medium_risk_types:
+                risk_score += 5
+                risk_factors.append(f"Medium-risk business type: {business_type}")
+    
+    # Transaction amount analysis
+    if transaction_amount:
+        if transaction_amount > 10000:  # High value transaction
+            risk_score += 15
+            risk_factors.append("High-value transaction")
+            recommendations.append("Enhanced due diligence for high-value transaction")
+        elif transaction_amount > 5000:
+            risk_score += 10
+            risk_factors.append("Medium-value transaction")
+    
+    if merchant_info:
+        # Missing information penalties
+        if not merchant_info.phone:
+            risk_score += 10
+            risk_factors.append("No phone number available")
+    
+        if not merchant_info.website:
+            risk_score += 5
+            risk_factors.append("No website available")
+    
+    # Address comparison analysis
+    if address_comparison:
+        if not address_comparison.is_match:
+            if address_comparison.similarity_score < 50:
+                risk_score += 30
+                risk_factors.append("Address mismatch - significant differences")
+                recommendations.append("Verify correct merchant location")
+            elif address_comparison.similarity_score < 80:
+                risk_score += 15
+                risk_factors.append("Address mismatch - minor differences")
+                recommendations.append("Confirm address details with merchant")
+    
+    # Co-location analysis (shell merchants often share one address)
+    if colocation_count >= COLOCATION_RISK_THRESHOLD:
+        risk_score += 15
+        risk_factors.append(f"{colocation_count} other merchants at the same location")
+        recommendations.append("Check for shell merchants sharing this location")
+    
+    # CNPJ analysis for Brazilian merchants
+    if cnpj_comparison and cnpj_comparison.service_unavailable:
+        # Our outage, not the merchant's: score on Google data alone
+        recommendations.append("CNPJ registry unavailable - re-check registration later")
+    elif cnpj_comparison and cnpj_comparison.cnpj_found:
+        if not cnpj_comparison.cnpj_data:
+            risk_score += 25
+            risk_factors.append("CNPJ found but data unavailable")
+            recommendations.append("Verify CNPJ status manually")
+        else:
+            # Add CNPJ-specific risk factors
+            cnpj_risk = cnpj_comparison.risk_assessment
+            if cnpj_risk and cnpj_risk.get('risk_score', 0) > 0:
+                cnpj_risk_score = cnpj_risk['risk_score']
+                risk_score += min(cnpj_risk_score, 40)  # Cap CNPJ risk at 40 points
+                risk_factors.extend(cnpj_risk.get('risk_factors', []))
+                recommendations.extend(cnpj_risk.get('recommendations', []))
+            
+            # Name comparison with CNPJ
+            name_comp = cnpj_comparison.name_comparison
+            if name_comp and name_comp.get('similarity_score', 0) < 0.6:
+                risk_score += 20
+                risk_factors.append("Merchant name doesn't match CNPJ registration")
+                recommendations.append("Verify business name with official registration")
+    
+    # Determine risk level
+    risk_score = min(risk_score, 100)  # Cap at 100
+    
+    if risk_score >= 80:
+        risk_level = "CRITICAL"
+        recommendations.append("Immediate investigation required")
+    elif risk_score >= 60:
+        risk_level = "HIGH"
+        recommendations.append("Enhanced monitoring recommended")
+    elif risk_score >= 30:
+        risk_level = "MEDIUM"
+        recommendations.append("Standard monitoring sufficient")
+    else:
+        risk_level = "LOW"
+        recommendations.append("Low risk - standard processing")
+    
+    return RiskAssessment(
+        risk_score=risk_score,
+        risk_level=risk_level,
+        risk_factors=risk_factors,
+        recommendations=recommendations,
+        colocated_merchants=colocation_count
+    )
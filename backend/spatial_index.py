@@ -0,0 +1,110 @@
+"""
+Spatial Index - In-memory grid index over resolved merchant locations
+"""
+
+import math
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE_LAT = 111320.0
+
+def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters between two coordinates"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+class MerchantSpatialIndex:
+    """Uniform lat/lng grid of merchants, updated incrementally as validations complete"""
+
+    def __init__(self, cell_size_deg: float = 0.005):
+        # ~550 m cells: small enough to keep neighbourhood scans short,
+        # large enough that co-location checks touch at most 4 cells
+        self.cell_size_deg = cell_size_deg
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]] = {}
+        self._merchants: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._merchants)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size_deg), math.floor(lng / self.cell_size_deg))
+
+    def upsert(self, place_id: str, lat: float, lng: float, **attributes: Any) -> None:
+        """Add or move a merchant in the index"""
+        entry = {
+            "place_id": place_id,
+            "lat": lat,
+            "lng": lng,
+            **attributes,
+            "indexed_at": datetime.now()
+        }
+        cell = self._cell(lat, lng)
+
+        with self._lock:
+            previous = self._merchants.get(place_id)
+            if previous is not None:
+                previous_cell = self._cell(previous["lat"], previous["lng"])
+                bucket = self._cells.get(previous_cell)
+                if bucket is not None:
+                    bucket.pop(place_id, None)
+                    if not bucket:
+                        del self._cells[previous_cell]
+
+            self._merchants[place_id] = entry
+            self._cells.setdefault(cell, {})[place_id] = entry
+
+    def add_merchant(self, merchant_info: Any) -> None:
+        """Index a resolved MerchantInfo"""
+        location = merchant_info.location or {}
+        if "lat" not in location or "lng" not in location:
+            return
+
+        self.upsert(
+            merchant_info.place_id,
+            location["lat"],
+            location["lng"],
+            name=merchant_info.name,
+            address=merchant_info.address,
+            business_status=merchant_info.business_status
+        )
+
+    def nearby(self, lat: float, lng: float, radius_m: float, limit: Optional[int] = None, exclude_place_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Merchants within radius_m of a point, closest first"""
+        lat_span = radius_m / METERS_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        lng_span = radius_m / (METERS_PER_DEGREE_LAT * cos_lat)
+
+        min_cell = self._cell(lat - lat_span, lng - lng_span)
+        max_cell = self._cell(lat + lat_span, lng + lng_span)
+
+        matches = []
+        with self._lock:
+            for i in range(min_cell[0], max_cell[0] + 1):
+                for j in range(min_cell[1], max_cell[1] + 1):
+                    bucket = self._cells.get((i, j))
+                    if not bucket:
+                        continue
+                    for place_id, entry in bucket.items():
+                        if place_id == exclude_place_id:
+                            continue
+                        distance = haversine_distance(lat, lng, entry["lat"], entry["lng"])
+                        if distance <= radius_m:
+                            matches.append({**entry, "distance_m": round(distance, 1)})
+
+        matches.sort(key=lambda m: m["distance_m"])
+        return matches[:limit] if limit is not None else matches
+
+    def count_nearby(self, lat: float, lng: float, radius_m: float, exclude_place_id: Optional[str] = None) -> int:
+        """Number of other merchants within radius_m of a point"""
+        return len(self.nearby(lat, lng, radius_m, exclude_place_id=exclude_place_id))
+
+# Global instance
+merchant_locations = MerchantSpatialIndex()
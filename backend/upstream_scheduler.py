@@ -0,0 +1,243 @@
+"""
+Upstream Scheduler - Shares Google and ReceitaWS capacity between interactive
+validations and background batches
+"""
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Any, List, Tuple
+
+from deadline import DeadlineExceeded, check_deadline, deadline_remaining
+
+INTERACTIVE = "INTERACTIVE"
+BATCH = "BATCH"
+
+_current_priority: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "upstream_priority", default=(INTERACTIVE, "interactive")
+)
+
+@contextmanager
+def upstream_priority(priority: str, share_key: str):
+    """Run upstream calls made inside the block with the given priority class"""
+    token = _current_priority.set((priority, share_key))
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def _wait_timeout(deadline: Optional[float], max_wait: Optional[float]) -> Optional[float]:
+    """How long to wait for a state change: max_wait, capped by the deadline"""
+    if deadline is None:
+        return max_wait
+    remaining = deadline - time.monotonic()
+    return remaining if max_wait is None else min(max_wait, remaining)
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+class UpstreamScheduler:
+    """
+    Concurrency slots for one upstream API.
+
+    Interactive calls take any free slot and are always served before
+    waiting batch calls. Batch calls never use the last interactive_reserved
+    slots, take turns round-robin across batches (share keys) and are paced
+    to batch_rate calls per second overall.
+    """
+
+    def __init__(self, name: str, capacity: int, interactive_reserved: int = 1, batch_rate: Optional[float] = None):
+        self.name = name
+        self.capacity = max(capacity, 1)
+        self.interactive_reserved = max(min(interactive_reserved, self.capacity - 1), 0)
+        self.batch_interval = 1.0 / batch_rate if batch_rate else 0.0
+
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._interactive_waiting = 0
+        # Share key -> number of waiting calls; the first key has the turn
+        self._batch_waiting: "OrderedDict[str, int]" = OrderedDict()
+        self._next_batch_at = 0.0
+        self._granted = {INTERACTIVE: 0, BATCH: 0}
+        # (event loop, future) of coroutines waiting in acquire_async()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _wait(self, deadline: Optional[float], max_wait: Optional[float] = None) -> bool:
+        """Wait for a state change; False once the deadline has passed"""
+        timeout = _wait_timeout(deadline, max_wait)
+        if timeout is not None and timeout <= 0:
+            return False
+        self._cond.wait(timeout)
+        return True
+
+    def _notify(self) -> None:
+        """The caller holds the lock. Wakes threads and async waiters alike"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiter's event loop is closed
+                pass
+        self._async_waiters.clear()
+
+    def _batch_may_run(self, share_key: str) -> bool:
+        return (
+            self._interactive_waiting == 0
+            and self._in_use < self.capacity - self.interactive_reserved
+            and next(iter(self._batch_waiting)) == share_key
+        )
+
+    def _enter(self, priority: str, share_key: str) -> None:
+        if priority == INTERACTIVE:
+            self._interactive_waiting += 1
+        else:
+            self._batch_waiting[share_key] = self._batch_waiting.get(share_key, 0) + 1
+
+    def _leave(self, priority: str, share_key: str) -> None:
+        """Leave the queue, granted or timed out; for batches this passes the turn on"""
+        if priority == INTERACTIVE:
+            self._interactive_waiting -= 1
+        else:
+            remaining = self._batch_waiting.pop(share_key) - 1
+            if remaining:
+                self._batch_waiting[share_key] = remaining
+        self._notify()
+
+    def _admission_delay(self, priority: str, share_key: str) -> Optional[float]:
+        """0 if a waiting call may take a slot now, the pacing delay of a batch call whose turn it is, else None"""
+        if priority == INTERACTIVE:
+            return 0.0 if self._in_use < self.capacity else None
+        if not self._batch_may_run(share_key):
+            return None
+        return max(self._next_batch_at - time.monotonic(), 0.0)
+
+    def _grant(self, priority: str) -> None:
+        if priority != INTERACTIVE:
+            self._next_batch_at = max(time.monotonic(), self._next_batch_at) + self.batch_interval
+        self._in_use += 1
+        self._granted[priority] += 1
+
+    def acquire(self, priority: str = INTERACTIVE, share_key: str = "interactive", timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            self._enter(priority, share_key)
+            try:
+                while True:
+                    delay = self._admission_delay(priority, share_key)
+                    if delay == 0:
+                        break
+                    if not self._wait(deadline, delay):
+                        return False
+            finally:
+                self._leave(priority, share_key)
+            self._grant(priority)
+            return True
+
+    async def acquire_async(self, priority: str = INTERACTIVE, share_key: str = "interactive", timeout: Optional[float] = None) -> bool:
+        """
+        acquire() for coroutines. The waiter parks on a future of its own
+        event loop, resolved by whichever thread or task changes the slot
+        state, so no executor thread is held while it waits.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+
+        with self._cond:
+            self._enter(priority, share_key)
+        granted = False
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admission_delay(priority, share_key)
+                    if delay == 0:
+                        self._leave(priority, share_key)
+                        self._grant(priority)
+                        granted = True
+                        return True
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+
+                wait_timeout = _wait_timeout(deadline, delay)
+                if wait_timeout is not None and wait_timeout <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(waiter, wait_timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not granted:
+                with self._cond:
+                    self._leave(priority, share_key)
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._notify()
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a slot for the priority class of the current context. Under a
+        request deadline, raises DeadlineExceeded instead of waiting past it.
+        """
+        priority, share_key = _current_priority.get()
+        check_deadline()
+        if not self.acquire(priority, share_key, timeout=deadline_remaining()):
+            raise DeadlineExceeded()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot() that waits without blocking the event loop"""
+        priority, share_key = _current_priority.get()
+        check_deadline()
+        if not await self.acquire_async(priority, share_key, timeout=deadline_remaining()):
+            raise DeadlineExceeded()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "interactive_reserved": self.interactive_reserved,
+                "in_use": self._in_use,
+                "interactive_waiting": self._interactive_waiting,
+                "batch_waiting": sum(self._batch_waiting.values()),
+                "batches_waiting": len(self._batch_waiting),
+                "granted": dict(self._granted)
+            }
+
+def _rate_from_env(name: str, default: str) -> Optional[float]:
+    rate = float(os.getenv(name, default))
+    return rate if rate > 0 else None
+
+# Global instances
+google_scheduler = UpstreamScheduler(
+    "google",
+    capacity=int(os.getenv("GOOGLE_MAX_CONCURRENCY", "8")),
+    interactive_reserved=int(os.getenv("GOOGLE_INTERACTIVE_RESERVED", "2")),
+    batch_rate=_rate_from_env("GOOGLE_BATCH_RATE", "20")
+)
+receitaws_scheduler = UpstreamScheduler(
+    "receitaws",
+    capacity=int(os.getenv("RECEITAWS_MAX_CONCURRENCY", "2")),
+    interactive_reserved=int(os.getenv("RECEITAWS_INTERACTIVE_RESERVED", "1")),
+    # The public ReceitaWS tier allows 3 requests per minute
+    batch_rate=_rate_from_env("RECEITAWS_BATCH_RATE", "0.05")
+)
+
+def upstream_stats() -> Dict[str, Any]:
+    return {scheduler.name: scheduler.stats() for scheduler in (google_scheduler, receitaws_scheduler)}
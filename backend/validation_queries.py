@@ -0,0 +1,137 @@
+"""
+Validation Queries - Investigator searches over stored validations and
+dashboard aggregates read from the summary tables
+"""
+
+import os
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+LIST_COLUMNS = (
+    "id", "audit_id", "batch_id", "merchant_name", "address", "place_id", "risk_score",
+    "risk_level", "risk_factors", "validation_status", "search_query", "created_at"
+)
+
+class ValidationStoreUnavailable(Exception):
+    """Raised when no database is configured for stored validations"""
+
+def _require_database() -> None:
+    if not os.getenv("DATABASE_URL"):
+        raise ValidationStoreUnavailable("DATABASE_URL not set, validations are not stored")
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()}_{row_id}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor"""
+    created_at, _, row_id = cursor.rpartition("_")
+    return datetime.fromisoformat(created_at), int(row_id)
+
+async def search_validations(
+    risk_level: Optional[str] = None,
+    risk_factor: Optional[str] = None,
+    validation_status: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    place_id: Optional[str] = None,
+    days: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Newest validations first, paginated with an opaque (created_at, id) cursor.
+    risk_factor must match one factor exactly and is answered from the GIN
+    index on risk_factors; risk_level and time ranges use the composite index.
+    """
+    _require_database()
+    from sqlalchemy import select, tuple_
+    from database import engine, MerchantValidation
+
+    table = MerchantValidation.__table__
+    query = select(*(table.c[column] for column in LIST_COLUMNS))
+    if risk_level:
+        query = query.where(table.c.risk_level == risk_level)
+    if risk_factor:
+        query = query.where(table.c.risk_factors.contains([risk_factor]))
+    if validation_status:
+        query = query.where(table.c.validation_status == validation_status)
+    if batch_id:
+        query = query.where(table.c.batch_id == batch_id)
+    if place_id:
+        query = query.where(table.c.place_id == place_id)
+    if days:
+        query = query.where(table.c.created_at >= datetime.now() - timedelta(days=days))
+    if cursor:
+        query = query.where(tuple_(table.c.created_at, table.c.id) < decode_cursor(cursor))
+
+    # One extra row tells whether there is a next page
+    query = query.order_by(table.c.created_at.desc(), table.c.id.desc()).limit(limit + 1)
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    return {"validations": [dict(row) for row in rows], "next_cursor": next_cursor}
+
+async def validation_summary(days: int = 30, batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Risk level and status distribution over the last days (or for one batch).
+    Reads the incrementally maintained summary tables, never merchant_validations.
+    """
+    _require_database()
+    from sqlalchemy import select, func
+    from database import engine, ValidationDailySummary, ValidationBatchSummary
+
+    if batch_id:
+        table = ValidationBatchSummary.__table__
+        condition = table.c.batch_id == batch_id
+    else:
+        table = ValidationDailySummary.__table__
+        condition = table.c.day >= date.today() - timedelta(days=days - 1)
+
+    query = (
+        select(
+            table.c.risk_level,
+            table.c.validation_status,
+            func.sum(table.c.validations),
+            func.sum(table.c.risk_score_sum)
+        )
+        .where(condition)
+        .group_by(table.c.risk_level, table.c.validation_status)
+    )
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    total = 0
+    risk_levels: Dict[str, Dict[str, float]] = {}
+    validation_statuses: Dict[str, int] = {}
+    for risk_level, validation_status, validations, risk_score_sum in rows:
+        # SUM(bigint) comes back as numeric
+        validations, risk_score_sum = int(validations), float(risk_score_sum)
+        total += validations
+        level = risk_levels.setdefault(risk_level, {"validations": 0, "risk_score_sum": 0.0})
+        level["validations"] += validations
+        level["risk_score_sum"] += risk_score_sum
+        validation_statuses[validation_status] = validation_statuses.get(validation_status, 0) + validations
+
+    summary = {
+        "total_validations": total,
+        "risk_levels": {
+            risk_level: {
+                "validations": level["validations"],
+                "share": round(level["validations"] / total, 4),
+                "average_risk_score": round(level["risk_score_sum"] / level["validations"], 2)
+            }
+            for risk_level, level in risk_levels.items()
+        },
+        "validation_statuses": validation_statuses
+    }
+    if batch_id:
+        summary["batch_id"] = batch_id
+    else:
+        summary["days"] = days
+    return summary
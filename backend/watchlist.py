@@ -0,0 +1,254 @@
+"""
+Watchlist - Fuzzy screening of CNPJ partner (QSA) names against locally
+loaded sanctions and PEP lists
+"""
+
+import os
+import re
+import csv
+import logging
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from unidecode import unidecode
+
+logger = logging.getLogger(__name__)
+
+_NON_LETTERS = re.compile(r"[^a-z0-9 ]+")
+
+# Name particles that carry no identity ("Joao da Silva" is "Joao Silva")
+_PARTICLES = {"da", "das", "de", "do", "dos", "e", "del", "van", "von", "y"}
+
+# Spelling variants that sound alike in Portuguese names, applied in order
+_PHONETIC_RULES = [
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"t?[cs]h"), "x"),
+    (re.compile(r"lh"), "l"),
+    (re.compile(r"nh"), "n"),
+    (re.compile(r"qu|gu(?=[ei])"), lambda m: "k" if m.group(0) == "qu" else "g"),
+    (re.compile(r"c(?=[ei])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"m$"), "n"),
+]
+
+# Transliterations of the same name, spelled as the first of each group.
+# They differ in vowels, which the trigram score counts against a match.
+_TRANSLITERATION_GROUPS = [
+    "muhammad mohammed mohammad mohamed mohamad muhammed mohamud",
+    "ahmad ahmed",
+    "mahmoud mahmud",
+    "mustafa mostafa",
+    "yusuf youssef yousef yousuf",
+    "hussein husain hussain husayn husein",
+    "usama osama",
+    "umar omar",
+    "abdul abdel",
+    "aleksandr alexander aleksander",
+]
+_TRANSLITERATIONS = {
+    variant: group.split()[0] for group in _TRANSLITERATION_GROUPS for variant in group.split()
+}
+
+def normalize_person_name(name: Optional[str]) -> List[str]:
+    """Lowercase ASCII tokens of a name, without punctuation or particles"""
+    if not name:
+        return []
+    tokens = _NON_LETTERS.sub(" ", unidecode(name).lower()).split()
+    return [token for token in tokens if token not in _PARTICLES]
+
+def phonetic_form(token: str) -> str:
+    """The token spelled after the rules above (Luiz/Luis, Souza/Sousa, Thiago/Tiago)"""
+    token = _TRANSLITERATIONS.get(token, token)
+    for pattern, replacement in _PHONETIC_RULES:
+        token = pattern.sub(replacement, token)
+    return token
+
+def phonetic_code(form: str) -> str:
+    """First letter and consonant skeleton of a phonetic form"""
+    if not form:
+        return ""
+    code = [form[0]]
+    for char in form[1:]:
+        if char not in "aeiou" and char != code[-1]:
+            code.append(char)
+    return "".join(code)
+
+def _phonetic_forms(name: Optional[str]) -> List[str]:
+    return [form for form in map(phonetic_form, normalize_person_name(name)) if form]
+
+def _trigrams(text: str) -> set:
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _code_pairs(codes: List[str]) -> List[str]:
+    return [f"{a}|{b}" for i, a in enumerate(codes) for b in codes[i + 1:]]
+
+class WatchlistIndex:
+    """
+    Immutable index over one load of the watchlist. Each entry is posted
+    under the phonetic codes of its name tokens and under every pair of
+    them. Multi-token names are looked up by code pairs, which even for
+    common names ("Maria Silva") hold few entries; the candidates sharing
+    the most keys are then scored on phonetic codes and on trigrams, and
+    match only if both scores reach the threshold.
+    """
+
+    def __init__(self, max_postings: int = 2000, max_ranked: int = 20):
+        # Keys with more postings than this only generate candidates when
+        # the name has no rarer key
+        self.max_postings = max_postings
+        self.max_ranked = max_ranked
+        self._postings: Dict[str, array] = {}
+        self._names: List[str] = []
+        # Per entry: sorted phonetic forms and sorted codes, space separated
+        self._texts: List[str] = []
+        self._codes: List[str] = []
+        self._lists: List[str] = []
+        self._scores: array = array('H')
+        self._list_names: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str, list_name: str, risk_score: int) -> bool:
+        forms = _phonetic_forms(name)
+        codes = sorted(set(map(phonetic_code, forms)))
+        if not codes:
+            return False
+        entry = len(self._names)
+        self._names.append(name.strip())
+        self._texts.append(" ".join(sorted(forms)))
+        self._codes.append(" ".join(codes))
+        # Few distinct list names, so each is stored once
+        self._lists.append(self._list_names.setdefault(list_name, list_name))
+        self._scores.append(max(min(risk_score, 100), 0))
+        for key in codes + _code_pairs(codes):
+            self._postings.setdefault(key, array('I')).append(entry)
+        return True
+
+    def search(self, name: str, threshold: float, limit: int = 3) -> List[Dict[str, Any]]:
+        forms = _phonetic_forms(name)
+        codes = sorted(set(map(phonetic_code, forms)))
+        if not codes:
+            return []
+
+        keys = _code_pairs(codes) if len(codes) > 1 else codes
+        postings = sorted((self._postings.get(key, array('I')) for key in keys), key=len)
+        usable = [entries for entries in postings if len(entries) <= self.max_postings] or postings[:1]
+
+        shared = Counter()
+        for entries in usable:
+            shared.update(entries)
+        # Entries sharing the most keys first; the candidate pool stays bounded
+        candidates = shared.most_common(self.max_ranked)
+
+        query_codes = set(codes)
+        # The codes ignore vowels, so Maria and Mario share theirs. Trigrams
+        # of the phonetic forms do count vowels (but not the spelling
+        # variants the rules fold), so a match needs both scores.
+        query_trigrams = _trigrams(" ".join(sorted(forms)))
+        matches = []
+        for entry, _ in candidates:
+            entry_codes = set(self._codes[entry].split())
+            phonetic = len(query_codes & entry_codes) / max(len(query_codes), len(entry_codes))
+            entry_trigrams = _trigrams(self._texts[entry])
+            dice = 2 * len(query_trigrams & entry_trigrams) / (len(query_trigrams) + len(entry_trigrams))
+            similarity = min(dice, phonetic)
+            if similarity >= threshold:
+                matches.append({
+                    "name": self._names[entry],
+                    "list": self._lists[entry],
+                    "risk_score": self._scores[entry],
+                    "similarity": round(similarity, 3)
+                })
+        matches.sort(key=lambda match: -match["similarity"])
+        return matches[:limit]
+
+    @classmethod
+    def from_csv(cls, path: str, default_risk_score: int) -> "WatchlistIndex":
+        """Load a list with columns name, list (e.g. SANCTIONS, PEP) and an optional risk_score"""
+        index = cls()
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                score = row.get('risk_score')
+                index.add(
+                    row.get('name', ''),
+                    (row.get('list') or 'WATCHLIST').strip().upper(),
+                    int(score) if score and score.strip().isdigit() else default_risk_score
+                )
+        return index
+
+class PartnerWatchlist:
+    """
+    Screens partner names against the loaded watchlist. A reload builds a
+    new index and swaps it in with one assignment, so a screening sees
+    either the old list or the new one.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.85, default_risk_score: int = 30):
+        self.path = path
+        self.threshold = threshold
+        self.default_risk_score = default_risk_score
+        self._index = WatchlistIndex()
+        self._reload_lock = threading.Lock()
+        self._loaded_at: Optional[datetime] = None
+        self._stats_lock = threading.Lock()
+        self._screened = 0
+        self._hits = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.path)
+
+    def reload(self) -> Dict[str, Any]:
+        """Load the list from its file; on error the current list stays in place"""
+        with self._reload_lock:
+            index = WatchlistIndex.from_csv(self.path, self.default_risk_score)
+            self._index = index
+            self._loaded_at = datetime.now()
+        logger.info(f"Loaded {len(index)} watchlist entries from {self.path}")
+        return self.stats()
+
+    def screen_partners(self, partners: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Watchlist hits of the partners of a CNPJ (ReceitaWS qsa entries), best match per partner"""
+        index = self._index
+        if not len(index) or not partners:
+            return []
+
+        hits = []
+        for partner in partners:
+            name = partner.get('nome') if isinstance(partner, dict) else None
+            if not name:
+                continue
+            matches = index.search(name, self.threshold, limit=1)
+            if matches:
+                hits.append({"partner": name, "role": partner.get('qual'), **matches[0]})
+
+        with self._stats_lock:
+            self._screened += len(partners)
+            self._hits += len(hits)
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "entries": len(self._index),
+                "loaded_at": self._loaded_at.isoformat() if self._loaded_at else None,
+                "partners_screened": self._screened,
+                "hits": self._hits
+            }
+
+# Global instance
+partner_watchlist = PartnerWatchlist(
+    path=os.getenv("WATCHLIST_PATH"),
+    threshold=float(os.getenv("WATCHLIST_MATCH_THRESHOLD", "0.85")),
+    default_risk_score=int(os.getenv("WATCHLIST_DEFAULT_RISK_SCORE", "30"))
+)
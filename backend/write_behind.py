@@ -0,0 +1,169 @@
+"""
+Write-Behind Buffer - Collects rows in memory and writes them to the
+database in batches from one background task
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Optional, Dict, Any, List, Tuple, Hashable
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer(ABC):
+    """
+    Rows can be added from any thread (batches run in the threadpool). They
+    are written when batch_size rows are pending or every flush_interval
+    seconds, whichever comes first. Rows added under the same key are
+    combined by merge() until they are written; by default the newer row
+    replaces the older one.
+
+    Subclasses implement write(). By default a failed write is retried on
+    the next flush and rows beyond max_pending are dropped; subclasses can
+    override retry_failed() and overflow() to handle them differently.
+    """
+
+    def __init__(self, name: str, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 50000):
+        self.name = name
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._sequence = count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._written = 0
+        self._dropped = 0
+        self._failed_writes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def add(self, row: Dict[str, Any], key: Optional[Hashable] = None) -> None:
+        """Queue a row; ignored while the buffer is not running"""
+        if not self.running:
+            return
+
+        with self._lock:
+            if key is None:
+                key = next(self._sequence)
+            else:
+                # Move a re-added key to the end so it is written with the newest rows
+                older = self._pending.pop(key, None)
+                if older is not None:
+                    row = self.merge(older, row)
+            self._pending[key] = row
+            evicted = self._trim()
+            wake = len(self._pending) == self.batch_size
+
+        if evicted:
+            self.overflow(evicted)
+        if wake:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def merge(self, older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine two unwritten rows with the same key; newer wins by default"""
+        return newer
+
+    def _trim(self) -> List[Dict[str, Any]]:
+        """Remove the oldest rows beyond max_pending (caller holds the lock)"""
+        evicted = []
+        while len(self._pending) > self.max_pending:
+            evicted.append(self._pending.popitem(last=False)[1])
+        return evicted
+
+    def overflow(self, rows: List[Dict[str, Any]]) -> None:
+        """Rows that no longer fit in the buffer (or are left unwritten at close)"""
+        self._dropped += len(rows)
+        logger.warning(f"Dropped {len(rows)} {self.name} rows")
+
+    @abstractmethod
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        """Write one chunk of rows; raising leaves them to retry_failed()"""
+
+    async def flush(self) -> int:
+        """Write all pending rows in batch_size chunks; returns the rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+
+        items = list(pending.items())
+        written = 0
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            try:
+                await self.write([row for _, row in chunk])
+            except Exception as e:
+                self._failed_writes += 1
+                logger.error(f"Error writing {len(items) - start} {self.name} rows: {str(e)}")
+                self.retry_failed(items[start:])
+                break
+            written += len(chunk)
+
+        self._written += written
+        return written
+
+    def retry_failed(self, items: List[Tuple[Hashable, Dict[str, Any]]]) -> None:
+        """Put unwritten rows back in front, merged into newer rows with the same key"""
+        with self._lock:
+            newer = self._pending
+            self._pending = OrderedDict((key, row) for key, row in items if key not in newer)
+            failed = dict(items)
+            for key, row in newer.items():
+                self._pending[key] = self.merge(failed[key], row) if key in failed else row
+            evicted = self._trim()
+        if evicted:
+            self.overflow(evicted)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            failed_writes = self._failed_writes
+            await self.flush()
+            if self._failed_writes != failed_writes:
+                # Don't hammer a database that is down
+                await asyncio.sleep(self.flush_interval)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background task and write what is still pending"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+        with self._lock:
+            leftover, self._pending = list(self._pending.values()), OrderedDict()
+        if leftover:
+            self.overflow(leftover)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "running": self.running,
+            "pending": pending,
+            "written": self._written,
+            "dropped": self._dropped,
+            "failed_writes": self._failed_writes
+        }
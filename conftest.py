@@ -0,0 +1,8 @@
+"""
+Shared test setup: backend modules are imported by name, as the API does
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
@@ -7,9 +7,9 @@ const BatchValidation = () => {
   const [file, setFile] = useState(null)
   const [uploadStatus, setUploadStatus] = useState(null)
   const [batchStatus, setBatchStatus] = useState(null)
-  const [isPolling, setIsPolling] = useState(false)
+  const [isStreaming, setIsStreaming] = useState(false)
   const fileInputRef = useRef(null)
-  const pollInterval = useRef(null)
+  const eventSource = useRef(null)
 
   const handleFileSelect = (event) => {
     const selectedFile = event.target.files[0]
@@ -38,30 +38,59 @@ const BatchValidation = () => {
 
       setBatchStatus(response.data)
       setUploadStatus('uploaded')
-      startPolling(response.data.batch_id)
+      watchBatch(response.data.batch_id)
     } catch (error) {
       console.error('Upload error:', error)
       setUploadStatus('error')
     }
   }
 
-  const startPolling = (batchId) => {
-    setIsPolling(true)
-    pollInterval.current = setInterval(async () => {
-      try {
-        const response = await axios.get(`/api/batch-status/${batchId}`)
-        setBatchStatus(response.data)
+  const stopWatching = () => {
+    setIsStreaming(false)
+    if (eventSource.current) {
+      eventSource.current.close()
+      eventSource.current = null
+    }
+  }
+
+  const fetchBatchStatus = async (batchId) => {
+    try {
+      const response = await axios.get(`/api/batch-status/${batchId}`)
+      setBatchStatus(response.data)
+    } catch (error) {
+      console.error('Status error:', error)
+    }
+  }
 
-        if (['COMPLETED', 'FAILED'].includes(response.data.status)) {
-          setIsPolling(false)
-          clearInterval(pollInterval.current)
-        }
-      } catch (error) {
-        console.error('Polling error:', error)
-        setIsPolling(false)
-        clearInterval(pollInterval.current)
+  const watchBatch = (batchId) => {
+    // The server pushes progress over server-sent events instead of being polled
+    setIsStreaming(true)
+    const source = new EventSource(`/api/batch/${batchId}/events`)
+    eventSource.current = source
+
+    const handleEvent = (event) => {
+      const data = JSON.parse(event.data)
+      setBatchStatus(prev => ({ ...prev, status: data.status, processed_merchants: data.processed_merchants }))
+
+      if (['COMPLETED', 'FAILED', 'PAUSED'].includes(data.status)) {
+        stopWatching()
+        // A single status request picks up the results
+        fetchBatchStatus(batchId)
+      }
+    }
+
+    ;['batch.status', 'batch.progress', 'batch.completed', 'batch.failed', 'batch.paused'].forEach(name => {
+      source.addEventListener(name, handleEvent)
+    })
+
+    // EventSource reconnects by itself and gets a fresh batch.status on reconnect;
+    // it only gives up when the batch is gone
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        console.error('Batch event stream closed')
+        stopWatching()
       }
-    }, 2000)
+    }
   }
 
   const downloadResults = () => {
@@ -101,10 +130,7 @@ const BatchValidation = () => {
     setFile(null)
     setUploadStatus(null)
     setBatchStatus(null)
-    setIsPolling(false)
-    if (pollInterval.current) {
-      clearInterval(pollInterval.current)
-    }
+    stopWatching()
     if (fileInputRef.current) {
       fileInputRef.current.value = ''
     }
@@ -156,7 +156,7 @@ const MerchantDetails = ({ merchantInfo }) => {
               {merchantInfo.photos.map((photo, index) => (
                 <div key={index} className="aspect-video bg-gray-100 rounded-lg overflow-hidden">
                   <img
-                    src={photo}
+                    src={photo.startsWith('/') ? `/api${photo}` : photo}
                     alt={`${merchantInfo.name} - Photo ${index + 1}`}
                     className="w-full h-full object-cover"
                     onError={(e) => {
@@ -2,10 +2,8 @@ import React from 'react'
 import { X, ExternalLink, MapPin } from 'lucide-react'
 
 const StreetViewModal = ({ location, address, merchantName, onClose }) => {
-  const GOOGLE_MAPS_API_KEY = import.meta.env.VITE_GOOGLE_MAPS_API_KEY
-
-  // Generate Street View Static API URL
-  const streetViewUrl = `https://maps.googleapis.com/maps/api/streetview?size=800x600&location=${location.lat},${location.lng}&heading=151.78&pitch=-0.76&key=${GOOGLE_MAPS_API_KEY}`
+  // Street View image served (and cached) by the backend image proxy
+  const streetViewUrl = `/api/images/streetview?lat=${location.lat}&lng=${location.lng}&width=640&height=480&heading=151.78&pitch=-0.76`
   
   // Generate Google Maps link
   const googleMapsUrl = `https://www.google.com/maps/@${location.lat},${location.lng},3a,75y,151.78h,84.24t/data=!3m6!1e1!3m4!1s0x0:0x0!2e0!7i16384!8i8192`
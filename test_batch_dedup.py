@@ -0,0 +1,68 @@
+"""
+Resubmitted batches: content hashes and Idempotency-Key replays
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from batch_checkpoint import BatchCheckpointStore
+from batch_dedup import BatchDeduplicator, batch_content_hash
+from batch_store import BatchResultStore
+from models import MerchantValidationRequest
+
+ROWS = [{"merchant_name": "Padaria Bom Pao", "address": "Rua Augusta, 100"}]
+
+def test_content_hash_ignores_formatting_but_not_callback_url():
+    reformatted = [{"merchant_name": "  PADARIA   bom pao ", "address": "rua augusta, 100"}]
+    assert batch_content_hash(ROWS) == batch_content_hash(reformatted)
+    assert batch_content_hash(ROWS, "https://a.example.com/hook") != batch_content_hash(ROWS, "https://b.example.com/hook")
+    assert batch_content_hash(ROWS) != batch_content_hash(ROWS[::-1] + ROWS)
+
+def test_find_is_per_tenant_and_respects_reusable():
+    dedup = BatchDeduplicator()
+    content_hash = batch_content_hash(ROWS)
+    dedup.register("b1", "tenant-a", content_hash)
+
+    assert dedup.find("tenant-a", content_hash, None, lambda batch_id: True) == "b1"
+    assert dedup.find("tenant-b", content_hash, None, lambda batch_id: True) is None
+    assert dedup.find("tenant-a", content_hash, None, lambda batch_id: False) is None
+
+    dedup.forget("b1")
+    assert dedup.find("tenant-a", content_hash, None, lambda batch_id: True) is None
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    import main
+    checkpoints = BatchCheckpointStore(str(tmp_path))
+    monkeypatch.setattr(main, "BATCH_DEDUP_WINDOW", 3600)
+    monkeypatch.setattr(main, "batch_storage", {})
+    monkeypatch.setattr(main, "batch_dedup", BatchDeduplicator())
+    monkeypatch.setattr(main, "checkpoint_store", checkpoints)
+    monkeypatch.setattr(main, "batch_result_store", BatchResultStore(checkpoints))
+    return main
+
+def submit(api, rows, idempotency_key=None, tenant_id="tenant-a"):
+    merchants = [MerchantValidationRequest(**row) for row in rows]
+    content_hash = api.batch_request_hash(merchants, None)
+    duplicate_id = api.find_duplicate_batch(content_hash, tenant_id, idempotency_key)
+    if duplicate_id:
+        return duplicate_id
+    batch_status = api.create_batch(merchants, None, tenant_id, content_hash=content_hash, idempotency_key=idempotency_key)
+    api.checkpoint_new_batch(batch_status.batch_id, merchants)
+    return batch_status.batch_id
+
+def test_idempotency_key_replays_the_same_batch(api):
+    batch_id = submit(api, ROWS, idempotency_key="key-1")
+    assert submit(api, ROWS, idempotency_key="key-1") == batch_id
+    # Same rows without the key are found by their hash
+    assert submit(api, ROWS) == batch_id
+
+def test_idempotency_key_reused_for_other_rows_is_a_conflict(api):
+    submit(api, ROWS, idempotency_key="key-1")
+    other_rows = [{"merchant_name": "Mercado Boa Vista"}]
+    with pytest.raises(HTTPException) as error:
+        submit(api, other_rows, idempotency_key="key-1")
+    assert error.value.status_code == 409
+
+    # The key belongs to the tenant that used it
+    assert submit(api, other_rows, idempotency_key="key-1", tenant_id="tenant-b")
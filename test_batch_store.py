@@ -0,0 +1,69 @@
+"""
+Batch results evicted to their checkpoints and read back
+"""
+
+from batch_checkpoint import BatchCheckpointStore
+from batch_store import BatchResultStore
+
+def result(i: int) -> dict:
+    return {
+        "merchant_info": {"place_id": f"place-{i}", "name": f"Merchant {i}"},
+        "risk_assessment": {"risk_score": 10.0, "risk_level": "LOW", "risk_factors": []},
+        "validation_status": "VALID"
+    }
+
+def place_ids(rows) -> list:
+    return [row["merchant_info"]["place_id"] for row in rows]
+
+def test_evicted_batch_round_trip_writes_no_duplicate_rows(tmp_path):
+    checkpoints = BatchCheckpointStore(str(tmp_path))
+    checkpoints.start("b1", {"batch_id": "b1", "status": "PROCESSING"}, [{}] * 5)
+    # Nothing stays cached: every finished batch is evicted right away
+    store = BatchResultStore(checkpoints, max_cached_rows=0)
+
+    results = store.create("b1")
+    results.extend(result(i) for i in range(3))
+    store.release("b1")
+    assert store.count("b1") == 3
+
+    # Reading it back, cached and evicted again, appends nothing
+    assert place_ids(store.get("b1")) == ["place-0", "place-1", "place-2"]
+    assert place_ids(store.rows("b1")) == ["place-0", "place-1", "place-2"]
+
+    # Resumed, it only appends the new rows
+    results = store.open("b1")
+    results.extend(result(i) for i in range(3, 5))
+    store.release("b1")
+
+    on_disk = place_ids(checkpoints.iter_results("b1"))
+    assert on_disk == [f"place-{i}" for i in range(5)]
+    assert store.summary("b1").rows == 5
+
+def test_rows_of_an_evicted_batch_are_not_cached(tmp_path):
+    checkpoints = BatchCheckpointStore(str(tmp_path))
+    checkpoints.start("b1", {"batch_id": "b1", "status": "PROCESSING"}, [{}] * 2)
+    store = BatchResultStore(checkpoints, max_cached_rows=0)
+    store.create("b1").extend(result(i) for i in range(2))
+    store.release("b1")
+
+    assert place_ids(store.rows("b1")) == ["place-0", "place-1"]
+    assert store.stats()["cached_batches"] == 0
+
+def test_resume_after_torn_results_row(tmp_path):
+    checkpoints = BatchCheckpointStore(str(tmp_path))
+    checkpoints.start("b1", {"batch_id": "b1", "status": "PROCESSING"}, [{}] * 4)
+    checkpoints.append_results("b1", [result(0), result(1)])
+    # A crash in the middle of writing the third row
+    with open(tmp_path / "b1" / "results.jsonl", "ab") as f:
+        f.write(b'{"merchant_info": {"place_id": "pla')
+
+    # After a restart the torn row is dropped and processing continues after row 2
+    restarted = BatchCheckpointStore(str(tmp_path))
+    store = BatchResultStore(restarted, max_cached_rows=0)
+    results = store.open("b1")
+    assert place_ids(results) == ["place-0", "place-1"]
+    results.extend([result(2), result(3)])
+    store.release("b1")
+
+    assert place_ids(restarted.iter_results("b1")) == [f"place-{i}" for i in range(4)]
+    assert restarted.count_results("b1") == 4
@@ -0,0 +1,58 @@
+"""
+Circuit breakers in front of upstream APIs
+"""
+
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, UpstreamUnavailable, CLOSED, OPEN
+
+class Outage(Exception):
+    pass
+
+def breaker(**kwargs) -> CircuitBreaker:
+    options = {"failure_rate": 0.5, "min_calls": 4, "window": 60, "open_seconds": 30, "probes": 1}
+    options.update(kwargs)
+    return CircuitBreaker("test", is_failure=lambda error: isinstance(error, Outage), **options)
+
+def call(circuit: CircuitBreaker, error: Exception = None) -> None:
+    try:
+        with circuit.call():
+            if error is not None:
+                raise error
+    except (Outage, LookupError):
+        pass
+
+def test_opens_at_failure_rate_and_fails_fast_with_retry_after():
+    circuit = breaker()
+    call(circuit)
+    call(circuit, Outage())
+    call(circuit)
+    assert circuit.state == CLOSED
+    call(circuit, Outage())
+    assert circuit.state == OPEN
+
+    with pytest.raises(UpstreamUnavailable) as error:
+        with circuit.call():
+            pass
+    assert error.value.retry_after == 30
+
+def test_errors_that_are_not_failures_do_not_open_it():
+    circuit = breaker()
+    for _ in range(10):
+        call(circuit, LookupError())
+    assert circuit.state == CLOSED
+
+def test_successful_probe_closes_it_and_failed_probe_reopens_it():
+    circuit = breaker(min_calls=1, open_seconds=0.05)
+    call(circuit, Outage())
+    assert circuit.state == OPEN
+
+    time.sleep(0.06)
+    call(circuit, Outage())
+    assert circuit.state == OPEN
+
+    time.sleep(0.06)
+    call(circuit)
+    assert circuit.state == CLOSED
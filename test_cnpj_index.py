@@ -0,0 +1,48 @@
+"""
+CNPJ registry name index: city-scoped search and city parsing
+"""
+
+from cnpj_index import CNPJNameIndex
+
+def build_index(**kwargs) -> CNPJNameIndex:
+    index = CNPJNameIndex(**kwargs)
+    index.add("11111111000111", "PADARIA BOM PAO LTDA", "Padaria Bom Pao", city="Sao Paulo")
+    index.add("22222222000122", "PADARIA BOM PAO LTDA", "Padaria Bom Pao", city="Campinas")
+    index.add("33333333000133", "MERCADO BOA VISTA LTDA", None, city="Sao Paulo")
+    index.add("44444444000144", "PADARIA CENTRAL LTDA", None, city="Santos")
+    return index
+
+def test_city_scoped_search_only_returns_that_city():
+    index = build_index()
+
+    candidates = index.search("Padaria Bom Pao", city="Campinas")
+    assert [c["cnpj"] for c in candidates] == ["22222222000122"]
+    assert candidates[0]["city"] == "Campinas"
+
+    everywhere = {c["cnpj"] for c in index.search("Padaria Bom Pao")}
+    assert {"11111111000111", "22222222000122"} <= everywhere
+
+def test_city_scoped_search_is_accent_and_case_insensitive():
+    index = build_index()
+    candidates = index.search("padaria bom pão", city="SÃO PAULO")
+    assert candidates[0]["cnpj"] == "11111111000111"
+
+def test_unknown_city_returns_nothing():
+    assert build_index().search("Padaria Bom Pao", city="Recife") == []
+
+def test_city_scoped_search_with_only_common_tokens():
+    # "padaria" is above max_postings, so no rarer token narrows the candidates
+    index = build_index(max_postings=1)
+    candidates = index.search("Padaria", city="Santos")
+    assert [c["cnpj"] for c in candidates] == ["44444444000144"]
+
+def test_match_city_reads_the_locality_part():
+    index = build_index()
+    assert index.match_city("Rua Augusta, 100 - Consolacao, Sao Paulo - SP, 01305-000, Brazil") == "Sao Paulo"
+    assert index.match_city("Av. Brasil, 50, Campinas - SP") == "Campinas"
+
+def test_match_city_ignores_street_names():
+    index = build_index()
+    # Sao Paulo is only the street; the city is not in the registry
+    assert index.match_city("Rua Sao Paulo, 10, Recife - PE") is None
+    assert index.match_city("Rua Campinas 10") is None
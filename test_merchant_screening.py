@@ -0,0 +1,39 @@
+"""
+Allow and deny lists
+"""
+
+from merchant_screening import MerchantScreener, ALLOW, DENY
+
+def write_list(path, rows):
+    path.write_text("\n".join(["place_id,cnpj,merchant_name,address,reason", *rows]) + "\n", encoding="utf-8")
+    return str(path)
+
+def screener(tmp_path, allow_rows, deny_rows) -> MerchantScreener:
+    screener = MerchantScreener(
+        allow_path=write_list(tmp_path / "allow.csv", allow_rows),
+        deny_path=write_list(tmp_path / "deny.csv", deny_rows)
+    )
+    screener.reload()
+    return screener
+
+def test_deny_beats_allow_for_the_same_key(tmp_path):
+    screening = screener(tmp_path, ["place-1,,,,known partner"], ["place-1,,,,chargeback fraud"])
+    verdict = screening.screen("place-1", None, None)
+    assert verdict.verdict == DENY
+    assert verdict.reason == "chargeback fraud"
+
+def test_deny_on_a_weaker_key_beats_allow_on_place_id(tmp_path):
+    screening = screener(
+        tmp_path,
+        ["place-1,,,,known partner"],
+        [",,Padaria Bom Pao,\"Rua Augusta, 100\",chargeback fraud"]
+    )
+    verdict = screening.screen("place-1", "PADARIA BOM PÃO", "Rua Augusta, 100")
+    assert verdict.verdict == DENY
+    assert verdict.matched_on == "name_address"
+
+def test_allow_and_unlisted(tmp_path):
+    screening = screener(tmp_path, ["place-1,,,,known partner"], ["place-2,,,,chargeback fraud"])
+    assert screening.screen("place-1", None, None).verdict == ALLOW
+    assert screening.screen("place-3", "Mercado Boa Vista", None) is None
+    assert screening.stats()["verdicts"] == {ALLOW: 1, DENY: 0}
@@ -0,0 +1,65 @@
+"""
+Upstream concurrency slots shared by interactive calls and batches
+"""
+
+import asyncio
+import threading
+
+from upstream_scheduler import UpstreamScheduler, INTERACTIVE, BATCH
+
+def test_interactive_waiter_goes_before_batch_waiter():
+    scheduler = UpstreamScheduler("test", capacity=1, interactive_reserved=0)
+    assert scheduler.acquire()
+    order = []
+
+    async def call(priority, share_key):
+        assert await scheduler.acquire_async(priority, share_key)
+        order.append(priority)
+        scheduler.release()
+
+    async def scenario():
+        batch = asyncio.create_task(call(BATCH, "batch-1"))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call(INTERACTIVE, "interactive"))
+        await asyncio.sleep(0.01)
+        scheduler.release()
+        await asyncio.gather(batch, interactive)
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert order == [INTERACTIVE, BATCH]
+
+def test_batches_leave_reserved_slots_to_interactive_calls():
+    scheduler = UpstreamScheduler("test", capacity=2, interactive_reserved=1)
+    assert scheduler.acquire(BATCH, "batch-1", timeout=0)
+    assert not scheduler.acquire(BATCH, "batch-1", timeout=0.01)
+    assert scheduler.acquire(INTERACTIVE, "interactive", timeout=0)
+
+def test_async_waiter_is_woken_by_a_release_in_another_thread():
+    scheduler = UpstreamScheduler("test", capacity=1)
+    assert scheduler.acquire()
+
+    async def scenario():
+        # No deadline: the waiter relies on release() waking it
+        threading.Timer(0.05, scheduler.release).start()
+        async with scheduler.aslot():
+            return scheduler.stats()["in_use"]
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == 1
+    assert scheduler.stats()["in_use"] == 0
+
+def test_async_waiter_times_out_and_cancelled_waiter_leaves_the_queue():
+    scheduler = UpstreamScheduler("test", capacity=1)
+    assert scheduler.acquire()
+
+    async def scenario():
+        assert not await scheduler.acquire_async(timeout=0.02)
+        waiter = asyncio.create_task(scheduler.acquire_async())
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["interactive_waiting"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    stats = scheduler.stats()
+    assert stats["interactive_waiting"] == 0
+    assert stats["in_use"] == 1
@@ -0,0 +1,36 @@
+"""
+Partner watchlist name matching
+"""
+
+from watchlist import WatchlistIndex
+
+THRESHOLD = 0.85
+
+def best_similarity(listed: str, partner: str) -> float:
+    index = WatchlistIndex()
+    index.add(listed, "SANCTIONS", 80)
+    matches = index.search(partner, threshold=0.0)
+    return matches[0]["similarity"] if matches else 0.0
+
+def test_spelling_variants_match():
+    pairs = [
+        ("Luiz Carlos de Souza", "LUIS CARLOS SOUSA"),
+        ("Vladimir Ivanovich Petrenko", "Vladimir Ivanovitch Petrenko"),
+        ("Thiago Oliveira", "Tiago Oliveira"),
+        ("Mohammed Ali", "Muhammad Ali"),
+        ("Muhammad Ali", "Mohammed Ali"),
+        ("Mohamed Ali", "Muhammad Ali"),
+    ]
+    for listed, partner in pairs:
+        assert best_similarity(listed, partner) >= THRESHOLD, (listed, partner)
+
+def test_different_names_do_not_match():
+    pairs = [
+        ("Maria Souza", "Mario Souza"),
+        ("Mario Souza", "Maria Souza"),
+        ("Paula Souza", "Paulo Souza"),
+        ("Bruno Costa", "Breno Costa"),
+        ("Carla Silva", "Carlos Silva"),
+    ]
+    for listed, partner in pairs:
+        assert best_similarity(listed, partner) < THRESHOLD, (listed, partner)
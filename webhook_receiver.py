@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a batch webhook receiver.
+
+Verifies the X-Webhook-Signature of each delivery and prints the event.
+Submit a batch with callback_url=http://localhost:9000/webhook to try it; the
+backend needs WEBHOOK_ALLOWED_HOSTS=localhost to call a local address.
+Use --fail N to answer the first N deliveries with 503 and watch the retries.
+"""
+
+import os
+import hmac
+import json
+import time
+import hashlib
+import argparse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+SECRET = os.getenv("WEBHOOK_SECRET", "")
+MAX_CLOCK_SKEW = 300
+
+def is_valid_signature(timestamp: str, body: bytes, signature: str) -> bool:
+    expected = hmac.new(SECRET.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature)
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    failures_left = 0
+    seen_deliveries = set()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        timestamp = self.headers.get("X-Webhook-Timestamp", "")
+        signature = self.headers.get("X-Webhook-Signature", "")
+        delivery_id = self.headers.get("X-Webhook-Delivery", "")
+
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > MAX_CLOCK_SKEW:
+            print(f"❌ Rejected delivery {delivery_id}: stale timestamp")
+            return self.reply(400)
+        if not is_valid_signature(timestamp, body, signature):
+            print(f"❌ Rejected delivery {delivery_id}: bad signature")
+            return self.reply(401)
+
+        if WebhookHandler.failures_left > 0:
+            WebhookHandler.failures_left -= 1
+            print(f"⚠️  Simulating failure for delivery {delivery_id}")
+            return self.reply(503)
+
+        if delivery_id in WebhookHandler.seen_deliveries:
+            print(f"↩️  Duplicate delivery {delivery_id} ignored")
+            return self.reply(200)
+        WebhookHandler.seen_deliveries.add(delivery_id)
+
+        event = json.loads(body)
+        print(f"✅ {event['event']} #{event['sequence']} batch={event['batch_id']} "
+              f"status={event['status']} progress={event['progress']}%")
+        self.reply(200)
+
+    def reply(self, status: int):
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Local batch webhook receiver")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fail", type=int, default=0, help="answer the first N deliveries with 503")
+    args = parser.parse_args()
+
+    if not SECRET:
+        parser.error("set WEBHOOK_SECRET to the backend's value")
+
+    WebhookHandler.failures_left = args.fail
+    print(f"🎧 Listening for webhooks on http://localhost:{args.port}/webhook")
+    HTTPServer(("", args.port), WebhookHandler).serve_forever()
+
+if __name__ == "__main__":
+    main()